@@ -0,0 +1,95 @@
+"""Thin client for the SQL Agent daemon: ask one question and print the answer"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+
+def socket_path():
+    """Socket path from the environment or .env, without importing the agent"""
+    path = os.environ.get("DAEMON_SOCKET")
+    if path is None and os.path.exists(".env"):
+        with open(".env", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.strip().partition("=")
+                if key == "DAEMON_SOCKET" and value:
+                    path = value.strip("'\"")
+    cache_dir = os.environ.get("CACHE_DIR", ".sql_agent")
+    return path or os.path.join(cache_dir, "agent.sock")
+
+
+def request(path, payload):
+    """Send one request and yield the daemon's events as they arrive"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+        with client.makefile("r", encoding="utf-8") as events:
+            for line in events:
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("question", nargs="*", help="Question to ask")
+    parser.add_argument("--session", help="Keep conversation history under this name")
+    parser.add_argument("--quiet", action="store_true", help="Only print the answer")
+    parser.add_argument(
+        "--no-stream", action="store_true", help="Print the answer only when complete"
+    )
+    parser.add_argument(
+        "--no-llm-cache", action="store_true", help="Send every LLM call to the model"
+    )
+    parser.add_argument("--ping", action="store_true", help="Check the daemon is up")
+    parser.add_argument("--socket", default=None, help="Daemon socket path")
+    args = parser.parse_args()
+
+    path = args.socket or socket_path()
+    if args.ping:
+        payload = {"command": "ping"}
+    else:
+        question = " ".join(args.question).strip()
+        if not question:
+            parser.error("Please write a question.")
+        payload = {
+            "question": question,
+            "session": args.session,
+            "verbose": not args.quiet,
+            # Streamed text may be taken back, so only stream to a terminal
+            "stream": not args.no_stream and sys.stdout.isatty(),
+            "llm_cache": not args.no_llm_cache,
+        }
+
+    streamed = False
+    try:
+        for event in request(path, payload):
+            if event["event"] == "log":
+                print(event["message"], file=sys.stderr)
+            elif event["event"] == "token":
+                print(event["content"], end="", flush=True)
+                streamed = True
+            elif event["event"] == "thought":
+                # The text just printed was written before a tool call
+                print()
+                print("💭 ↑ Not part of the answer", file=sys.stderr)
+                streamed = False
+            elif event["event"] == "answer":
+                # A streamed answer has already been printed
+                print("" if streamed else event["content"])
+            elif event["event"] == "pong":
+                print(f"✅ Daemon up (pid {event['pid']}, {event['uptime']:.0f}s)")
+            elif event["event"] == "error":
+                print(f"❌ Error: {event['error']}", file=sys.stderr)
+                return 1
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(
+            f"❌ No daemon listening on {path}. Start it with 'make daemon'.",
+            file=sys.stderr,
+        )
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+import re
+import time
+
+from query_utils import is_ddl_query, normalize_sql, split_statements
+
+INSERT_PATTERN = re.compile(
+    r"^\s*INSERT\s+INTO\s+([\w.\"`\[\]]+)\s*\(([^)]*)\)\s*VALUES\s*(.*)$",
+    re.IGNORECASE | re.DOTALL,
+)
+# Backends that commit the open transaction before every DDL statement
+IMPLICIT_COMMIT_BACKENDS = ("mysql", "mariadb")
+
+
+def split_value_rows(values_sql):
+    """Split a VALUES list into its row tuples, or None if it is not a plain list"""
+    rows = []
+    depth = 0
+    quote = None
+    start = None
+    for i, char in enumerate(values_sql):
+        if quote:
+            if char == quote:
+                quote = None
+            continue
+        if char in ("'", '"'):
+            quote = char
+        elif char == "(":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                rows.append(values_sql[start : i + 1])
+            elif depth < 0:
+                return None
+        elif depth == 0 and not (char.isspace() or char == ","):
+            # Trailing clauses (RETURNING, ON CONFLICT, ...) are not coalesced
+            return None
+    if depth != 0 or quote or not rows:
+        return None
+    return rows
+
+
+def parse_insert(statement):
+    """Return (table, columns, rows) for a plain INSERT ... VALUES statement"""
+    match = INSERT_PATTERN.match(statement)
+    if not match:
+        return None
+    rows = split_value_rows(match.group(3))
+    if rows is None:
+        return None
+    columns = ", ".join(column.strip() for column in match.group(2).split(","))
+    return match.group(1), columns, rows
+
+
+class BatchExecutor:
+    """Run a staged plan of modification statements in a single transaction"""
+
+    def __init__(self, engine, max_rows_per_insert=500):
+        self.engine = engine
+        self.max_rows_per_insert = max_rows_per_insert
+
+    def plan(self, statements):
+        """Coalesce consecutive INSERTs into the same table and columns"""
+        planned = []
+        pending = None  # (table, columns, rows, source statement count)
+
+        def flush():
+            if pending is None:
+                return
+            table, columns, rows, sources = pending
+            for i in range(0, len(rows), self.max_rows_per_insert):
+                chunk = rows[i : i + self.max_rows_per_insert]
+                planned.append(
+                    {
+                        "sql": f"INSERT INTO {table} ({columns}) VALUES "
+                        + ", ".join(chunk),
+                        "sources": sources,
+                    }
+                )
+
+        for statement in statements:
+            insert = parse_insert(statement)
+            if insert is not None:
+                table, columns, rows = insert
+                key = (normalize_sql(table), normalize_sql(columns))
+                if pending is not None and (
+                    normalize_sql(pending[0]),
+                    normalize_sql(pending[1]),
+                ) == key:
+                    pending[2].extend(rows)
+                    pending[3].append(statement)
+                    continue
+                flush()
+                pending = (table, columns, list(rows), [statement])
+                continue
+
+            flush()
+            pending = None
+            planned.append({"sql": statement, "sources": [statement]})
+
+        flush()
+        return planned
+
+    def execute(self, statements):
+        """Execute the statements atomically, rolling back everything on failure"""
+        statements = [
+            single for statement in statements for single in split_statements(statement)
+        ]
+        planned = self.plan(statements)
+        started = time.perf_counter()
+        rows_affected = 0
+        backend = self.engine.dialect.name
+
+        if backend in IMPLICIT_COMMIT_BACKENDS and len(statements) > 1:
+            ddl = next((s for s in statements if is_ddl_query(s)), None)
+            if ddl is not None:
+                return {
+                    "committed": False,
+                    "statements": len(statements),
+                    "executed": 0,
+                    "failed": ddl,
+                    "error": f"{backend} commits schema changes immediately, so "
+                    "they cannot be rolled back with the rest of a batch. Submit "
+                    "each CREATE/ALTER/DROP as a batch of its own.",
+                    "elapsed": time.perf_counter() - started,
+                }
+
+        connection = self.engine.connect()
+        if backend == "sqlite":
+            # pysqlite only opens a transaction before DML, so DDL would be
+            # committed on its own: drive the transaction with an explicit BEGIN
+            connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+            transaction = _ExplicitTransaction(connection)
+        else:
+            transaction = connection.begin()
+        try:
+            for executed, step in enumerate(planned):
+                try:
+                    # No parameters, so drivers such as psycopg2 (pyformat)
+                    # pass a literal % through instead of reading a placeholder
+                    result = connection.exec_driver_sql(
+                        step["sql"], execution_options={"no_parameters": True}
+                    )
+                except Exception as e:
+                    transaction.rollback()
+                    return {
+                        "committed": False,
+                        "statements": len(statements),
+                        "executed": executed,
+                        "failed": step["sources"][0]
+                        if len(step["sources"]) == 1
+                        else f"{len(step['sources'])} coalesced INSERTs into the same table",
+                        "error": str(getattr(e, "orig", None) or e),
+                        "elapsed": time.perf_counter() - started,
+                    }
+                if result.rowcount and result.rowcount > 0:
+                    rows_affected += result.rowcount
+            transaction.commit()
+        finally:
+            connection.close()
+
+        return {
+            "committed": True,
+            "statements": len(statements),
+            "executed": len(planned),
+            "rows_affected": rows_affected,
+            "elapsed": time.perf_counter() - started,
+        }
+
+
+class _ExplicitTransaction:
+    """BEGIN / COMMIT / ROLLBACK issued on an autocommit connection"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        connection.exec_driver_sql("BEGIN")
+
+    def commit(self):
+        self.connection.exec_driver_sql("COMMIT")
+
+    def rollback(self):
+        # SQLite already rolled back after some errors (interrupts, disk full)
+        if self.connection.connection.dbapi_connection.in_transaction:
+            self.connection.exec_driver_sql("ROLLBACK")
+
+
+def describe_batch(result):
+    """Summarize a batch run for the LLM"""
+    if not result["committed"]:
+        return (
+            f"Error: batch rolled back, no changes were made. "
+            f"Failing statement: {result['failed']}\n"
+            f"Database error: {result['error']}"
+        )
+    return (
+        f"Batch committed in one transaction: {result['statements']} statement(s) "
+        f"executed as {result['executed']} database call(s), "
+        f"{result['rows_affected']} row(s) affected "
+        f"in {result['elapsed'] * 1000:.0f} ms."
+    )
@@ -0,0 +1,274 @@
+"""Offline benchmark: replay recorded trajectories and compare against a baseline"""
+
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import event
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+TRAJECTORIES_FILE = os.path.join("benchmarks", "trajectories.json")
+BASELINE_FILE = os.path.join("benchmarks", "baseline.json")
+
+# Metrics compared against the baseline: timings and memory may drift within
+# the tolerance, counts come from a deterministic replay and must not grow
+RELATIVE_METRICS = ["wall_time", "tool_time", "db_time", "peak_memory_kb"]
+EXACT_METRICS = ["agent_steps", "llm_calls", "tool_calls", "tool_errors", "db_queries"]
+# Differences below these are noise, whatever the relative change
+NOISE_FLOOR = {
+    "wall_time": 0.05,
+    "tool_time": 0.02,
+    "db_time": 0.005,
+    "peak_memory_kb": 256,
+}
+
+
+class RunMetrics(BaseCallbackHandler):
+    """Count LLM calls, tool calls, tool time and tokens for one question"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.llm_calls = 0
+        self.agent_steps = 0
+        self.prompt_tokens = 0
+        self.tool_calls = 0
+        self.tool_errors = 0
+        self.tool_time = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self._tool_started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        with self.lock:
+            self.llm_calls += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                with self.lock:
+                    self.prompt_tokens += usage.get("input_tokens", 0)
+                    if getattr(message, "tool_calls", None):
+                        self.agent_steps += 1
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        with self.lock:
+            self.tool_calls += 1
+            self._tool_started[run_id] = time.perf_counter()
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = str(getattr(output, "content", output))
+        with self.lock:
+            self.tool_time += time.perf_counter() - self._tool_started.pop(run_id)
+            if content.startswith("Error") or "has problems" in content:
+                self.tool_errors += 1
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        with self.lock:
+            self.tool_time += time.perf_counter() - self._tool_started.pop(run_id)
+            self.tool_errors += 1
+
+    def track_engine(self, engine):
+        """Time every statement sent to the database through the engine"""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("bench_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            elapsed = time.perf_counter() - conn.info["bench_started"].pop()
+            with self.lock:
+                self.db_queries += 1
+                self.db_time += elapsed
+
+
+def load_agent(database, trajectories, workdir):
+    """Import the agent against a private copy of the database and fresh caches"""
+    database_copy = os.path.join(workdir, os.path.basename(database))
+    shutil.copyfile(database, database_copy)
+
+    os.environ["LLM_PROVIDER"] = "scripted"
+    os.environ["SCRIPTED_LLM_FILE"] = trajectories
+    os.environ["DATABASE_URI"] = f"sqlite:///{database_copy}"
+    os.environ["DATABASE_TYPE"] = "SQLite"
+    os.environ["DATABASE_READ_URI"] = ""
+    os.environ["CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["EXPORT_DIR"] = os.path.join(workdir, "exports")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import testing_blade
+
+        testing_blade.initialize()
+    return testing_blade
+
+
+def run_question(agent, metrics, question, repeat):
+    """Run one question repeat times; the first run is cold, the rest warm"""
+    runs = []
+    for _ in range(repeat):
+        metrics.reset()
+        tracemalloc.start()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            answer, _ = agent.execute_with_batch_safety(
+                [{"role": "user", "content": question["question"]}],
+                callbacks=[metrics],
+            )
+        wall_time = time.perf_counter() - started
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        runs.append(
+            {
+                "wall_time": round(wall_time, 4),
+                "agent_steps": metrics.agent_steps,
+                "llm_calls": metrics.llm_calls,
+                "prompt_tokens": metrics.prompt_tokens,
+                "tool_calls": metrics.tool_calls,
+                "tool_errors": metrics.tool_errors,
+                "tool_time": round(metrics.tool_time, 4),
+                "db_queries": metrics.db_queries,
+                "db_time": round(metrics.db_time, 4),
+                "peak_memory_kb": peak_memory // 1024,
+                "answer": answer,
+            }
+        )
+
+    result = {"id": question["id"], "question": question["question"], **runs[0]}
+    if len(runs) > 1:
+        result["warm_wall_time"] = round(
+            statistics.median(run["wall_time"] for run in runs[1:]), 4
+        )
+    return result
+
+
+def compare(report, baseline, tolerance):
+    """List the metrics that regressed against the baseline"""
+    current = {result["id"]: result for result in report["questions"]}
+    regressions = []
+    for expected in baseline["questions"]:
+        result = current.get(expected["id"])
+        if result is None:
+            regressions.append(f"{expected['id']}: missing from this run")
+            continue
+        for metric in RELATIVE_METRICS:
+            before, after = expected.get(metric), result[metric]
+            if before is None:
+                continue
+            if after > before * (1 + tolerance) and after - before > NOISE_FLOOR[metric]:
+                regressions.append(f"{expected['id']}: {metric} {before} -> {after}")
+        for metric in EXACT_METRICS:
+            before, after = expected.get(metric), result[metric]
+            if before is not None and after > before:
+                regressions.append(f"{expected['id']}: {metric} {before} -> {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database", default="Chinook.db", help="SQLite database file")
+    parser.add_argument("--trajectories", default=TRAJECTORIES_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--out", help="Write the JSON report to this file")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per question")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=float(os.environ.get("BENCH_TOLERANCE", "0.25")),
+        help="Allowed relative slowdown before a timing counts as a regression",
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="Save this run as the baseline"
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.database):
+        print(f"❌ Database not found: {args.database}. Run 'make download-db' first.")
+        return 1
+
+    with open(args.trajectories, encoding="utf-8") as f:
+        questions = json.load(f)["questions"]
+
+    workdir = tempfile.mkdtemp(prefix="sql_agent_bench_")
+    try:
+        agent = load_agent(args.database, args.trajectories, workdir)
+        metrics = RunMetrics()
+        metrics.track_engine(agent.db._engine)
+
+        # Warm up the agent graph with a question that has no trajectory: it
+        # gets the fallback answer without touching the database or caches
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.execute_with_batch_safety(
+                [{"role": "user", "content": "Benchmark warm-up"}]
+            )
+
+        results = []
+        for question in questions:
+            result = run_question(agent, metrics, question, max(args.repeat, 1))
+            results.append(result)
+            print(
+                f"⏱️  {result['id']}: {result['wall_time'] * 1000:.1f} ms, "
+                f"{result['agent_steps']} steps, {result['tool_calls']} tool calls, "
+                f"db {result['db_time'] * 1000:.1f} ms, "
+                f"{result['peak_memory_kb']} KB peak"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "database": args.database,
+        "repeat": args.repeat,
+        "questions": results,
+        "totals": {
+            metric: round(sum(result[metric] for result in results), 4)
+            for metric in RELATIVE_METRICS + EXACT_METRICS + ["prompt_tokens"]
+        },
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"📄 Report written to {args.out}")
+    else:
+        print(output)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"📌 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        # Without a baseline nothing is compared, which must not pass as success
+        print(f"❌ No baseline at {args.baseline}. Run 'make bench-baseline' to create one.")
+        return 1
+
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(report, json.load(f), args.tolerance)
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) against {args.baseline}:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        return 1
+    print(f"✅ No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
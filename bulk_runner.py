@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import json
+import random
+import threading
+import time
+
+from query_utils import requires_modifications
+
+
+def load_questions(path):
+    """Read questions from a text file (one per line) or JSONL with a "question" field"""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if path.endswith(".jsonl"):
+                entry = json.loads(line)
+                questions.append(
+                    {"id": str(entry.get("id", number)), "question": entry["question"]}
+                )
+            else:
+                questions.append({"id": str(number), "question": line})
+    return questions
+
+
+def is_rate_limit_error(error):
+    """Whether an LLM error means we are sending requests too fast"""
+    status = getattr(error, "status_code", None) or getattr(
+        getattr(error, "response", None), "status_code", None
+    )
+    return status == 429 or "ratelimit" in type(error).__name__.lower()
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, if it said so"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that halves on rate limits and grows back on success"""
+
+    def __init__(self, max_concurrency, base_delay=1.0, max_delay=60.0, increase_after=5):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.increase_after = increase_after
+        self.active = 0
+        self.rate_limits = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Wait for a free slot and for any backoff pause to end"""
+        with self._condition:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self.active < self.limit:
+                    self.active += 1
+                    return
+                self._condition.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, rate_limited=False, attempt=0, delay=None):
+        """Free a slot, backing everyone off after a rate limit"""
+        with self._condition:
+            self.active -= 1
+            if rate_limited:
+                self.rate_limits += 1
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2**attempt)
+                    delay *= random.uniform(1.0, 1.5)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            else:
+                self._successes += 1
+                if self.limit < self.max_concurrency and self._successes >= self.increase_after:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+def run_bulk(questions, answer, out_path, workers=4, max_retries=5, log=print):
+    """Answer independent read-only questions concurrently, streaming results to JSONL
+
+    answer(question) returns the answer text. Results are written as each
+    question finishes, so the output is in completion order; "index" keeps
+    the position in the input file.
+    """
+    limiter = AdaptiveLimiter(workers)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    def process(index, entry):
+        result = {"index": index, "id": entry["id"], "question": entry["question"]}
+        if requires_modifications(entry["question"]):
+            return {
+                **result,
+                "status": "skipped",
+                "error": "Modification requests are not run in bulk mode",
+            }
+
+        question_started = time.perf_counter()
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                response = answer(entry["question"])
+            except Exception as e:
+                if is_rate_limit_error(e) and attempt < max_retries:
+                    limiter.release(rate_limited=True, attempt=attempt, delay=retry_after(e))
+                    continue
+                limiter.release()
+                return {
+                    **result,
+                    "status": "error",
+                    "error": str(e),
+                    "attempts": attempt + 1,
+                    "elapsed": round(time.perf_counter() - question_started, 3),
+                }
+            limiter.release()
+            return {
+                **result,
+                "status": "ok",
+                "answer": response,
+                "attempts": attempt + 1,
+                "elapsed": round(time.perf_counter() - question_started, 3),
+            }
+
+    with open(out_path, "w", encoding="utf-8") as out, ThreadPoolExecutor(
+        max_workers=workers
+    ) as pool:
+        futures = [
+            pool.submit(process, index, entry) for index, entry in enumerate(questions)
+        ]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            counts[result["status"]] += 1
+            icon = {"ok": "✅", "error": "❌", "skipped": "⏭️ "}[result["status"]]
+            elapsed = f" in {result['elapsed']:.2f}s" if "elapsed" in result else ""
+            log(f"{icon} [{done}/{len(questions)}] {result['id']}{elapsed}")
+
+    wall_time = time.perf_counter() - started
+    return {
+        **counts,
+        "questions": len(questions),
+        "wall_time": wall_time,
+        "throughput": len(questions) / wall_time * 60 if wall_time else 0.0,
+        "rate_limits": limiter.rate_limits,
+        "final_concurrency": limiter.limit,
+    }
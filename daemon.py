@@ -0,0 +1,147 @@
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import testing_blade as agent
+
+
+class AgentDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Keep the agent warm and answer questions sent over a Unix domain socket
+
+    Each connection carries one JSON request line and receives JSON event
+    lines back: "log" lines while the agent works, then "answer" or "error".
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path):
+        self.started = time.time()
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                # Left behind by a daemon that did not shut down cleanly
+                os.unlink(path)
+            else:
+                raise RuntimeError(f"A daemon is already listening on {path}")
+            finally:
+                probe.close()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        super().__init__(path, AgentRequestHandler)
+        os.chmod(path, 0o600)
+
+    def session(self, name):
+        """History and lock for a named session, so follow-ups keep context"""
+        with self.sessions_lock:
+            if name not in self.sessions:
+                # With the thread store on, histories are reloaded from their
+                # checkpoint instead of being kept in memory (see history())
+                history = agent.new_history() if agent.thread_store is None else None
+                self.sessions[name] = (history, threading.Lock())
+            return self.sessions[name]
+
+    def history(self, name):
+        """A session's history; call with the session lock held"""
+        history, _ = self.session(name)
+        if history is None:
+            history = agent.load_history(name) or agent.new_history()
+        return history
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+    def send(self, event, **data):
+        self.wfile.write((json.dumps({"event": event, **data}) + "\n").encode("utf-8"))
+        self.wfile.flush()
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # Connection probe, e.g. another daemon checking the socket
+            return
+        try:
+            request = json.loads(line)
+        except ValueError:
+            self.send("error", error="Invalid request")
+            return
+
+        if request.get("command") == "ping":
+            self.send(
+                "pong",
+                pid=os.getpid(),
+                uptime=time.time() - self.server.started,
+                sessions=len(self.server.sessions),
+            )
+            return
+
+        question = str(request.get("question", "")).strip()
+        if not question:
+            self.send("error", error="Please write a question.")
+            return
+
+        def log(message):
+            if request.get("verbose", True):
+                self.send("log", message=str(message))
+
+        def on_token(token):
+            self.send("token", content=token)
+
+        def on_thought(text):
+            self.send("thought", content=text)
+
+        stream = on_token if request.get("stream") else None
+        use_llm_cache = request.get("llm_cache", True)
+
+        started = time.perf_counter()
+        try:
+            if request.get("session"):
+                _, lock = self.server.session(request["session"])
+                with lock:
+                    agent.initialize(log=log)
+                    answer, _ = agent.follow_turn(
+                        agent.history_turn(
+                            self.server.history(request["session"]),
+                            question,
+                            request["session"],
+                            stream=stream is not None,
+                            use_llm_cache=use_llm_cache,
+                        ),
+                        log=log,
+                        on_token=stream,
+                        on_thought=on_thought,
+                    )
+                    response = answer["content"] if answer else ""
+            else:
+                response, _ = agent.execute_with_batch_safety(
+                    [{"role": "user", "content": question}],
+                    log=log,
+                    on_token=stream,
+                    use_llm_cache=use_llm_cache,
+                    on_thought=on_thought,
+                )
+        except Exception as e:
+            self.send("error", error=str(e))
+            return
+        self.send("answer", content=response, elapsed=time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    agent.initialize()
+    server = AgentDaemon(agent.DAEMON_SOCKET)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"🔌 SQL Agent daemon listening on {agent.DAEMON_SOCKET}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Daemon stopped.")
+    finally:
+        server.server_close()
+        os.unlink(agent.DAEMON_SOCKET)
@@ -0,0 +1,89 @@
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy.engine import make_url
+
+import itertools
+import threading
+import time
+
+
+def build_engine_args(
+    uri,
+    pool_size=5,
+    max_overflow=10,
+    pool_timeout=30,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    connect_timeout=10,
+):
+    """Build SQLAlchemy engine arguments for a database URI"""
+    url = make_url(uri)
+    engine_args = {"pool_pre_ping": pool_pre_ping}
+
+    if url.get_backend_name() == "sqlite":
+        # In-memory SQLite uses a single-connection pool without sizing options
+        if url.database and url.database != ":memory:":
+            engine_args.update(
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_timeout=pool_timeout,
+            )
+        engine_args["connect_args"] = {
+            "timeout": connect_timeout,
+            "check_same_thread": False,
+        }
+        return engine_args
+
+    engine_args.update(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+    )
+    if url.get_backend_name() in ("postgresql", "mysql"):
+        engine_args["connect_args"] = {"connect_timeout": connect_timeout}
+    return engine_args
+
+
+class ReadRouter:
+    """Route read queries to replicas and writes to the primary database"""
+
+    def __init__(self, primary, replicas=None, read_after_write=5):
+        self.primary = primary
+        self.replicas = replicas or []
+        self.read_after_write = read_after_write
+        self._last_write = 0.0
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_uris(cls, primary, read_uris, engine_args_for=None, read_after_write=5):
+        """Connect to each read replica URI with its own pool"""
+        replicas = [
+            SQLDatabase.from_uri(
+                uri, engine_args=engine_args_for(uri) if engine_args_for else None
+            )
+            for uri in read_uris
+        ]
+        return cls(primary, replicas, read_after_write=read_after_write)
+
+    def for_read(self):
+        """Pick the database for a read query"""
+        with self._lock:
+            if self._cycle is None:
+                return self.primary
+            # Replicas may lag, so read our own writes from the primary
+            if time.time() - self._last_write < self.read_after_write:
+                return self.primary
+            return next(self._cycle)
+
+    def for_write(self):
+        """Pick the database for a modification query"""
+        with self._lock:
+            self._last_write = time.time()
+        return self.primary
+
+    def describe(self):
+        """Return a short description of the routing setup"""
+        if not self.replicas:
+            return "primary only"
+        return f"{len(self.replicas)} read replica(s)"
@@ -0,0 +1,222 @@
+from sqlalchemy import text
+
+import csv
+import datetime
+import decimal
+import json
+import os
+import re
+import time
+import uuid
+
+EXPORT_FORMATS = ["csv", "jsonl", "parquet"]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+class _CsvWriter:
+    def __init__(self, path, columns):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _JsonlWriter:
+    def __init__(self, path, columns):
+        self._file = open(path, "w", encoding="utf-8")
+        self._columns = columns
+
+    def write(self, rows):
+        for row in rows:
+            self._file.write(
+                json.dumps(dict(zip(self._columns, row)), default=_json_default)
+            )
+            self._file.write("\n")
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    """Parquet output whose column types widen as the rows require
+
+    Types are inferred from the rows, as SQLite result columns have none: a
+    column that starts all NULL, or with integers followed by floats, gets a
+    wider type once a later batch needs it. The rows written so far are then
+    rewritten with the wider schema, streaming them back from the file.
+    """
+
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError(
+                "Parquet export requires pyarrow. Install it with 'pip install pyarrow'."
+            )
+        self._pyarrow = pyarrow
+        self._path = path
+        self._columns = columns
+        self._writer = None
+
+    def write(self, rows):
+        batch = self._pyarrow.Table.from_arrays(
+            [self._array([row[i] for row in rows]) for i in range(len(self._columns))],
+            names=self._columns,
+        )
+        if self._writer is None:
+            self._writer = self._pyarrow.parquet.ParquetWriter(
+                self._path, batch.schema
+            )
+        else:
+            schema = self._pyarrow.schema(
+                [
+                    field.with_type(self._promote(field.type, new.type))
+                    for field, new in zip(self._writer.schema, batch.schema)
+                ]
+            )
+            if not schema.equals(self._writer.schema):
+                self._rewrite(schema)
+        self._writer.write_table(batch.cast(self._writer.schema))
+
+    def close(self):
+        if self._writer is None:
+            # No rows: write an empty file with string columns
+            schema = self._pyarrow.schema(
+                [(column, self._pyarrow.string()) for column in self._columns]
+            )
+            self._pyarrow.parquet.write_table(schema.empty_table(), self._path)
+        else:
+            self._writer.close()
+
+    def _array(self, values):
+        values = [
+            _json_default(value)
+            if isinstance(value, (decimal.Decimal, datetime.time))
+            else value
+            for value in values
+        ]
+        try:
+            return self._pyarrow.array(values)
+        except (self._pyarrow.ArrowInvalid, self._pyarrow.ArrowTypeError):
+            # Mixed types in one column (SQLite): keep the values as text
+            return self._pyarrow.array(
+                [None if value is None else str(value) for value in values],
+                self._pyarrow.string(),
+            )
+
+    def _promote(self, current, new):
+        types = self._pyarrow.types
+        if current.equals(new) or types.is_null(new):
+            return current
+        if types.is_null(current):
+            return new
+        if types.is_integer(current) and types.is_integer(new):
+            return self._pyarrow.int64()
+        if (types.is_integer(current) or types.is_floating(current)) and (
+            types.is_integer(new) or types.is_floating(new)
+        ):
+            return self._pyarrow.float64()
+        return self._pyarrow.string()
+
+    def _rewrite(self, schema):
+        self._writer.close()
+        written = f"{self._path}.partial"
+        os.replace(self._path, written)
+        try:
+            self._writer = self._pyarrow.parquet.ParquetWriter(self._path, schema)
+            for batch in self._pyarrow.parquet.ParquetFile(written).iter_batches():
+                self._writer.write_table(
+                    self._pyarrow.Table.from_batches([batch]).cast(schema)
+                )
+        finally:
+            os.remove(written)
+
+
+WRITERS = {"csv": _CsvWriter, "jsonl": _JsonlWriter, "parquet": _ParquetWriter}
+
+
+def export_path(export_dir, fmt, filename=None):
+    """Build the output path, keeping exports inside export_dir"""
+    if filename:
+        name = re.sub(r"[^\w.-]", "_", os.path.basename(filename))
+        if not name.endswith(f".{fmt}"):
+            name = f"{name}.{fmt}"
+    else:
+        # The random suffix keeps exports started in the same second apart
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        name = f"export_{stamp}_{uuid.uuid4().hex[:8]}.{fmt}"
+    os.makedirs(export_dir, exist_ok=True)
+    return os.path.join(export_dir, name)
+
+
+def export_query(engine, query, path, fmt="csv", batch_size=1000, preview_rows=5):
+    """Stream the rows of a read query to a file in bounded memory"""
+    if fmt not in WRITERS:
+        raise ValueError(
+            f"Unknown export format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}"
+        )
+
+    row_count = 0
+    preview = []
+    started = time.perf_counter()
+
+    with engine.connect() as connection:
+        # stream_results uses a server-side (named) cursor on PostgreSQL;
+        # SQLite already steps through rows as they are fetched
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=batch_size
+        ).execute(text(query))
+        if not result.returns_rows:
+            raise ValueError("Only queries that return rows can be exported")
+
+        columns = list(result.keys())
+        writer = WRITERS[fmt](path, columns)
+        try:
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    break
+                rows = [tuple(row) for row in rows]
+                if len(preview) < preview_rows:
+                    preview.extend(rows[: preview_rows - len(preview)])
+                writer.write(rows)
+                row_count += len(rows)
+        finally:
+            writer.close()
+            result.close()
+
+    return {
+        "path": path,
+        "format": fmt,
+        "rows": row_count,
+        "columns": columns,
+        "preview": preview,
+        "bytes": os.path.getsize(path),
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def describe_export(export):
+    """Summarize an export for the LLM without including the data itself"""
+    preview = "\n".join(str(row) for row in export["preview"])
+    return (
+        f"Exported {export['rows']} rows to {export['path']} "
+        f"({export['format']}, {export['bytes']} bytes).\n"
+        f"Columns: {', '.join(export['columns'])}\n"
+        f"Preview:\n{preview or '(no rows)'}"
+    )
@@ -0,0 +1,172 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.graph import END, START, StateGraph
+from typing_extensions import Annotated, TypedDict
+
+from query_utils import is_modification_query, split_statements
+
+WRITE_QUERY_PROMPT = """Given an input question, create one syntactically correct {dialect} query to run to help find the answer.
+Unless the user specifies in the question a specific number of examples they wish to obtain, always limit your query to at most {top_k} results. You can order the results by a relevant column to return the most interesting examples in the database.
+Never query for all the columns from a specific table, only ask for the few relevant columns given the question.
+Pay attention to use only the column names that you can see in the schema description. Be careful to not query for columns that do not exist. Also, pay attention to which column is in which table.
+If the question cannot be answered with a single SELECT query, or asks to change data, return an empty query.
+
+Only use the following tables:
+{table_info}"""
+
+ANSWER_PROMPT = """Given the user question, the SQL query that was run and its result, answer the user question.
+Answer from the result only, clearly and concisely.
+
+SQL Query: {query}
+SQL Result:
+{result}"""
+
+# Results that mean the query found nothing, for either result format
+EMPTY_RESULTS = ("", "[]", "(0 rows)")
+
+
+class QueryOutput(TypedDict):
+    """Generated SQL query."""
+
+    query: Annotated[str, ..., "Syntactically valid SQL query."]
+
+
+class FastPathState(TypedDict, total=False):
+    messages: list
+    query: str
+    result: str
+    answer: str
+    escalate: str
+
+
+class FastPath:
+    """Answer a read-only question in two LLM calls: write the query, then answer
+
+    The write_query -> execute_query -> generate_answer pipeline. The query runs
+    through the agent's query tool, so caches, replicas and tracing apply. A
+    question that needs anything else ends with an escalate reason instead of
+    an answer, and should go to the full agent.
+    """
+
+    def __init__(self, llm, query_tool, schema_context, dialect="SQLite", top_k=5):
+        self.llm = llm
+        self.query_tool = query_tool
+        self.schema_context = schema_context
+        self.dialect = dialect
+        self.top_k = top_k
+        self.graph = self._build_graph()
+
+    def run(self, messages, config=None):
+        """Run the pipeline on a conversation; the last message is the question"""
+        return self.graph.invoke({"messages": messages}, config)
+
+    def stream(self, messages, config=None, tokens=True):
+        """Run the pipeline, yielding ("token", text) as the answer is generated
+
+        The last item is ("state", state) with the query, result, answer or
+        escalate reason, merged from the update events of each node.
+        """
+        state = {}
+        for stream_mode, chunk in self.graph.stream(
+            {"messages": messages},
+            config,
+            stream_mode=["updates", "messages"] if tokens else ["updates"],
+        ):
+            if stream_mode == "messages":
+                token = _answer_token(*chunk)
+                if token:
+                    yield "token", token
+            else:
+                for update in chunk.values():
+                    state.update(update or {})
+        yield "state", state
+
+    async def astream(self, messages, config=None, tokens=True):
+        """Async version of stream()"""
+        state = {}
+        async for stream_mode, chunk in self.graph.astream(
+            {"messages": messages},
+            config,
+            stream_mode=["updates", "messages"] if tokens else ["updates"],
+        ):
+            if stream_mode == "messages":
+                token = _answer_token(*chunk)
+                if token:
+                    yield "token", token
+            else:
+                for update in chunk.values():
+                    state.update(update or {})
+        yield "state", state
+
+    def _build_graph(self):
+        builder = StateGraph(FastPathState)
+        builder.add_node("write_query", self.write_query)
+        builder.add_node("execute_query", self.execute_query)
+        builder.add_node("generate_answer", self.generate_answer)
+        builder.add_edge(START, "write_query")
+        builder.add_conditional_edges("write_query", _next_step("execute_query"))
+        builder.add_conditional_edges("execute_query", _next_step("generate_answer"))
+        builder.add_edge("generate_answer", END)
+        return builder.compile()
+
+    def write_query(self, state, config):
+        """Generate the SQL query, with the schema and conversation as context"""
+        question = state["messages"][-1]["content"]
+        prompt = WRITE_QUERY_PROMPT.format(
+            dialect=self.dialect,
+            top_k=self.top_k,
+            table_info=self.schema_context(question),
+        )
+        try:
+            output = self.llm.with_structured_output(QueryOutput).invoke(
+                [SystemMessage(content=prompt)]
+                + state["messages"][:-1]
+                + [HumanMessage(content=question)],
+                config,
+            )
+        except Exception as e:
+            return {"escalate": f"no query generated ({e})"}
+
+        query = str((output or {}).get("query") or "").strip()
+        if not query:
+            return {"escalate": "no query generated"}
+        if is_modification_query(query):
+            return {"escalate": "the query modifies data"}
+        if len(split_statements(query)) > 1:
+            return {"escalate": "the question needs several queries"}
+        return {"query": query}
+
+    def execute_query(self, state, config):
+        """Run the query through the agent's query tool"""
+        result = self.query_tool.invoke({"query": state["query"]}, config)
+        if result.startswith("Error:"):
+            return {"result": result, "escalate": "the query failed"}
+        if result.strip() in EMPTY_RESULTS:
+            return {"result": result, "escalate": "the query returned no rows"}
+        return {"result": result}
+
+    def generate_answer(self, state, config):
+        """Answer the question from the query result"""
+        prompt = ANSWER_PROMPT.format(query=state["query"], result=state["result"])
+        response = self.llm.invoke(
+            [SystemMessage(content=prompt)] + state["messages"], config
+        )
+        answer = str(response.content).strip()
+        if not answer:
+            return {"escalate": "no answer generated"}
+        return {"answer": answer}
+
+
+def _answer_token(message, metadata):
+    # Only the answer is shown; the query is written as a structured tool call
+    if metadata.get("langgraph_node") != "generate_answer":
+        return ""
+    if not isinstance(message, AIMessage):
+        return ""
+    return message.text()
+
+
+def _next_step(node):
+    def route(state):
+        return END if state.get("escalate") else node
+
+    return route
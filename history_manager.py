@@ -0,0 +1,134 @@
+import threading
+
+from token_utils import count_message_tokens, count_tokens
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and a SQL database agent.
+Keep every fact the user may refer back to: table and column names, entity names and IDs, numbers returned, pending plans and whether they were confirmed or executed.
+Write at most {max_words} words. Reply with the summary only.
+
+Current summary:
+{summary}
+
+New messages to fold in:
+{messages}"""
+
+
+class HistoryManager:
+    """Conversation history kept within a token budget by rolling summarization"""
+
+    def __init__(
+        self, llm=None, token_budget=3000, keep_turns=4, model="gpt-4o-mini"
+    ):
+        self.llm = llm
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.model = model
+        self.summary = ""
+        self.turns = []
+        self._lock = threading.Lock()
+
+    def add(self, role, content):
+        """Append a message to the history"""
+        with self._lock:
+            self.turns.append({"role": role, "content": content})
+
+    def discard_last(self, role, content):
+        """Remove the last message if it is this one, undoing an unanswered turn"""
+        with self._lock:
+            if self.turns and self.turns[-1] == {"role": role, "content": content}:
+                self.turns.pop()
+
+    def messages(self):
+        """Return the messages to send to the agent"""
+        with self._lock:
+            if not self.summary:
+                return list(self.turns)
+            return [
+                {"role": "system", "content": SUMMARY_PREFIX + self.summary}
+            ] + self.turns
+
+    def clear(self):
+        """Forget the whole conversation"""
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+
+    def state(self):
+        """Return the summary and turns, to checkpoint the conversation"""
+        with self._lock:
+            return {"summary": self.summary, "turns": list(self.turns)}
+
+    def restore(self, state):
+        """Replace the conversation with a checkpointed state"""
+        with self._lock:
+            self.summary = state.get("summary", "")
+            self.turns = list(state.get("turns", []))
+
+    def token_count(self):
+        """Count the tokens the history adds to the prompt"""
+        return count_message_tokens(self.messages(), self.model)
+
+    def compact(self):
+        """Fold the oldest turns into the summary until the history fits the budget
+
+        The turns are only dropped once the summary is written, so a failed
+        summarization leaves the history as it was.
+        """
+        with self._lock:
+            turns = list(self.turns)
+            folded = []
+            while _user_turns(turns) > 1 and (
+                _user_turns(turns) > self.keep_turns
+                or self._over_budget(turns, folded)
+            ):
+                folded.extend(_pop_oldest_turn(turns))
+
+            if folded:
+                self.summary = self._summarize(folded)
+                self.turns = turns
+            return len(folded)
+
+    def _max_summary_words(self):
+        return max(self.token_budget // 8, 50)
+
+    def _over_budget(self, turns, pending):
+        # The folded turns end up in the summary, which is capped in length
+        summary = count_tokens(self.summary, self.model)
+        if pending:
+            summary = min(
+                summary + count_message_tokens(pending, self.model),
+                self._max_summary_words() * 4 // 3,
+            )
+        return count_message_tokens(turns, self.model) + summary > self.token_budget
+
+    def _summarize(self, messages):
+        transcript = "\n".join(
+            f"{message['role']}: {message['content']}" for message in messages
+        )
+        if self.llm is None:
+            # Without a model, keep the most recent part of the transcript,
+            # as long as a summary may be at ~4 characters per token
+            text = f"{self.summary}\n{transcript}".strip()
+            return text[-self._max_summary_words() * 16 // 3 :]
+
+        response = self.llm.invoke(
+            SUMMARY_PROMPT.format(
+                max_words=self._max_summary_words(),
+                summary=self.summary or "(empty)",
+                messages=transcript,
+            )
+        )
+        return response.content.strip()
+
+
+def _user_turns(turns):
+    return sum(message["role"] == "user" for message in turns)
+
+
+def _pop_oldest_turn(turns):
+    turn = [turns.pop(0)]
+    while turns and turns[0]["role"] != "user":
+        turn.append(turns.pop(0))
+    return turn
@@ -0,0 +1,196 @@
+from sqlalchemy import inspect, text
+
+import math
+import re
+
+from query_validator import strip_literals
+from workload import table_aliases
+
+# Text after WHERE, up to the next clause
+WHERE_PATTERN = re.compile(
+    r"\bwhere\b(.*?)(?=\b(?:where|join|inner|left|right|full|cross|select|from"
+    r"|group\s+by|order\s+by|limit|having|union|except|intersect)\b|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+ORDER_BY_PATTERN = re.compile(
+    r"\border\s+by\b(.*?)(?=\b(?:limit|offset)\b|\)|$)", re.IGNORECASE | re.DOTALL
+)
+COLUMN_REFERENCE = re.compile(r"(?:\b(\w+)\.)?\b(\w+)\b")
+EQUALITY_AFTER = re.compile(r"^\s*(?:==?(?!=)|in\b|is\b)", re.IGNORECASE)
+RANGE_AFTER = re.compile(r"^\s*(?:<=?|>=?|between\b|like\b)", re.IGNORECASE)
+EQUALITY_BEFORE = re.compile(r"(?:^|[^!<>=])==?\s*$")
+RANGE_BEFORE = re.compile(r"[<>]=?\s*$")
+MAX_INDEX_COLUMNS = 3
+
+
+class IndexAdvisor:
+    """Turn the full scans in the workload log into candidate indexes"""
+
+    def __init__(self, db, workload_log, min_rows=1000):
+        self.db = db
+        self.workload_log = workload_log
+        self.min_rows = min_rows
+
+    def advise(self, limit=10):
+        """Candidate indexes, most rows avoided first"""
+        inspector = inspect(self.db._engine)
+        columns = {}
+        candidates = {}
+        for entry in self.workload_log.flagged():
+            sorted_query = any(f["type"] == "sort" for f in entry["findings"])
+            for finding in entry["findings"]:
+                if finding["type"] != "full_scan":
+                    continue
+                table = finding["table"]
+                if table not in columns:
+                    columns[table] = self._columns(inspector, table)
+                index_columns = finding.get("columns") or candidate_columns(
+                    entry["query"], table, columns, sorted_query
+                )
+                if not index_columns:
+                    continue
+                candidate = candidates.setdefault(
+                    (table, tuple(index_columns)),
+                    {"queries": 0, "duration": 0.0, "example": entry["query"]},
+                )
+                candidate["queries"] += 1
+                candidate["duration"] += entry["duration"]
+
+        suggestions = []
+        existing = {}
+        for (table, index_columns), candidate in candidates.items():
+            if table not in existing:
+                existing[table] = self._indexes(inspector, table)
+            if any(
+                index[: len(index_columns)] == list(index_columns)
+                for index in existing[table]
+            ):
+                continue
+            table_rows = self._table_rows(table)
+            if table_rows < self.min_rows:
+                continue
+            # A full scan reads every row, an index lookup about log2(rows) pages
+            rows_avoided = candidate["queries"] * max(
+                0, table_rows - math.ceil(math.log2(table_rows + 1))
+            )
+            suggestions.append(
+                {
+                    "table": table,
+                    "columns": list(index_columns),
+                    "ddl": self._ddl(table, index_columns),
+                    "queries": candidate["queries"],
+                    "duration": candidate["duration"],
+                    "table_rows": table_rows,
+                    "rows_avoided": rows_avoided,
+                    "example": candidate["example"],
+                }
+            )
+        suggestions.sort(key=lambda s: (-s["rows_avoided"], -s["duration"]))
+        return suggestions[:limit]
+
+    def _columns(self, inspector, table):
+        try:
+            columns = inspector.get_columns(table, schema=self.db._schema)
+        except Exception:
+            return []
+        return [column["name"] for column in columns]
+
+    def _indexes(self, inspector, table):
+        schema = self.db._schema
+        indexes = [
+            index["column_names"]
+            for index in inspector.get_indexes(table, schema=schema)
+        ]
+        primary_key = inspector.get_pk_constraint(table, schema=schema)
+        if primary_key.get("constrained_columns"):
+            indexes.append(primary_key["constrained_columns"])
+        return indexes
+
+    def _table_rows(self, table):
+        quoted = self.db._engine.dialect.identifier_preparer.quote(table)
+        with self.db._engine.connect() as connection:
+            if self.db.dialect == "postgresql":
+                # Planner estimate: counting a large table would take too long
+                estimate = connection.execute(
+                    text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:t)"),
+                    {"t": quoted},
+                ).scalar()
+                if estimate is not None and estimate >= 0:
+                    return int(estimate)
+            return connection.execute(text(f"SELECT COUNT(*) FROM {quoted}")).scalar()
+
+    def _ddl(self, table, index_columns):
+        quote = self.db._engine.dialect.identifier_preparer.quote
+        name = f"idx_{table}_{'_'.join(index_columns)}".lower()
+        return (
+            f"CREATE INDEX {quote(name)} ON {quote(table)} "
+            f"({', '.join(quote(column) for column in index_columns)})"
+        )
+
+
+def candidate_columns(query, table, columns, sorted_query=False):
+    """Columns of a table that a query filters on, equality first
+
+    Qualified references must use the table's name or alias; unqualified ones
+    count when no other table in the query has a column of that name. A range
+    column, or else the ORDER BY columns of a sorted query, follows the
+    equality columns, as an index can only serve one of those.
+    """
+    aliases = table_aliases(query)
+    own = {alias for alias, name in aliases.items() if name == table}
+    others = {name for name in aliases.values() if name != table}
+    own_columns = {c.lower(): c for c in columns.get(table, [])}
+    shared = {c.lower() for name in others for c in columns.get(name, [])}
+
+    def resolve(match):
+        qualifier, column = match.group(1), match.group(2).lower()
+        if column not in own_columns:
+            return None
+        if qualifier is None:
+            return None if column in shared else own_columns[column]
+        return own_columns[column] if qualifier.lower() in own else None
+
+    stripped = strip_literals(query)
+    equality, ranges = [], []
+    for predicate in WHERE_PATTERN.findall(stripped):
+        for match in COLUMN_REFERENCE.finditer(predicate):
+            column = resolve(match)
+            if column is None:
+                continue
+            after, before = predicate[match.end() :], predicate[: match.start()]
+            if EQUALITY_AFTER.match(after) or EQUALITY_BEFORE.search(before):
+                if column not in equality:
+                    equality.append(column)
+            elif RANGE_AFTER.match(after) or RANGE_BEFORE.search(before):
+                if column not in ranges:
+                    ranges.append(column)
+
+    index_columns = list(equality)
+    ranges = [column for column in ranges if column not in equality]
+    if ranges:
+        index_columns.append(ranges[0])
+    elif sorted_query:
+        for order_by in ORDER_BY_PATTERN.findall(stripped):
+            for match in COLUMN_REFERENCE.finditer(order_by):
+                column = resolve(match)
+                if column is not None and column not in index_columns:
+                    index_columns.append(column)
+    return index_columns[:MAX_INDEX_COLUMNS]
+
+
+def describe_advice(suggestions, stats=None):
+    """Format index suggestions with their estimated benefit"""
+    if not suggestions:
+        logged = f" ({stats['queries']} queries logged)" if stats else ""
+        return f"No index suggestions: no costly full scans in the workload log{logged}."
+    lines = ["Suggested indexes:"]
+    for i, suggestion in enumerate(suggestions, 1):
+        lines.append(f"{i}. {suggestion['ddl']};")
+        queries = "query" if suggestion["queries"] == 1 else "queries"
+        lines.append(
+            f"   {suggestion['queries']} logged {queries} scanned all "
+            f"{suggestion['table_rows']:,} rows of {suggestion['table']} "
+            f"({suggestion['duration'] * 1000:.1f} ms total); the index would avoid "
+            f"reading about {suggestion['rows_avoided']:,} rows"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,241 @@
+from contextvars import ContextVar
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# Temperatures in the serialized model ("temperature": 0) and call kwargs
+TEMPERATURE_PATTERN = re.compile(r"""["']temperature["']\s*[:,]\s*([^,)}\s]+)""")
+
+# Message fields that are not sent to the model
+UNSENT_FIELDS = ("id", "response_metadata", "usage_metadata")
+
+_bypass = ContextVar("llm_cache_bypass", default=False)
+
+
+def bypass_llm_cache(bypass=True):
+    """Skip the LLM cache, or use it again, for calls made from the current context
+
+    Each thread and asyncio task has its own context, so this applies to one
+    session's turn: a CLI question, a daemon request or a server turn.
+    """
+    _bypass.set(bypass)
+
+
+def deterministic(llm_string):
+    """Whether every temperature set in the model parameters is 0"""
+    for value in TEMPERATURE_PATTERN.findall(llm_string):
+        try:
+            if float(value) != 0:
+                return False
+        except ValueError:
+            # None: the provider's default temperature, which is not 0
+            return False
+    return True
+
+
+def cache_key(prompt, llm_string):
+    """Hash of the model, its parameters and the messages of an LLM call
+
+    Only what is sent to the model counts: message ids (assigned per run),
+    response and usage metadata (timings, token counts) are left out, so a
+    replayed conversation matches.
+    """
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        messages = prompt
+    if isinstance(messages, list):
+        for message in messages:
+            if isinstance(message, dict):
+                for field in UNSENT_FIELDS:
+                    message.get("kwargs", {}).pop(field, None)
+    payload = json.dumps([llm_string, messages], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LLMCache(BaseCache):
+    """Persistent cache of chat model responses, for temperature-0 calls only
+
+    Responses are stored in SQLite, keyed by cache_key(). Entries expire after
+    ttl seconds, and the least recently used ones are evicted once the cache
+    holds more than max_bytes. Cached responses report no token usage, as no
+    tokens were sent, and are marked with response_metadata["llm_cache"].
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, ttl=7 * 86400):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # One write per LLM call: skip the fsync of every commit
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                generations TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_last_used
+                ON responses (last_used);
+            """
+        )
+        self._updates = 0
+        with self._lock:
+            self._bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(bytes), 0) FROM responses"
+            ).fetchone()[0]
+            self._evict()
+
+    def lookup(self, prompt, llm_string):
+        """Cached generations for an LLM call, or None on a miss or when bypassed"""
+        if _bypass.get() or not deterministic(llm_string):
+            return None
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT generations, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl and row[1] < now - self.ttl:
+                self._delete([key])
+                self._conn.commit()
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE responses SET hits = hits + 1, last_used = ? WHERE key = ?",
+                (now, key),
+            )
+            self._conn.commit()
+        return [_load(generation) for generation in json.loads(row[0])]
+
+    def update(self, prompt, llm_string, return_val):
+        """Store the generations of an LLM call"""
+        if _bypass.get() or not deterministic(llm_string):
+            return
+        generations = json.dumps([_dump(generation) for generation in return_val])
+        size = len(generations.encode())
+        if self.max_bytes and size > self.max_bytes:
+            return
+        key = cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._delete([key])
+            self._conn.execute(
+                "INSERT INTO responses (key, generations, bytes, created_at,"
+                " last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, generations, size, now, now),
+            )
+            self._bytes += size
+            self._updates += 1
+            if (self.max_bytes and self._bytes > self.max_bytes) or (
+                self._updates % 100 == 0
+            ):
+                self._evict()
+            self._conn.commit()
+
+    def clear(self, **kwargs):
+        """Remove every cached response"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._bytes = 0
+
+    def _delete(self, keys):
+        for key in keys:
+            row = self._conn.execute(
+                "SELECT bytes FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bytes -= row[0]
+
+    def _evict(self):
+        # Expired entries first, then the least recently used over the size limit
+        if self.ttl:
+            expired = [
+                key
+                for (key,) in self._conn.execute(
+                    "SELECT key FROM responses WHERE created_at < ?",
+                    (time.time() - self.ttl,),
+                ).fetchall()
+            ]
+            self._delete(expired)
+            self.evictions += len(expired)
+        if self.max_bytes and self._bytes > self.max_bytes:
+            evicted = []
+            excess = self._bytes - self.max_bytes
+            for key, size in self._conn.execute(
+                "SELECT key, bytes FROM responses ORDER BY last_used"
+            ).fetchall():
+                if excess <= 0:
+                    break
+                evicted.append(key)
+                excess -= size
+            self._delete(evicted)
+            self.evictions += len(evicted)
+        self._conn.commit()
+
+    def stats(self):
+        """Hit rate, entries, size and evictions of the cache"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+            }
+
+
+def _dump(generation):
+    entry = {"text": generation.text, "generation_info": generation.generation_info}
+    message = getattr(generation, "message", None)
+    if message is not None:
+        # Drop the run-specific id: each replay gets a fresh one
+        entry["message"] = message_to_dict(message.model_copy(update={"id": None}))
+    return entry
+
+
+def _load(entry):
+    if "message" not in entry:
+        return Generation(text=entry["text"], generation_info=entry["generation_info"])
+    message = messages_from_dict([entry["message"]])[0]
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        message.usage_metadata = {
+            **usage,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "total_tokens": 0,
+        }
+    message.response_metadata = {**message.response_metadata, "llm_cache": True}
+    return ChatGeneration(message=message, generation_info=entry["generation_info"])
@@ -0,0 +1,105 @@
+import re
+
+
+def requires_modifications(user_input):
+    """Detect if the request requires database modifications"""
+    modification_keywords = [
+        "create",
+        "add",
+        "insert",
+        "new",
+        "make",
+        "update",
+        "change",
+        "modify",
+        "edit",
+        "alter",
+        "delete",
+        "remove",
+        "drop",
+        "clear",
+    ]
+
+    return any(keyword in user_input.lower() for keyword in modification_keywords)
+
+
+# Statements that only read; anything else counts as a write
+READ_KEYWORDS = {
+    "SELECT", "WITH", "VALUES", "TABLE", "EXPLAIN", "SHOW", "DESCRIBE", "DESC", "PRAGMA"
+}  # fmt: skip
+DDL_KEYWORDS = {"CREATE", "ALTER", "DROP", "TRUNCATE"}
+LEADING_NOISE = re.compile(r"^(?:\s+|\(|--[^\n]*(?:\n|$)|/\*.*?(?:\*/|$))+", re.DOTALL)
+COMMENTS = re.compile(r"--[^\n]*|/\*.*?(?:\*/|$)", re.DOTALL)
+QUOTED = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]""")
+# Row locks read; writing keywords anywhere else in a read statement write
+ROW_LOCK = re.compile(r"\bFOR\s+(?:NO\s+KEY\s+)?UPDATE\b", re.IGNORECASE)
+WRITES_INSIDE = re.compile(r"\b(?:INSERT|UPDATE|DELETE|MERGE|INTO)\b", re.IGNORECASE)
+
+
+def first_keyword(query):
+    """The first keyword of a statement, past leading comments and parentheses"""
+    match = re.match(r"\w+", LEADING_NOISE.sub("", query))
+    return match.group(0).upper() if match else ""
+
+
+def is_modification_query(query):
+    """Detect if a SQL query is a modification
+
+    A statement reads only if it starts with a reading keyword and, past
+    comments and quoted text, has no writing keyword inside: WITH x AS (...)
+    DELETE, SELECT ... INTO, EXPLAIN ANALYZE (which runs the statement on
+    PostgreSQL) and PRAGMA x = y all write. Anything unclear is a write.
+    """
+    for statement in split_statements(query):
+        keyword = first_keyword(statement)
+        if not keyword:
+            continue
+        if keyword not in READ_KEYWORDS:
+            return True
+        body = ROW_LOCK.sub(" ", QUOTED.sub("''", COMMENTS.sub(" ", statement)))
+        if WRITES_INSIDE.search(body):
+            return True
+        if keyword == "EXPLAIN" and re.search(r"\bANALYZE\b", body, re.IGNORECASE):
+            return True
+        if keyword == "PRAGMA" and "=" in body:
+            return True
+    return False
+
+
+def is_ddl_query(query):
+    """Detect if a SQL query changes the database schema"""
+    return any(
+        first_keyword(statement) in DDL_KEYWORDS for statement in split_statements(query)
+    )
+
+
+def normalize_sql(query):
+    """Normalize whitespace and case of a SQL query, leaving quoted text intact"""
+    parts = re.split(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""", query.strip())
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+        else:
+            normalized.append(re.sub(r"\s+", " ", part).lower())
+    return "".join(normalized).strip().rstrip(";").strip()
+
+
+def split_statements(sql):
+    """Split a string of SQL statements on semicolons outside quoted text"""
+    statements = []
+    current = []
+    quote = None
+    for char in sql:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char == ";":
+            statements.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    statements.append("".join(current).strip())
+    return [statement for statement in statements if statement]
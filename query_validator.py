@@ -0,0 +1,121 @@
+import difflib
+import re
+
+from query_utils import is_ddl_query, split_statements
+
+SQL_KEYWORDS = {
+    "as", "on", "where", "join", "inner", "left", "right", "full", "outer", "cross",
+    "natural", "group", "order", "limit", "offset", "having", "union", "except",
+    "intersect", "set", "values", "select", "using", "window", "returning", "default",
+}  # fmt: skip
+
+TABLE_PATTERN = re.compile(
+    r"\b(from|join|into|update)\s+([\w.]+)\b(\s*\()?(?:\s+(?:as\s+)?(\w+))?",
+    re.IGNORECASE,
+)
+CTE_PATTERN = re.compile(r"\b(\w+)\s+as\s*\(", re.IGNORECASE)
+COLUMN_PATTERN = re.compile(r"\b(\w+)\.(\w+)\b")
+SYSTEM_PREFIXES = ("sqlite_", "pg_", "information_schema")
+
+
+def strip_literals(query):
+    """Blank out string literals and unquote simple identifiers"""
+    query = re.sub(r"'(?:[^']|'')*'", "''", query)
+    return re.sub(r'["`\[](\w+)["`\]]', r"\1", query)
+
+
+class QueryValidator:
+    """Validate SQL locally against the database and the schema snapshot"""
+
+    def __init__(self, db, schema_snapshot=None):
+        self.db = db
+        self.schema_snapshot = schema_snapshot
+
+    def validate(self, query):
+        """Return a list of problems with the query; empty when it is valid"""
+        errors = self.check_schema(query)
+        database_error = self.check_database(query)
+        if database_error and not errors:
+            errors.append(database_error)
+        return errors
+
+    def check_schema(self, query):
+        """Check table and qualified column names against the schema snapshot"""
+        if self.schema_snapshot is None:
+            return []
+
+        tables = {name.lower(): name for name in self.schema_snapshot.table_names()}
+        stripped = strip_literals(query)
+        ctes = {name.lower() for name in CTE_PATTERN.findall(stripped)}
+        errors = []
+        aliases = {}
+
+        for keyword, table, call, alias in TABLE_PATTERN.findall(stripped):
+            if call and keyword.lower() in ("from", "join"):
+                # Table-valued function such as json_each(...)
+                continue
+            name = table.split(".")[-1]
+            key = name.lower()
+            if key in ctes or key.startswith(SYSTEM_PREFIXES):
+                continue
+            if key not in tables:
+                errors.append(f"Unknown table '{name}'.{self._suggest(name, tables)}")
+                continue
+            aliases[key] = tables[key]
+            if alias and alias.lower() not in SQL_KEYWORDS:
+                aliases[alias.lower()] = tables[key]
+
+        if is_ddl_query(query):
+            return errors
+
+        for qualifier, column in COLUMN_PATTERN.findall(stripped):
+            table = aliases.get(qualifier.lower())
+            if table is None:
+                continue
+            columns = self.schema_snapshot.columns(table) or []
+            if column.lower() not in {c.lower() for c in columns}:
+                error = (
+                    f"Unknown column '{qualifier}.{column}': table {table} has "
+                    f"columns {', '.join(columns)}."
+                    f"{self._suggest(column, {c.lower(): c for c in columns})}"
+                )
+                if error not in errors:
+                    errors.append(error)
+
+        return errors
+
+    def check_database(self, query):
+        """Ask the database to plan the query without executing it"""
+        if is_ddl_query(query):
+            # DDL cannot be explained; it is only checked against the schema
+            return None
+        statements = split_statements(query)
+        if len(statements) != 1:
+            # Drivers such as psycopg2 run every statement after the EXPLAIN
+            return (
+                f"Expected one statement, got {len(statements)}. "
+                "Check each statement separately."
+            )
+
+        try:
+            with self.db._engine.connect() as connection:
+                transaction = connection.begin()
+                try:
+                    connection.exec_driver_sql(f"EXPLAIN {statements[0]}")
+                finally:
+                    transaction.rollback()
+        except Exception as e:
+            return f"Database error: {getattr(e, 'orig', None) or e}"
+        return None
+
+    def _suggest(self, name, candidates):
+        matches = difflib.get_close_matches(name.lower(), list(candidates), n=1)
+        return f" Did you mean '{candidates[matches[0]]}'?" if matches else ""
+
+
+def describe_validation(query, errors):
+    """Format validation results for the LLM"""
+    if not errors:
+        return f"The query is valid. Run it as is:\n{query}"
+    problems = "\n".join(f"- {error}" for error in errors)
+    return f"The query has problems, fix them before running it:\n{problems}"
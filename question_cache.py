@@ -0,0 +1,257 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+NUM_HASHES = 32
+BAND_SIZE = 4
+SHINGLE_SIZE = 3
+# Words that do not change what a question asks for
+STOPWORDS = set(
+    "a about all an and any are be can could database db do does for from give"
+    " have in is it list me of on please show tell that the there this to us we"
+    " what which with you".split()
+)
+
+
+def normalize_question(question):
+    """Lowercase a question and strip punctuation and extra whitespace"""
+    question = re.sub(r"[^\w\s/&'-]", " ", question.lower())
+    return re.sub(r"\s+", " ", question).strip()
+
+
+def content_words(text):
+    """Return the words of a normalized question that carry its meaning"""
+    return {word for word in text.split() if word not in STOPWORDS}
+
+
+def shingles(text):
+    """Return the set of character shingles of a normalized question"""
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text):
+    """Return the MinHash signature of a normalized question"""
+    signature = []
+    for seed in range(NUM_HASHES):
+        salt = seed.to_bytes(4, "little")
+        signature.append(
+            min(
+                int.from_bytes(
+                    hashlib.blake2b(
+                        shingle.encode(), digest_size=8, salt=salt
+                    ).digest(),
+                    "little",
+                )
+                for shingle in shingles(text)
+            )
+        )
+    return signature
+
+
+class QuestionCache:
+    """Persistent cache of read-only questions and the SQL that answered them"""
+
+    def __init__(
+        self, path, database, max_entries=1000, fuzzy=False, similarity=0.75
+    ):
+        self.path = path
+        self.database = database
+        self.max_entries = max_entries
+        self.fuzzy = fuzzy
+        self.similarity = similarity
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY,
+                database TEXT NOT NULL,
+                normalized TEXT NOT NULL,
+                question TEXT NOT NULL,
+                queries TEXT NOT NULL,
+                results TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                UNIQUE (database, normalized)
+            );
+            CREATE TABLE IF NOT EXISTS question_bands (
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                question_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_question_bands
+                ON question_bands (band, bucket);
+            """
+        )
+
+    def lookup(self, question):
+        """Return the cached entry for a question, or None"""
+        normalized = normalize_question(question)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, queries, results, answer FROM questions"
+                " WHERE database = ? AND normalized = ?",
+                (self.database, normalized),
+            ).fetchone()
+            if row is None and self.fuzzy:
+                row = self._lookup_similar(normalized)
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE questions SET hits = hits + 1, last_used = ? WHERE id = ?",
+                (time.time(), row[0]),
+            )
+            self._conn.commit()
+            return {
+                "id": row[0],
+                "queries": json.loads(row[1]),
+                "results": json.loads(row[2]),
+                "answer": row[3],
+            }
+
+    def store(self, question, queries, results, answer):
+        """Cache the queries, their results and the final answer for a question"""
+        normalized = normalize_question(question)
+        signature = minhash(normalized)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM question_bands WHERE question_id IN"
+                " (SELECT id FROM questions WHERE database = ? AND normalized = ?)",
+                (self.database, normalized),
+            )
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO questions (database, normalized, question,"
+                " queries, results, answer, signature, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.database,
+                    normalized,
+                    question,
+                    json.dumps(queries),
+                    json.dumps(results),
+                    answer,
+                    json.dumps(signature),
+                    now,
+                    now,
+                ),
+            )
+            self._conn.executemany(
+                "INSERT INTO question_bands (band, bucket, question_id)"
+                " VALUES (?, ?, ?)",
+                [
+                    (band, bucket, cursor.lastrowid)
+                    for band, bucket in enumerate(self._buckets(signature))
+                ],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def discard(self, entry_id):
+        """Remove an entry whose SQL no longer matches the database"""
+        with self._lock:
+            self._conn.execute("DELETE FROM questions WHERE id = ?", (entry_id,))
+            self._conn.execute(
+                "DELETE FROM question_bands WHERE question_id = ?", (entry_id,)
+            )
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE database = ?", (self.database,)
+            ).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def _lookup_similar(self, normalized):
+        # Numbers and names change the meaning ("top 5" vs "top 10", "AC/DC" vs
+        # "Accept"), so they must match: only rewording in stopwords, word order
+        # and punctuation is tolerated
+        numbers = re.findall(r"\d+", normalized)
+        words = content_words(normalized)
+        signature = minhash(normalized)
+        candidates = set()
+        for band, bucket in enumerate(self._buckets(signature)):
+            candidates.update(
+                question_id
+                for (question_id,) in self._conn.execute(
+                    "SELECT question_id FROM question_bands"
+                    " WHERE band = ? AND bucket = ?",
+                    (band, bucket),
+                )
+            )
+
+        best, best_score = None, 0.0
+        for question_id in candidates:
+            row = self._conn.execute(
+                "SELECT id, queries, results, answer, signature, normalized"
+                " FROM questions WHERE id = ? AND database = ?",
+                (question_id, self.database),
+            ).fetchone()
+            if row is None or re.findall(r"\d+", row[5]) != numbers:
+                continue
+            if content_words(row[5]) != words:
+                continue
+            other = json.loads(row[4])
+            score = sum(a == b for a, b in zip(signature, other)) / NUM_HASHES
+            if score >= self.similarity and score > best_score:
+                best, best_score = row[:4], score
+        return best
+
+    def _buckets(self, signature):
+        return [
+            hashlib.md5(
+                json.dumps(signature[i : i + BAND_SIZE]).encode()
+            ).hexdigest()
+            for i in range(0, NUM_HASHES, BAND_SIZE)
+        ]
+
+    def _evict(self):
+        excess = (
+            self._conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE database = ?", (self.database,)
+            ).fetchone()[0]
+            - self.max_entries
+        )
+        if excess <= 0:
+            return
+        stale_ids = [
+            question_id
+            for (question_id,) in self._conn.execute(
+                "SELECT id FROM questions WHERE database = ?"
+                " ORDER BY last_used LIMIT ?",
+                (self.database, excess),
+            )
+        ]
+        self._conn.executemany(
+            "DELETE FROM questions WHERE id = ?", [(i,) for i in stale_ids]
+        )
+        self._conn.executemany(
+            "DELETE FROM question_bands WHERE question_id = ?",
+            [(i,) for i in stale_ids],
+        )
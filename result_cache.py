@@ -0,0 +1,99 @@
+from collections import OrderedDict
+
+import sqlite3
+import threading
+import time
+
+
+class DataVersion:
+    """Token that changes whenever the data in the database may have changed"""
+
+    def __init__(self, db):
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._probe = None
+
+        # PRAGMA data_version only moves for commits made by *other*
+        # connections, so probe from a dedicated connection that never writes
+        database = db._engine.url.database
+        if db.dialect == "sqlite" and database and database != ":memory:":
+            self._probe = sqlite3.connect(database, check_same_thread=False)
+
+    def bump(self):
+        """Record a write made by the agent"""
+        with self._lock:
+            self.writes += 1
+
+    def token(self):
+        """Return the current data version token"""
+        with self._lock:
+            if self._probe is None:
+                return str(self.writes)
+            data_version = self._probe.execute("PRAGMA data_version").fetchone()[0]
+            return f"{self.writes}:{data_version}"
+
+
+class ResultCache:
+    """Size-bounded LRU cache of query results"""
+
+    def __init__(self, max_entries=256, max_bytes=4 * 1024 * 1024, ttl=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached result for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.time() - entry[1] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result):
+        """Store a result, evicting least recently used entries to stay in bounds"""
+        size = len(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, time.time())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _remove(self, key):
+        result, _ = self._entries.pop(key)
+        self._bytes -= len(result)
@@ -0,0 +1,53 @@
+from langchain_community.utilities.sql_database import truncate_word
+
+from token_utils import count_tokens
+
+DELIMITER = " | "
+
+
+class ResultFormatter:
+    """Format query rows as a header line plus one delimited line per row
+
+    Long values are truncated, and rows stop at max_rows or once max_tokens
+    would be exceeded, with a marker saying how many rows were left out.
+    """
+
+    def __init__(
+        self, max_rows=100, max_tokens=2000, max_cell_chars=100, model="gpt-4o-mini"
+    ):
+        self.max_rows = max_rows
+        self.max_tokens = max_tokens
+        self.max_cell_chars = max_cell_chars
+        self.model = model
+
+    def format(self, rows):
+        """Format a list of row dicts, as returned by SQLDatabase._execute"""
+        if not rows:
+            return "(0 rows)"
+
+        header = DELIMITER.join(self._cell(column) for column in rows[0])
+        lines = [header]
+        tokens = count_tokens(header, self.model)
+        for row in rows[: self.max_rows]:
+            line = DELIMITER.join(self._cell(value) for value in row.values())
+            line_tokens = count_tokens(line, self.model)
+            # Always show at least one row, however long
+            if len(lines) > 1 and tokens + line_tokens > self.max_tokens:
+                break
+            lines.append(line)
+            tokens += line_tokens
+
+        shown = len(lines) - 1
+        if shown < len(rows):
+            lines.append(
+                f"[{len(rows) - shown} more rows not shown, {len(rows)} in total. "
+                "Add filters or a LIMIT, or use sql_db_export for the full result]"
+            )
+        return "\n".join(lines)
+
+    def _cell(self, value):
+        if value is None:
+            return "NULL"
+        text = " ".join(str(value).split()) if isinstance(value, str) else str(value)
+        text = truncate_word(text, length=self.max_cell_chars)
+        return text.replace("|", "\\|")
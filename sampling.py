@@ -0,0 +1,233 @@
+from sqlalchemy import text
+
+import math
+import re
+import threading
+import time
+
+AGGREGATE_PATTERN = re.compile(r"^\s*(COUNT|SUM|AVG)\s*\((.+)\)\s*$", re.I | re.S)
+# Statement separators and comments would let a fragment escape the query
+UNSAFE_FRAGMENT = re.compile(r";|--|/\*")
+# z-score of the reported error margins (95% confidence)
+Z_95 = 1.96
+# Groups estimated from fewer sampled rows are flagged as unreliable
+MIN_GROUP_ROWS = 30
+
+
+class SampleEstimator:
+    """Estimate COUNT, SUM and AVG aggregates of a large table from a random sample
+
+    The sample size is chosen to fit the latency budget, from the scan rate
+    measured on previous samples. On SQLite, random rowids are drawn and looked
+    up, so the cost grows with the sample rather than the table; on PostgreSQL
+    the table is read with TABLESAMPLE SYSTEM. Tables smaller than min_rows, or
+    than the sample itself, are aggregated exactly.
+
+    Each estimate carries a 95% error margin from the sample variance. With
+    TABLESAMPLE SYSTEM whole pages are sampled, so margins are optimistic for
+    tables whose rows are clustered by the grouped or aggregated columns.
+    """
+
+    def __init__(self, latency_budget=1.0, rows_per_second=200000, min_rows=1000000):
+        self.latency_budget = latency_budget
+        self.rows_per_second = rows_per_second
+        self.min_rows = min_rows
+        self._lock = threading.Lock()
+
+    def estimate(self, db, table, aggregates, group_by=(), where="", joins=""):
+        """Run the aggregates on a sample of the table, grouped by group_by
+
+        Returns the groups with an estimate and error margin per aggregate,
+        the sample fraction and whether the result is exact.
+        """
+        dialect = db.dialect
+        if dialect not in ("sqlite", "postgresql"):
+            raise ValueError(f"Approximate queries are not supported on {dialect}")
+        specs = [_parse_aggregate(aggregate) for aggregate in aggregates]
+        if not specs:
+            raise ValueError("At least one aggregate is needed")
+        for fragment in [where, joins, *group_by]:
+            if UNSAFE_FRAGMENT.search(fragment or ""):
+                raise ValueError(f"Invalid query fragment: {fragment}")
+
+        quote = db._engine.dialect.identifier_preparer.quote
+        quoted = quote(table)
+        with self._lock:
+            sample_size = max(1, int(self.latency_budget * self.rows_per_second))
+
+        with db._engine.connect() as connection:
+            if dialect == "sqlite":
+                low, high = connection.execute(
+                    text(f"SELECT MIN(rowid), MAX(rowid) FROM {quoted}")
+                ).fetchone()
+                table_rows = 0 if low is None else high - low + 1
+            else:
+                table_rows = connection.execute(
+                    text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:t)"),
+                    {"t": quoted},
+                ).scalar()
+                table_rows = max(int(table_rows or 0), 0)
+
+            exact = table_rows <= max(self.min_rows, sample_size)
+            if exact:
+                fraction = 1.0
+                source = quoted
+            elif dialect == "sqlite":
+                # Distinct draws from the rowid range: each row is sampled with
+                # probability 1 - (1 - 1/span)^draws, gaps in rowids included
+                fraction = 1 - (1 - 1 / table_rows) ** sample_size
+                source = (
+                    f"sample_ids JOIN {quoted} ON {quoted}.rowid = sample_ids.id"
+                )
+            else:
+                fraction = sample_size / table_rows
+                source = f"{quoted} TABLESAMPLE SYSTEM ({fraction * 100:.6f})"
+
+            columns = list(group_by) + ["COUNT(*)"]
+            for _, expression in specs:
+                if expression != "*":
+                    columns += [
+                        f"COUNT({expression})",
+                        f"SUM({expression})",
+                        f"SUM(({expression}) * 1.0 * ({expression}))",
+                    ]
+            query = f"SELECT {', '.join(columns)} FROM {source}"
+            if joins:
+                query += f" {joins}"
+            if where:
+                query += f" WHERE {where}"
+            if group_by:
+                query += f" GROUP BY {', '.join(group_by)}"
+            if not exact and dialect == "sqlite":
+                query = (
+                    "WITH RECURSIVE sample_draws(i) AS (SELECT 1 UNION ALL"
+                    f" SELECT i + 1 FROM sample_draws WHERE i < {sample_size}),"
+                    f" sample_ids(id) AS (SELECT DISTINCT {low} +"
+                    f" abs(random() % {table_rows}) FROM sample_draws) {query}"
+                )
+
+            started = time.perf_counter()
+            rows = connection.execute(text(query)).fetchall()
+            elapsed = time.perf_counter() - started
+
+        if not exact and elapsed > 0:
+            # Calibrate the scan rate, so the next sample fits the budget
+            with self._lock:
+                measured = sample_size / elapsed
+                self.rows_per_second = (self.rows_per_second + measured) / 2
+
+        groups = []
+        for row in rows:
+            keys, sample_rows = tuple(row[: len(group_by)]), row[len(group_by)]
+            sums = iter(row[len(group_by) + 1 :])
+            values = []
+            for function, expression in specs:
+                if expression == "*":
+                    count, total, squares = sample_rows, None, None
+                else:
+                    count, total, squares = next(sums), next(sums), next(sums)
+                values.append(_estimate(function, count, total, squares, fraction))
+            groups.append(
+                {"group": keys, "sample_rows": sample_rows, "values": values}
+            )
+
+        return {
+            "table": table,
+            "query": query,
+            "aggregates": [aggregate.strip() for aggregate in aggregates],
+            "group_by": list(group_by),
+            "groups": groups,
+            "exact": exact,
+            "fraction": fraction,
+            "sample_rows": sum(group["sample_rows"] for group in groups),
+            "table_rows": table_rows,
+            "elapsed": elapsed,
+        }
+
+
+def _parse_aggregate(aggregate):
+    match = AGGREGATE_PATTERN.match(aggregate)
+    if not match:
+        raise ValueError(
+            f"Cannot estimate '{aggregate}': only COUNT, SUM and AVG of a column "
+            "or expression can be estimated from a sample"
+        )
+    function, expression = match.group(1).upper(), match.group(2).strip()
+    if expression == "*" and function != "COUNT":
+        raise ValueError(f"Cannot estimate '{aggregate}'")
+    if expression.upper().startswith("DISTINCT"):
+        raise ValueError(f"Cannot estimate '{aggregate}': DISTINCT needs all rows")
+    return function, expression
+
+
+def _estimate(function, count, total, squares, fraction):
+    # Horvitz-Thompson estimates for Bernoulli sampling with probability
+    # fraction; AVG is the sample mean with the finite population correction
+    correction = 1 - fraction
+    if function == "COUNT":
+        return {
+            "estimate": count / fraction,
+            "error": Z_95 * math.sqrt(count * correction) / fraction,
+        }
+    if total is None:
+        return {"estimate": None, "error": None}
+    total, squares = float(total), float(squares)
+    if function == "SUM":
+        return {
+            "estimate": total / fraction,
+            "error": Z_95 * math.sqrt(squares * correction) / fraction,
+        }
+    mean = total / count
+    variance = max(squares / count - mean * mean, 0.0)
+    if count > 1:
+        variance *= count / (count - 1)
+    return {
+        "estimate": mean,
+        "error": Z_95 * math.sqrt(variance / count * correction),
+    }
+
+
+def _format_number(value):
+    if value is None:
+        return "NULL"
+    if abs(value) >= 1000:
+        return f"{value:,.0f}"
+    return f"{value:.4g}"
+
+
+def describe_estimate(result, max_groups=50):
+    """Describe an approximate result for the agent, with its margins"""
+    if result["exact"]:
+        lines = [
+            f"Exact result: {result['table']} has about {result['table_rows']:,} "
+            "rows, few enough to aggregate in full."
+        ]
+    else:
+        lines = [
+            f"APPROXIMATE result from a {result['fraction']:.3%} random sample of "
+            f"{result['table']} ({result['sample_rows']:,} of about "
+            f"{result['table_rows']:,} rows) in {result['elapsed']:.2f}s.",
+            "Each value is the estimate ± its 95% error margin. Say the figures "
+            "are approximate and give the margins; sql_db_query computes exact "
+            "figures on request.",
+        ]
+
+    groups = sorted(
+        result["groups"], key=lambda group: -(group["values"][0]["estimate"] or 0)
+    )
+    lines.append(" | ".join(result["group_by"] + result["aggregates"]))
+    for group in groups[:max_groups]:
+        cells = [str(key) for key in group["group"]]
+        for value in group["values"]:
+            cell = _format_number(value["estimate"])
+            if not result["exact"] and value["estimate"] is not None:
+                cell += f" ± {_format_number(value['error'])}"
+            cells.append(cell)
+        if not result["exact"] and group["sample_rows"] < MIN_GROUP_ROWS:
+            cells.append(f"(only {group['sample_rows']} sampled rows, unreliable)")
+        lines.append(" | ".join(cells))
+    if len(groups) > max_groups:
+        lines.append(f"... {len(groups) - max_groups} more groups")
+    if not groups:
+        lines.append("(no rows in the sample)")
+    return "\n".join(lines)
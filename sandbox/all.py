@@ -1,5 +1,6 @@
 from langchain_community.utilities import SQLDatabase
 from langchain.chat_models import init_chat_model
+from langchain_core.messages import AIMessage
 from langgraph.prebuilt import create_react_agent
 from langchain_community.agent_toolkits import SQLDatabaseToolkit
 
@@ -140,43 +141,84 @@ def interactive_cli():
             print("\n🤖 SQL Agent: Processing your query...")
             print("-" * 40)
 
-            # Execute agent with complete history
+            # Execute agent with complete history. "updates" carries only the
+            # messages each node adds, "messages" the LLM tokens as they arrive
             agent_response = ""
             step_count = 0
-
-            for step in agent_executor.stream(
+            # Text of the current message printed so far, and whether a
+            # response header is open above it
+            printed = False
+            streamed = False
+
+            def take_back():
+                # Printed text that preceded a tool call is not the answer
+                nonlocal printed, streamed
+                if printed:
+                    print()
+                    print("💭 ↑ Written before calling a tool, not part of the answer")
+                printed = streamed = False
+
+            for stream_mode, chunk in agent_executor.stream(
                 {"messages": conversation_history.copy()},
-                stream_mode="values",
+                stream_mode=["updates", "messages"],
                 recursion_limit=80,
             ):
-                if step.get("messages"):
-                    last_message = step["messages"][-1]
-
-                    # Show agent steps
-                    if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-                        step_count += 1
-                        tool_call = last_message.tool_calls[0]
-                        tool_name = tool_call["name"]
-                        print(f"🔧 Step {step_count}: Executing {tool_name}")
-
-                        # Show SQL query in debug mode
-                        if DEBUG_MODE and tool_name == "sql_db_query":
-                            query = tool_call.get("args", {}).get("query", "")
-                            if query:
-                                print(f"   📝 SQL Query: {query}")
-                        elif DEBUG_MODE and tool_name == "sql_db_query_checker":
-                            query = tool_call.get("args", {}).get("query", "")
-                            if query:
-                                print(f"   🔍 Checking Query: {query}")
-
-                    # Capture final response
-                    if last_message.content and last_message.content != agent_response:
-                        agent_response = last_message.content
-
-            # Show final response
-            print("-" * 40)
-            print("✅ Response:")
-            print(agent_response)
+                if stream_mode == "messages":
+                    message, metadata = chunk
+                    if metadata.get("langgraph_node") != "agent" or not isinstance(
+                        message, AIMessage
+                    ):
+                        continue
+                    text = message.text()
+                    if text:
+                        if not streamed:
+                            print("-" * 40)
+                            print("✅ Response:")
+                            streamed = True
+                        print(text, end="", flush=True)
+                        printed = True
+                    if message.tool_call_chunks:
+                        take_back()
+                    continue
+
+                for update in chunk.values():
+                    for message in (update or {}).get("messages", []):
+                        if message.type != "ai":
+                            continue
+
+                        # Show agent steps
+                        if message.tool_calls:
+                            take_back()
+                            step_count += 1
+                            tool_names = ", ".join(
+                                c["name"] for c in message.tool_calls
+                            )
+                            print(f"🔧 Step {step_count}: Executing {tool_names}")
+
+                            # Show SQL queries in debug mode
+                            for tool_call in message.tool_calls:
+                                tool_name = tool_call["name"]
+                                if DEBUG_MODE and tool_name == "sql_db_query":
+                                    query = tool_call.get("args", {}).get("query", "")
+                                    if query:
+                                        print(f"   📝 SQL Query: {query}")
+                                elif DEBUG_MODE and tool_name == "sql_db_query_checker":
+                                    query = tool_call.get("args", {}).get("query", "")
+                                    if query:
+                                        print(f"   🔍 Checking Query: {query}")
+                        printed = False
+
+                        # Capture final response
+                        if message.content:
+                            agent_response = message.content
+
+            # Show final response, unless it was already streamed
+            if streamed:
+                print()
+            else:
+                print("-" * 40)
+                print("✅ Response:")
+                print(agent_response)
 
             # Add agent response to history
             if agent_response:
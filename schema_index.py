@@ -0,0 +1,154 @@
+from collections import deque
+
+import math
+import re
+import threading
+
+# Field weights: a match on a table name counts more than one in sample data
+TABLE_WEIGHT = 3.0
+COLUMN_WEIGHT = 2.0
+COMMENT_WEIGHT = 1.5
+SAMPLE_WEIGHT = 1.0
+
+STOPWORDS = {
+    "a", "all", "an", "and", "any", "are", "as", "at", "be", "by", "can", "do",
+    "does", "each", "for", "from", "get", "give", "has", "have", "how", "i", "in",
+    "is", "it", "list", "many", "me", "much", "my", "of", "on", "or", "our",
+    "per", "please", "show", "than", "that", "the", "their", "there", "these",
+    "this", "to", "us", "was", "we", "were", "what", "when", "where", "which",
+    "who", "whose", "with", "you",
+}  # fmt: skip
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9]+")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+SAMPLE_PATTERN = re.compile(r"rows from \w+ table:\n(.*?)\*/", re.DOTALL)
+
+
+def stem(word):
+    """Reduce plural words to their singular form"""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Lowercase word tokens, splitting camelCase and snake_case identifiers"""
+    tokens = []
+    for word in WORD_PATTERN.findall(text):
+        parts = CAMEL_PATTERN.findall(word)
+        if len(parts) > 1:
+            tokens.append(stem(word.lower()))
+        tokens.extend(stem(part.lower()) for part in parts)
+    return tokens
+
+
+class SchemaIndex:
+    """Inverted index over the schema snapshot, to find the tables a question needs
+
+    Table and column names, comments and sample values are indexed with
+    field weights. A search returns the top-k tables by IDF-weighted score,
+    plus the tables that join them along foreign keys, so the prompt holds a
+    few tables however large the database is.
+    """
+
+    def __init__(self, snapshot, top_k=5, max_hops=2):
+        self.snapshot = snapshot
+        self.top_k = top_k
+        self.max_hops = max_hops
+        self._tables = None
+        self._postings = {}
+        self._graph = {}
+        self._lock = threading.Lock()
+
+    def search(self, question, top_k=None):
+        """Relevant tables for a question: best matches first, then join tables"""
+        self._ensure_built()
+        scores = {}
+        for token in set(tokenize(question)) - STOPWORDS:
+            if token.isdigit() and len(token) < 4:
+                # "top 5" is a limit; only years and codes name tables
+                continue
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + len(self._tables) / len(postings))
+            for table, weight in postings.items():
+                scores[table] = scores.get(table, 0.0) + weight * idf
+
+        ranked = sorted(scores, key=lambda table: (-scores[table], table))
+        return self._expand(ranked[: top_k or self.top_k])
+
+    def describe(self, question, top_k=None):
+        """Compact schema lines for the tables relevant to a question"""
+        tables = self.search(question, top_k)
+        if not tables:
+            return ""
+        return self.snapshot.prompt_context(tables)
+
+    def _expand(self, seeds):
+        # Connect each seed to the tables already chosen through the shortest
+        # foreign key path, adding the tables along the way
+        selected = []
+        for seed in seeds:
+            if selected:
+                path = self._path(seed, set(selected))
+                selected.extend(table for table in path if table not in selected)
+            if seed not in selected:
+                selected.append(seed)
+        return selected
+
+    def _path(self, start, targets):
+        previous = {start: None}
+        queue = deque([(start, 0)])
+        while queue:
+            table, hops = queue.popleft()
+            if table in targets:
+                path = []
+                while table is not None:
+                    path.append(table)
+                    table = previous[table]
+                return path[1:-1]
+            if hops > self.max_hops:
+                continue
+            for neighbour in self._graph.get(table, ()):
+                if neighbour not in previous:
+                    previous[neighbour] = table
+                    queue.append((neighbour, hops + 1))
+        return []
+
+    def _ensure_built(self):
+        with self._lock:
+            self.snapshot.table_names()
+            if self._tables is self.snapshot.tables:
+                return
+            tables = self.snapshot.tables
+            postings = {}
+            graph = {table: set() for table in tables}
+
+            def add(token, table, weight):
+                entry = postings.setdefault(token, {})
+                entry[table] = max(entry.get(table, 0.0), weight)
+
+            for table, entry in tables.items():
+                for token in tokenize(table):
+                    add(token, table, TABLE_WEIGHT)
+                for column in entry["columns"]:
+                    for token in tokenize(column):
+                        add(token, table, COLUMN_WEIGHT)
+                for token in tokenize(entry.get("comment", "")):
+                    add(token, table, COMMENT_WEIGHT)
+                for sample in SAMPLE_PATTERN.findall(entry["info"]):
+                    for token in tokenize(sample):
+                        if not token.isdigit():
+                            add(token, table, SAMPLE_WEIGHT)
+                for referred in entry.get("foreign_keys", {}).values():
+                    referred_table = referred.rsplit(".", 1)[0]
+                    if referred_table in graph and referred_table != table:
+                        graph[table].add(referred_table)
+                        graph[referred_table].add(table)
+
+            self._postings = postings
+            self._graph = graph
+            self._tables = tables
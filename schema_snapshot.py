@@ -0,0 +1,221 @@
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import inspect, text
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Bump when the stored per-table fields change so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 3
+
+
+class SchemaSnapshot:
+    """In-memory and on-disk snapshot of the database schema"""
+
+    def __init__(self, db, path=None):
+        self.db = db
+        self.path = path
+        self.tables = {}
+        self.version = None
+        self.stale = True
+        self._lock = threading.RLock()
+
+    def load(self):
+        """Load the snapshot from disk, rebuilding it when missing or outdated"""
+        version = self.current_version()
+        data = self._read_file()
+        if (
+            data
+            and data.get("database") == self._database_key()
+            and data.get("version") == version
+            and data.get("format") == SNAPSHOT_FORMAT
+        ):
+            with self._lock:
+                self.tables = data["tables"]
+                self.version = version
+                self.stale = False
+            return False
+
+        self.rebuild(version)
+        return True
+
+    def rebuild(self, version=None):
+        """Introspect the database and replace the snapshot"""
+        with self._lock:
+            if version is None:
+                version = self.current_version()
+
+            # A fresh SQLDatabase reflects tables created after startup
+            fresh_db = SQLDatabase(
+                self.db._engine,
+                schema=self.db._schema,
+                sample_rows_in_table_info=self.db._sample_rows_in_table_info,
+            )
+            inspector = inspect(self.db._engine)
+
+            tables = {}
+            for table in fresh_db.get_usable_table_names():
+                columns = inspector.get_columns(table, schema=self.db._schema)
+                foreign_keys = self._foreign_keys(inspector, table)
+                tables[table] = {
+                    "compact": self._describe_table(
+                        inspector, table, columns, foreign_keys
+                    ),
+                    "info": fresh_db.get_table_info_no_throw([table]),
+                    "columns": [column["name"] for column in columns],
+                    "foreign_keys": foreign_keys,
+                    "comment": self._comment(inspector, table, columns),
+                }
+
+            self.tables = tables
+            self.version = version
+            self.stale = False
+            self._write_file()
+
+    def invalidate(self):
+        """Mark the snapshot as outdated so it is rebuilt on next use"""
+        self.stale = True
+
+    def refresh_if_changed(self):
+        """Rebuild the snapshot if it was invalidated or the schema version moved"""
+        version = self.current_version()
+        if self.stale or version != self.version:
+            self.rebuild(version)
+            return True
+        return False
+
+    def current_version(self):
+        """Return a token that changes whenever the database schema changes"""
+        dialect = self.db.dialect
+        with self.db._engine.connect() as connection:
+            if dialect == "sqlite":
+                return str(connection.execute(text("PRAGMA schema_version")).scalar())
+            if dialect == "postgresql":
+                return connection.execute(
+                    text(
+                        "SELECT md5(string_agg(table_name || '.' || column_name"
+                        " || ':' || data_type, ',' ORDER BY table_name, ordinal_position))"
+                        " FROM information_schema.columns"
+                        " WHERE table_schema = current_schema()"
+                    )
+                ).scalar()
+
+        # Other dialects: fingerprint the reflected tables and columns
+        inspector = inspect(self.db._engine)
+        parts = []
+        for table in sorted(inspector.get_table_names(schema=self.db._schema)):
+            for column in inspector.get_columns(table, schema=self.db._schema):
+                parts.append(f"{table}.{column['name']}:{column['type']}")
+        return hashlib.md5(",".join(parts).encode()).hexdigest()
+
+    def table_names(self):
+        """Return the cached table names"""
+        self._ensure_fresh()
+        return list(self.tables)
+
+    def table_info(self, table_names):
+        """Return the cached schema description for the given tables"""
+        self._ensure_fresh()
+        missing = [table for table in table_names if table not in self.tables]
+        if missing:
+            return f"Error: table_names {set(missing)} not found in database"
+        return "\n\n".join(self.tables[table]["info"] for table in table_names)
+
+    def columns(self, table):
+        """Return the cached column names of a table, or None if it is unknown"""
+        self._ensure_fresh()
+        entry = self.tables.get(table)
+        return entry["columns"] if entry else None
+
+    def foreign_keys(self, table):
+        """Return a table's foreign keys as {column: "Table.column"}"""
+        self._ensure_fresh()
+        entry = self.tables.get(table)
+        return entry["foreign_keys"] if entry else {}
+
+    def prompt_context(self, tables=None):
+        """Return one compact line per table (all, or the given ones) for the prompt"""
+        self._ensure_fresh()
+        if tables is None:
+            return "\n".join(entry["compact"] for entry in self.tables.values())
+        return "\n".join(
+            self.tables[table]["compact"] for table in tables if table in self.tables
+        )
+
+    def _ensure_fresh(self):
+        if self.stale:
+            self.rebuild()
+
+    def _foreign_keys(self, inspector, table):
+        foreign_keys = {}
+        for foreign_key in inspector.get_foreign_keys(table, schema=self.db._schema):
+            for column, referred in zip(
+                foreign_key["constrained_columns"], foreign_key["referred_columns"]
+            ):
+                foreign_keys[column] = f"{foreign_key['referred_table']}.{referred}"
+        return foreign_keys
+
+    def _comment(self, inspector, table, columns):
+        comments = [column["comment"] for column in columns if column.get("comment")]
+        try:
+            table_comment = inspector.get_table_comment(table, schema=self.db._schema)
+            if table_comment.get("text"):
+                comments.insert(0, table_comment["text"])
+        except NotImplementedError:
+            # SQLite has no comments
+            pass
+        return " ".join(comments)
+
+    def _describe_table(self, inspector, table, columns, foreign_keys):
+        primary_keys = set(
+            inspector.get_pk_constraint(table, schema=self.db._schema).get(
+                "constrained_columns"
+            )
+            or []
+        )
+
+        described = []
+        for column in columns:
+            parts = [column["name"], str(column["type"])]
+            if column["name"] in primary_keys:
+                parts.append("PK")
+            elif not column.get("nullable", True):
+                parts.append("NOT NULL")
+            if column["name"] in foreign_keys:
+                parts.append(f"-> {foreign_keys[column['name']]}")
+            described.append(" ".join(parts))
+
+        return f"{table}({', '.join(described)})"
+
+    def _database_key(self):
+        url = self.db._engine.url.render_as_string(hide_password=True)
+        return hashlib.sha256(f"{url}|{self.db._schema}".encode()).hexdigest()
+
+    def _read_file(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_file(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "database": self._database_key(),
+            "version": self.version,
+            "format": SNAPSHOT_FORMAT,
+            "created_at": time.time(),
+            "tables": self.tables,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,120 @@
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import json
+import re
+
+from question_cache import normalize_question
+from token_utils import count_tokens
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that replays recorded agent trajectories, for offline runs
+
+    The reply depends only on the conversation: the last user question picks
+    the trajectory and the number of AI messages since then picks the step, so
+    the model is deterministic and safe to share between threads.
+    """
+
+    scripts: Dict[str, List[Dict[str, Any]]]
+    fallback: str = "I don't have a recorded answer for this question."
+
+    @classmethod
+    def from_file(cls, path):
+        """Load trajectories from a JSON file with a "questions" list"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            scripts={
+                normalize_question(entry["question"]): entry["steps"]
+                for entry in data["questions"]
+            }
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        # Stream the content word by word, then the tool calls and usage at once
+        reply = self._reply(messages)
+        for token in re.findall(r"\S+\s*", reply.content):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {
+                        "name": tool_call["name"],
+                        "args": json.dumps(tool_call["args"]),
+                        "id": tool_call["id"],
+                        "index": i,
+                    }
+                    for i, tool_call in enumerate(reply.tool_calls)
+                ],
+                usage_metadata=reply.usage_metadata,
+            )
+        )
+
+    def _reply(self, messages):
+        question, step = self._position(messages)
+        script = self.scripts.get(normalize_question(question), [])
+        reply = script[step] if step < len(script) else {"content": self.fallback}
+
+        tool_calls = [
+            {
+                "name": tool_call["name"],
+                "args": tool_call.get("args", {}),
+                "id": f"call_{step}_{i}",
+            }
+            for i, tool_call in enumerate(reply.get("tool_calls", []))
+        ]
+        content = reply.get("content", "")
+        input_tokens = sum(count_tokens(str(m.content)) for m in messages)
+        output_tokens = count_tokens(content + json.dumps(tool_calls))
+        return AIMessage(
+            content=content,
+            tool_calls=tool_calls,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+
+    def _position(self, messages):
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], HumanMessage):
+                replies = sum(isinstance(m, AIMessage) for m in messages[i + 1 :])
+                return str(messages[i].content), replies
+        return "", 0
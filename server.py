@@ -0,0 +1,377 @@
+from aiohttp import web
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import asyncio
+import contextvars
+import json
+import os
+import time
+import uuid
+
+import testing_blade as agent
+from statement_guard import CancelScope
+
+# Server configuration from environment variables
+SERVER_HOST = os.environ.get("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", "8080"))
+SERVER_MAX_CONCURRENT_RUNS = int(os.environ.get("SERVER_MAX_CONCURRENT_RUNS", "256"))
+SESSION_IDLE_TIMEOUT = int(os.environ.get("SESSION_IDLE_TIMEOUT", "3600"))
+
+# Turns run the agent, which blocks, in these threads: one per concurrent run
+TURN_EXECUTOR = ThreadPoolExecutor(
+    max_workers=SERVER_MAX_CONCURRENT_RUNS, thread_name_prefix="turn"
+)
+
+
+class Session:
+    """One conversation with its own history and mode flags"""
+
+    def __init__(
+        self, debug_mode, batch_mode, session_id=None, history=None, mode="agent"
+    ):
+        # The session id is also its thread id in the thread store
+        self.id = session_id or uuid.uuid4().hex
+        self.history = history or agent.new_history()
+        self.debug_mode = debug_mode
+        self.batch_mode = batch_mode
+        # "fast" tries the two-call pipeline before the agent
+        self.mode = mode
+        # Send the answer as "token" events while it is generated
+        self.stream = agent.STREAM_TOKENS
+        # Answer repeated LLM calls from the LLM cache (temperature 0 only)
+        self.llm_cache = True
+        self.last_active = time.time()
+        # A session answers one question at a time
+        self.lock = asyncio.Lock()
+        # Cancellation handle of the question being answered, if any
+        self.cancel_scope = None
+
+    def to_dict(self):
+        return {
+            "session_id": self.id,
+            "debug": self.debug_mode,
+            "batch": self.batch_mode,
+            "mode": self.mode,
+            "stream": self.stream,
+            "llm_cache": self.llm_cache,
+            "history_tokens": self.history.token_count(),
+        }
+
+
+class SessionStore:
+    """In-memory registry of sessions with idle expiry
+
+    Idle sessions are dropped from memory, but their history stays checkpointed
+    in the thread store, so a later request for the same id resumes it.
+    """
+
+    def __init__(self, idle_timeout):
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+
+    def create(self):
+        session = Session(agent.DEBUG_MODE, agent.BATCH_MODE, mode=agent.AGENT_MODE)
+        self.sessions[session.id] = session
+        return session
+
+    async def get(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            # Reading the thread store blocks, so it runs off the event loop
+            history = await asyncio.to_thread(agent.load_history, session_id)
+            session = self.sessions.get(session_id)
+            if session is None and history is not None:
+                session = Session(
+                    agent.DEBUG_MODE,
+                    agent.BATCH_MODE,
+                    session_id,
+                    history,
+                    mode=agent.AGENT_MODE,
+                )
+                self.sessions[session_id] = session
+        if session is None:
+            raise web.HTTPNotFound(
+                text=json.dumps({"error": f"Unknown session: {session_id}"}),
+                content_type="application/json",
+            )
+        session.last_active = time.time()
+        return session
+
+    async def delete(self, session_id):
+        self.sessions.pop(session_id, None)
+        if agent.thread_store is not None:
+            await asyncio.to_thread(agent.thread_store.delete, session_id)
+
+    def expire(self):
+        """Drop sessions that have been idle for too long"""
+        cutoff = time.time() - self.idle_timeout
+        for session_id, session in list(self.sessions.items()):
+            if session.last_active < cutoff and not session.lock.locked():
+                del self.sessions[session_id]
+
+
+@asynccontextmanager
+async def cancellable(session):
+    """Give a session's turn a CancelScope, cancelled if the turn is abandoned
+
+    A client that disconnects or a failing turn stops the turn's SQL
+    statements, which would otherwise keep running in worker threads.
+    """
+    scope = CancelScope()
+    session.cancel_scope = scope
+    try:
+        yield scope
+    except BaseException:
+        scope.cancel()
+        raise
+    finally:
+        session.cancel_scope = None
+
+
+async def run_turn(session, content, run_slots):
+    """Run one question through the agent, yielding step and answer events
+
+    The turn is agent.history_turn, shared with the CLI and the daemon. It runs
+    in a worker thread and its events are forwarded as they are produced.
+    """
+    async with session.lock, run_slots, cancellable(session) as scope:
+        events = agent.history_turn(
+            session.history,
+            content,
+            session.id,
+            batch_mode=session.batch_mode,
+            mode=session.mode,
+            debug=session.debug_mode,
+            stream=session.stream,
+            cancel_scope=scope,
+            use_llm_cache=session.llm_cache,
+        )
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def pump():
+            try:
+                for event in events:
+                    loop.call_soon_threadsafe(queue.put_nowait, ("event", event))
+            except BaseException as e:
+                loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+            else:
+                loop.call_soon_threadsafe(queue.put_nowait, ("done", None))
+
+        # Each request runs in its own context, so per-turn settings stay with it
+        worker = loop.run_in_executor(
+            TURN_EXECUTOR, contextvars.copy_context().run, pump
+        )
+        try:
+            while True:
+                kind, item = await queue.get()
+                if kind == "done":
+                    break
+                if kind == "error":
+                    raise item
+                event, data = item
+                if event != "step":
+                    yield event, data
+                    continue
+                for tool_call in data["tool_calls"]:
+                    step = {"step": data["step"], "tool": tool_call["name"]}
+                    if session.debug_mode and tool_call["name"] in (
+                        "sql_db_query",
+                        "sql_db_query_checker",
+                    ):
+                        step["query"] = tool_call.get("args", {}).get("query", "")
+                    yield "step", step
+        finally:
+            # An abandoned turn stops at its next step; the session stays locked
+            # until it has, so its history is never shared by two turns
+            if not worker.done():
+                scope.cancel()
+            await worker
+
+
+async def create_session(request):
+    session = request.app["sessions"].create()
+    return web.json_response(session.to_dict(), status=201)
+
+
+async def get_session(request):
+    session = await request.app["sessions"].get(request.match_info["session_id"])
+    return web.json_response(
+        {**session.to_dict(), "history": session.history.messages()}
+    )
+
+
+async def update_session(request):
+    """Toggle a session's flags, set its mode or clear its history"""
+    session = await request.app["sessions"].get(request.match_info["session_id"])
+    body = await request.json()
+    if "debug" in body:
+        session.debug_mode = bool(body["debug"])
+    if "batch" in body:
+        session.batch_mode = bool(body["batch"])
+    if "stream" in body:
+        session.stream = bool(body["stream"])
+    if "llm_cache" in body:
+        session.llm_cache = bool(body["llm_cache"])
+    if body.get("mode") in ("agent", "fast"):
+        session.mode = body["mode"]
+    if body.get("clear"):
+        session.history.clear()
+    return web.json_response(session.to_dict())
+
+
+async def cancel_session(request):
+    """Cancel the question a session is answering, stopping its running SQL"""
+    session = await request.app["sessions"].get(request.match_info["session_id"])
+    scope = session.cancel_scope
+    if scope is not None:
+        scope.cancel()
+    return web.json_response({"cancelled": scope is not None})
+
+
+async def delete_session(request):
+    await request.app["sessions"].delete(request.match_info["session_id"])
+    return web.Response(status=204)
+
+
+async def post_message(request):
+    """Answer a question, streaming events back as Server-Sent Events"""
+    session = await request.app["sessions"].get(request.match_info["session_id"])
+    body = await request.json()
+    content = str(body.get("content", "")).strip()
+    if not content:
+        raise web.HTTPBadRequest(
+            text=json.dumps({"error": "Please write a question."}),
+            content_type="application/json",
+        )
+
+    response = web.StreamResponse(
+        headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+    )
+    await response.prepare(request)
+    try:
+        async for event, data in run_turn(session, content, request.app["run_slots"]):
+            await response.write(
+                f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+            )
+    except Exception as e:
+        await response.write(
+            f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n".encode("utf-8")
+        )
+    await response.write(b"event: done\ndata: {}\n\n")
+    await response.write_eof()
+    return response
+
+
+async def websocket_session(request):
+    """Answer questions over a WebSocket, one JSON event per message"""
+    session = await request.app["sessions"].get(request.match_info["session_id"])
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+
+    async for message in ws:
+        if message.type != web.WSMsgType.TEXT:
+            continue
+        try:
+            content = str(json.loads(message.data).get("content", "")).strip()
+        except ValueError:
+            content = message.data.strip()
+        if not content:
+            await ws.send_json({"event": "error", "error": "Please write a question."})
+            continue
+        try:
+            async for event, data in run_turn(
+                session, content, request.app["run_slots"]
+            ):
+                await ws.send_json({"event": event, **data})
+        except Exception as e:
+            await ws.send_json({"event": "error", "error": str(e)})
+        await ws.send_json({"event": "done"})
+
+    return ws
+
+
+async def list_threads(request):
+    """Saved conversation threads, most recent first; resume one by its id"""
+    if agent.thread_store is None:
+        raise web.HTTPNotFound(text="Threads are disabled")
+    limit = int(request.query.get("limit", "20"))
+    return web.json_response({"threads": agent.thread_store.threads(limit)})
+
+
+async def health(request):
+    return web.json_response(
+        {"status": "ok", "sessions": len(request.app["sessions"].sessions)}
+    )
+
+
+async def metrics(request):
+    """Prometheus text metrics for the agent steps"""
+    if agent.trace_recorder is None:
+        raise web.HTTPNotFound(text="Tracing is disabled")
+    return web.Response(
+        text=agent.trace_recorder.prometheus(),
+        content_type="text/plain",
+        charset="utf-8",
+    )
+
+
+async def stats(request):
+    """Step latency percentiles and counters as JSON"""
+    if agent.trace_recorder is None:
+        raise web.HTTPNotFound(text="Tracing is disabled")
+    return web.json_response(
+        {
+            "steps": agent.trace_recorder.summary(),
+            "counters": agent.trace_recorder.counters(),
+        }
+    )
+
+
+async def expire_sessions(app):
+    while True:
+        await asyncio.sleep(60)
+        app["sessions"].expire()
+        if agent.thread_store is not None:
+            await asyncio.to_thread(agent.thread_store.compact)
+
+
+async def start_background_tasks(app):
+    app["expiry_task"] = asyncio.create_task(expire_sessions(app))
+
+
+async def stop_background_tasks(app):
+    app["expiry_task"].cancel()
+
+
+def create_app():
+    """Build the aiohttp application"""
+    agent.initialize()
+    app = web.Application()
+    app["sessions"] = SessionStore(SESSION_IDLE_TIMEOUT)
+    app["run_slots"] = asyncio.Semaphore(SERVER_MAX_CONCURRENT_RUNS)
+    app.on_startup.append(start_background_tasks)
+    app.on_cleanup.append(stop_background_tasks)
+    app.add_routes(
+        [
+            web.get("/health", health),
+            web.get("/metrics", metrics),
+            web.get("/stats", stats),
+            web.get("/threads", list_threads),
+            web.post("/sessions", create_session),
+            web.get("/sessions/{session_id}", get_session),
+            web.patch("/sessions/{session_id}", update_session),
+            web.delete("/sessions/{session_id}", delete_session),
+            web.post("/sessions/{session_id}/messages", post_message),
+            web.post("/sessions/{session_id}/cancel", cancel_session),
+            web.get("/sessions/{session_id}/ws", websocket_session),
+        ]
+    )
+    return app
+
+
+if __name__ == "__main__":
+    print(f"🌐 SQL Agent server listening on http://{SERVER_HOST}:{SERVER_PORT}")
+    web.run_app(create_app(), host=SERVER_HOST, port=SERVER_PORT, print=None)
@@ -0,0 +1,631 @@
+from typing import Any, List, Optional, Type
+
+from langchain_community.agent_toolkits import SQLDatabaseToolkit
+from langchain_community.tools.sql_database.tool import (
+    BaseSQLDatabaseTool,
+    InfoSQLDatabaseTool,
+    ListSQLDatabaseTool,
+    QuerySQLDatabaseTool,
+)
+from langchain_community.utilities.sql_database import truncate_word
+from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.callbacks.manager import dispatch_custom_event
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field
+from sqlalchemy.exc import SQLAlchemyError
+
+from contextlib import nullcontext
+
+import time
+
+from batch_executor import BatchExecutor, describe_batch
+from exporter import describe_export, export_path, export_query
+from index_advisor import describe_advice
+from query_validator import QueryValidator, describe_validation
+from query_utils import is_ddl_query, is_modification_query, normalize_sql
+from sampling import describe_estimate
+from statement_guard import StatementAborted
+from value_index import describe_lookup
+
+
+class SnapshotListSQLDatabaseTool(ListSQLDatabaseTool):
+    """List tables from the schema snapshot instead of the database"""
+
+    snapshot: Any = Field(exclude=True)
+
+    def _run(
+        self,
+        tool_input: str = "",
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        return ", ".join(self.snapshot.table_names())
+
+
+class SnapshotInfoSQLDatabaseTool(InfoSQLDatabaseTool):
+    """Describe tables from the schema snapshot instead of the database"""
+
+    snapshot: Any = Field(exclude=True)
+
+    def _run(
+        self,
+        table_names: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        return self.snapshot.table_info(
+            [table.strip() for table in table_names.split(",")]
+        )
+
+
+class _RelevantTablesToolInput(BaseModel):
+    question: str = Field(..., description="The user's question, or a few keywords")
+
+
+class RelevantTablesTool(BaseSQLDatabaseTool, BaseTool):
+    """Find the tables relevant to a question in the schema index"""
+
+    name: str = "sql_db_relevant_tables"
+    description: str = """
+    Input is the user's question or a few keywords. Output is the tables most
+    relevant to it, with their columns, primary keys (PK) and foreign keys (->),
+    including the tables needed to join them. Use this to find tables in a large
+    database instead of listing every table.
+    """
+    args_schema: Type[BaseModel] = _RelevantTablesToolInput
+    schema_index: Any = Field(exclude=True)
+
+    def _run(
+        self,
+        question: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        return self.schema_index.describe(question) or (
+            "No table matched. Try other keywords, or list all tables with "
+            "sql_db_list_tables."
+        )
+
+
+def batch_mode_enabled(config, default=True):
+    """Read the per-run batch mode flag passed in the agent config"""
+    return (config or {}).get("configurable", {}).get("batch_mode", default)
+
+
+def report_sql(config, **data):
+    """Report a statement sent to the database to the run's callbacks (tracing)"""
+    if not (config or {}).get("callbacks"):
+        return
+    try:
+        dispatch_custom_event("sql", data, config=config)
+    except RuntimeError:
+        # Not running inside an agent run, nobody to report to
+        pass
+
+
+def cancel_scope(config):
+    """The run's CancelScope passed in the agent config, if any"""
+    return (config or {}).get("configurable", {}).get("cancel_scope")
+
+
+def run_query(db, query, formatter=None, guard=None, scope=None):
+    """Run a query like SQLDatabase.run_no_throw, also returning the row count
+
+    With a formatter the rows are rendered compactly, with column headers;
+    without one the result is the repr of a list of tuples, as SQLDatabase.run.
+    With a statement guard the query runs within its time and row budgets and
+    can be cancelled through the scope.
+    """
+    try:
+        if guard is not None:
+            rows = guard.execute(db, query, scope)
+        else:
+            rows = db._execute(query)
+    except StatementAborted as e:
+        return str(e), 0
+    except SQLAlchemyError as e:
+        return f"Error: {e}", 0
+    if formatter is not None:
+        return formatter.format(rows), len(rows)
+    if not rows:
+        return "", 0
+    result = [
+        tuple(truncate_word(value, length=db._max_string_length) for value in row.values())
+        for row in rows
+    ]
+    return str(result), len(result)
+
+
+def guarded(guard, config, timeout=None):
+    """The guard's statement() context for the run, or a no-op without a guard"""
+    if guard is None:
+        return nullcontext()
+    return guard.statement(cancel_scope(config), timeout=timeout)
+
+
+def after_write(
+    queries, data_version=None, schema_snapshot=None, value_index=None, summaries=None
+):
+    """Invalidate caches and summary tables after modification queries have run"""
+    if data_version is not None:
+        data_version.bump()
+    if schema_snapshot is not None and any(is_ddl_query(q) for q in queries):
+        schema_snapshot.invalidate()
+    if value_index is not None:
+        if any(is_ddl_query(q) for q in queries):
+            value_index.invalidate()
+        else:
+            value_index.refresh(queries)
+    if summaries is not None:
+        summaries.invalidate(queries)
+
+
+class AgentQuerySQLDatabaseTool(QuerySQLDatabaseTool):
+    """Execute SQL and keep the agent's caches in sync with the database"""
+
+    schema_snapshot: Any = Field(default=None, exclude=True)
+    result_cache: Any = Field(default=None, exclude=True)
+    data_version: Any = Field(default=None, exclude=True)
+    db_router: Any = Field(default=None, exclude=True)
+    workload_log: Any = Field(default=None, exclude=True)
+    result_formatter: Any = Field(default=None, exclude=True)
+    value_index: Any = Field(default=None, exclude=True)
+    statement_guard: Any = Field(default=None, exclude=True)
+    summaries: Any = Field(default=None, exclude=True)
+    batch_mode: bool = True
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        config: RunnableConfig = None,
+    ) -> str:
+        if is_modification_query(query):
+            if batch_mode_enabled(config, self.batch_mode):
+                return (
+                    "Error: Batch mode is on, so modifications are not run one at a "
+                    "time. Submit every planned statement in a single "
+                    "sql_db_execute_batch call once the user has confirmed the plan."
+                )
+            return self._run_write(query, config)
+
+        cache_key = None
+        if self.result_cache is not None:
+            cache_key = f"{self.data_version.token()}|{normalize_sql(query)}"
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                report_sql(config, sql=query, operation="read", cached=True, duration=0.0)
+                return cached
+
+        read_db = self.db_router.for_read() if self.db_router is not None else self.db
+        started = time.perf_counter()
+        result = None
+        summary_query = None
+        if self.summaries is not None:
+            summary_query = self.summaries.lookup(query)
+        if summary_query is not None:
+            result, rows = run_query(
+                read_db,
+                summary_query,
+                self.result_formatter,
+                self.statement_guard,
+                cancel_scope(config),
+            )
+            if result.startswith("Error:"):
+                # e.g. the summary table has not reached this replica yet
+                result, summary_query = None, None
+        if result is None:
+            result, rows = run_query(
+                read_db,
+                query,
+                self.result_formatter,
+                self.statement_guard,
+                cancel_scope(config),
+            )
+        duration = time.perf_counter() - started
+        report_sql(
+            config,
+            sql=query,
+            operation="read",
+            rows=rows,
+            cached=False,
+            summary=summary_query is not None,
+            duration=duration,
+            error=result if result.startswith("Error:") else None,
+        )
+        if self.workload_log is not None and not result.startswith("Error:"):
+            self.workload_log.record(read_db, query, duration, rows)
+
+        if cache_key is not None and not result.startswith("Error:"):
+            self.result_cache.put(cache_key, result)
+
+        return result
+
+    def _run_write(self, query, config=None):
+        write_db = self.db_router.for_write() if self.db_router is not None else self.db
+        started = time.perf_counter()
+        result, _ = run_query(
+            write_db, query, guard=self.statement_guard, scope=cancel_scope(config)
+        )
+        duration = time.perf_counter() - started
+        report_sql(
+            config,
+            sql=query,
+            operation="write",
+            duration=duration,
+            error=result if result.startswith("Error:") else None,
+        )
+        if self.workload_log is not None and not result.startswith("Error:"):
+            self.workload_log.record(write_db, query, duration, 0)
+        after_write(
+            [query],
+            self.data_version,
+            self.schema_snapshot,
+            self.value_index,
+            self.summaries,
+        )
+        return result
+
+
+class _ExportQueryToolInput(BaseModel):
+    query: str = Field(..., description="A detailed and correct SELECT query.")
+    format: str = Field(
+        "csv", description="Output format: 'csv', 'jsonl' or 'parquet'."
+    )
+    filename: str = Field("", description="Optional output file name.")
+
+
+class ExportQueryTool(BaseSQLDatabaseTool, BaseTool):
+    """Stream a read query's full result to a file"""
+
+    name: str = "sql_db_export"
+    description: str = """
+    Export the complete result of a SELECT query to a file (csv, jsonl or parquet).
+    Use this instead of sql_db_query when the user asks for a full extract or a
+    result that is too large to show. Returns the file path, row count, columns
+    and a short preview, never the full data.
+    """
+    args_schema: Type[BaseModel] = _ExportQueryToolInput
+    export_dir: str = "exports"
+    batch_size: int = 1000
+    db_router: Any = Field(default=None, exclude=True)
+    statement_guard: Any = Field(default=None, exclude=True)
+
+    def _run(
+        self,
+        query: str,
+        format: str = "csv",
+        filename: str = "",
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        config: RunnableConfig = None,
+    ) -> str:
+        if is_modification_query(query):
+            return "Error: Only SELECT queries can be exported"
+
+        fmt = format.lower().strip()
+        read_db = self.db_router.for_read() if self.db_router is not None else self.db
+        try:
+            # Full extracts take as long as they take, but can be cancelled
+            with guarded(self.statement_guard, config, timeout=0):
+                export = export_query(
+                    read_db._engine,
+                    query,
+                    export_path(self.export_dir, fmt, filename),
+                    fmt=fmt,
+                    batch_size=self.batch_size,
+                )
+        except StatementAborted as e:
+            return str(e)
+        except Exception as e:
+            return f"Error: {e}"
+        report_sql(
+            config,
+            sql=query,
+            operation="export",
+            rows=export["rows"],
+            duration=export["elapsed"],
+        )
+        return describe_export(export)
+
+
+class _BatchExecuteToolInput(BaseModel):
+    statements: List[str] = Field(
+        ...,
+        description="Every planned INSERT/UPDATE/DELETE statement, in execution order.",
+    )
+
+
+class BatchExecuteTool(BaseSQLDatabaseTool, BaseTool):
+    """Execute a confirmed modification plan in one transaction"""
+
+    name: str = "sql_db_execute_batch"
+    description: str = """
+    Execute a confirmed plan of modification statements (INSERT, UPDATE, DELETE,
+    CREATE, ALTER, DROP) in a single transaction. If any statement fails, every
+    change is rolled back and the error is returned. Pass all statements of the
+    plan in one call, in order. Rows that depend on each other should reference
+    earlier rows with subqueries, e.g. (SELECT ArtistId FROM Artist WHERE Name = 'X').
+    """
+    args_schema: Type[BaseModel] = _BatchExecuteToolInput
+    schema_snapshot: Any = Field(default=None, exclude=True)
+    data_version: Any = Field(default=None, exclude=True)
+    db_router: Any = Field(default=None, exclude=True)
+    value_index: Any = Field(default=None, exclude=True)
+    statement_guard: Any = Field(default=None, exclude=True)
+    workload_log: Any = Field(default=None, exclude=True)
+    summaries: Any = Field(default=None, exclude=True)
+
+    def _run(
+        self,
+        statements: List[str],
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        config: RunnableConfig = None,
+    ) -> str:
+        if not statements:
+            return "Error: No statements to execute"
+        write_db = self.db_router.for_write() if self.db_router is not None else self.db
+        with guarded(self.statement_guard, config) as statement:
+            result = BatchExecutor(write_db._engine).execute(statements)
+        if statement is not None and result.get("error"):
+            aborted = statement.aborted(result["error"])
+            if aborted is not None:
+                result["error"] = str(aborted)
+        report_sql(
+            config,
+            sql="; ".join(statements),
+            operation="batch",
+            statements=result["statements"],
+            rows_affected=result.get("rows_affected", 0),
+            duration=result["elapsed"],
+            error=result.get("error"),
+        )
+        if result["committed"]:
+            if self.workload_log is not None:
+                self.workload_log.record(
+                    write_db,
+                    "; ".join(statements),
+                    result["elapsed"],
+                    result.get("rows_affected", 0),
+                )
+            after_write(
+                statements,
+                self.data_version,
+                self.schema_snapshot,
+                self.value_index,
+                self.summaries,
+            )
+        return describe_batch(result)
+
+
+class _LookupEntityToolInput(BaseModel):
+    value: str = Field(
+        ..., description="The name or value to find, as the user wrote it"
+    )
+    table: str = Field("", description="Optional table to search in")
+
+
+class LookupEntityTool(BaseSQLDatabaseTool, BaseTool):
+    """Find the rows holding a named value in the value index"""
+
+    name: str = "sql_db_lookup_entity"
+    description: str = """
+    Find a named entity (an artist, album, track, customer...) by its name, even
+    with typos, different case or missing accents. Output is the best matching
+    stored values with their table, column and primary key, in one indexed
+    lookup. Use this before filtering on a name instead of scanning tables with
+    LIKE, then filter on the primary key it returns.
+    """
+    args_schema: Type[BaseModel] = _LookupEntityToolInput
+    value_index: Any = Field(exclude=True)
+
+    def _run(
+        self,
+        value: str,
+        table: str = "",
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        return describe_lookup(value, self.value_index.lookup(value, table=table))
+
+
+class _ApproximateQueryToolInput(BaseModel):
+    table: str = Field(..., description="The large table to sample")
+    aggregates: List[str] = Field(
+        ..., description="Aggregates to estimate, e.g. ['AVG(Total)', 'COUNT(*)']"
+    )
+    group_by: List[str] = Field(
+        default_factory=list, description="Columns to group by, e.g. ['Country']"
+    )
+    where: str = Field("", description="Optional filter, without the WHERE keyword")
+    joins: str = Field(
+        "",
+        description="Optional JOIN clauses to other tables, referring to the "
+        "sampled table by its name",
+    )
+
+
+class ApproximateQueryTool(BaseSQLDatabaseTool, BaseTool):
+    """Estimate aggregates of a large table from a sample, within a latency budget"""
+
+    name: str = "sql_db_query_approximate"
+    description: str = """
+    Estimate COUNT, SUM and AVG aggregates over a very large table from a random
+    sample, in well under the time of a full scan. Give the table, the aggregates
+    and optionally group-by columns, a filter and joins to lookup tables. Output
+    is each estimate with its 95% error margin and the sample fraction. Use it for
+    exploratory questions on large tables; answers from it must be labelled as
+    approximate. Use sql_db_query when the user wants exact figures.
+    """
+    args_schema: Type[BaseModel] = _ApproximateQueryToolInput
+    estimator: Any = Field(exclude=True)
+    db_router: Any = Field(default=None, exclude=True)
+    statement_guard: Any = Field(default=None, exclude=True)
+
+    def _run(
+        self,
+        table: str,
+        aggregates: List[str],
+        group_by: Optional[List[str]] = None,
+        where: str = "",
+        joins: str = "",
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        config: RunnableConfig = None,
+    ) -> str:
+        read_db = self.db_router.for_read() if self.db_router is not None else self.db
+        try:
+            with guarded(self.statement_guard, config):
+                result = self.estimator.estimate(
+                    read_db, table, aggregates, group_by or [], where, joins
+                )
+        except StatementAborted as e:
+            return str(e)
+        except (ValueError, SQLAlchemyError) as e:
+            return f"Error: {e}"
+        report_sql(
+            config,
+            sql=result["query"],
+            operation="approximate",
+            rows=len(result["groups"]),
+            sample_fraction=result["fraction"],
+            duration=result["elapsed"],
+        )
+        return describe_estimate(result)
+
+
+class _IndexAdviceToolInput(BaseModel):
+    tool_input: str = Field("", description="An empty string")
+
+
+class IndexAdviceTool(BaseSQLDatabaseTool, BaseTool):
+    """Suggest indexes for the full scans found in the agent's logged queries"""
+
+    name: str = "sql_db_index_advice"
+    description: str = """
+    Suggest CREATE INDEX statements for tables that logged queries had to scan in
+    full, with the estimated benefit of each. Use it when the user asks how to make
+    queries faster or which indexes to add. It only suggests: to create indexes,
+    present them as a modification plan, wait for the user's confirmation and run
+    them with sql_db_execute_batch.
+    """
+    args_schema: Type[BaseModel] = _IndexAdviceToolInput
+    advisor: Any = Field(exclude=True)
+
+    def _run(
+        self,
+        tool_input: str = "",
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        return describe_advice(
+            self.advisor.advise(), self.advisor.workload_log.stats()
+        )
+
+
+class _LocalQueryCheckerToolInput(BaseModel):
+    query: str = Field(..., description="A detailed and SQL query to be checked.")
+
+
+class LocalQueryCheckerTool(BaseSQLDatabaseTool, BaseTool):
+    """Check a query against the database and the schema snapshot, without an LLM"""
+
+    name: str = "sql_db_query_checker"
+    description: str = """
+    Use this tool to double check if your query is correct before executing it.
+    It validates the query against the database and its schema and returns the
+    exact problems (unknown tables or columns, syntax errors), or confirms that
+    the query is valid. Always use this tool before executing a query with sql_db_query!
+    """
+    args_schema: Type[BaseModel] = _LocalQueryCheckerToolInput
+    schema_snapshot: Any = Field(default=None, exclude=True)
+    db_router: Any = Field(default=None, exclude=True)
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        read_db = self.db_router.for_read() if self.db_router is not None else self.db
+        validator = QueryValidator(read_db, self.schema_snapshot)
+        return describe_validation(query, validator.validate(query))
+
+
+def build_tools(
+    db,
+    llm,
+    schema_snapshot=None,
+    result_cache=None,
+    data_version=None,
+    db_router=None,
+    export_dir="exports",
+    export_batch_size=1000,
+    batch_mode=True,
+    query_checker="local",
+    workload_log=None,
+    index_advisor=None,
+    result_formatter=None,
+    schema_index=None,
+    value_index=None,
+    estimator=None,
+    statement_guard=None,
+    summaries=None,
+):
+    """Build the agent tools, swapping in cached variants where enabled"""
+    tools = {tool.name: tool for tool in SQLDatabaseToolkit(db=db, llm=llm).get_tools()}
+
+    if schema_snapshot is not None:
+        tools["sql_db_list_tables"] = SnapshotListSQLDatabaseTool(
+            db=db, snapshot=schema_snapshot
+        )
+        tools["sql_db_schema"] = SnapshotInfoSQLDatabaseTool(
+            db=db, snapshot=schema_snapshot
+        )
+    if schema_index is not None:
+        tools["sql_db_relevant_tables"] = RelevantTablesTool(
+            db=db, schema_index=schema_index
+        )
+
+    if value_index is not None:
+        tools["sql_db_lookup_entity"] = LookupEntityTool(db=db, value_index=value_index)
+
+    if query_checker == "local":
+        tools["sql_db_query_checker"] = LocalQueryCheckerTool(
+            db=db, schema_snapshot=schema_snapshot, db_router=db_router
+        )
+
+    tools["sql_db_query"] = AgentQuerySQLDatabaseTool(
+        db=db,
+        schema_snapshot=schema_snapshot,
+        result_cache=result_cache,
+        data_version=data_version,
+        db_router=db_router,
+        workload_log=workload_log,
+        result_formatter=result_formatter,
+        value_index=value_index,
+        statement_guard=statement_guard,
+        summaries=summaries,
+        batch_mode=batch_mode,
+    )
+    tools["sql_db_execute_batch"] = BatchExecuteTool(
+        db=db,
+        schema_snapshot=schema_snapshot,
+        data_version=data_version,
+        db_router=db_router,
+        value_index=value_index,
+        statement_guard=statement_guard,
+        workload_log=workload_log,
+        summaries=summaries,
+    )
+    tools["sql_db_export"] = ExportQueryTool(
+        db=db,
+        db_router=db_router,
+        statement_guard=statement_guard,
+        export_dir=export_dir,
+        batch_size=export_batch_size,
+    )
+    if estimator is not None:
+        tools["sql_db_query_approximate"] = ApproximateQueryTool(
+            db=db,
+            estimator=estimator,
+            db_router=db_router,
+            statement_guard=statement_guard,
+        )
+    if index_advisor is not None:
+        tools["sql_db_index_advice"] = IndexAdviceTool(db=db, advisor=index_advisor)
+
+    return list(tools.values())
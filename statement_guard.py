@@ -0,0 +1,216 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event, text
+
+import re
+import threading
+import time
+
+from query_utils import is_modification_query
+
+# SQLite calls the progress handler every this many virtual machine instructions
+PROGRESS_INSTRUCTIONS = 1000
+# Statements PostgreSQL can run behind a server-side cursor (DECLARE ... CURSOR)
+CURSOR_STATEMENT = re.compile(r"^\s*(SELECT|WITH|VALUES)\b", re.IGNORECASE)
+
+
+class StatementAborted(Exception):
+    """A statement stopped by the guard: timeout, row_budget or cancelled
+
+    The message starts with the reason in brackets, so the agent can tell an
+    aborted statement from a SQL error and rewrite the query.
+    """
+
+    def __init__(self, reason, limit=None):
+        self.reason = reason
+        self.limit = limit
+        super().__init__(self.describe())
+
+    def describe(self):
+        if self.reason == "timeout":
+            return (
+                f"Error: [timeout] The statement ran for more than {self.limit:g}s "
+                "and was cancelled. Rewrite it to read less data: filter on indexed "
+                "columns, avoid cross joins and aggregate instead of listing rows."
+            )
+        if self.reason == "row_budget":
+            return (
+                f"Error: [row_budget] The query returns more than {self.limit} rows "
+                "and was stopped. Aggregate or filter the rows, add a LIMIT, or "
+                "export the full result with sql_db_export."
+            )
+        return "Error: [cancelled] The statement was cancelled by the user."
+
+
+class CancelScope:
+    """Cancellation handle for one run: cancel() stops its in-flight statements"""
+
+    def __init__(self):
+        self.cancelled = False
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            connections = list(self._connections)
+        for connection in connections:
+            _interrupt(connection)
+
+    def attach(self, connection):
+        with self._lock:
+            self._connections.add(connection)
+            cancelled = self.cancelled
+        if cancelled:
+            _interrupt(connection)
+
+    def detach(self, connection):
+        with self._lock:
+            self._connections.discard(connection)
+
+
+def _interrupt(connection):
+    # sqlite3 connections have interrupt(), psycopg2 connections cancel()
+    stop = getattr(connection, "interrupt", None) or getattr(
+        connection, "cancel", None
+    )
+    if stop is not None:
+        try:
+            stop()
+        except Exception:
+            pass
+
+
+class _Statement:
+    def __init__(self, scope, timeout):
+        self.scope = scope
+        self.timeout = timeout
+        self.deadline = None
+        self.reason = None
+        self.interrupted = False
+        self.connections = set()
+
+    def aborted(self, error):
+        """The StatementAborted behind a database error, or None for other errors
+
+        Raises KeyboardInterrupt if the statement was stopped by a Ctrl-C.
+        """
+        message = str(getattr(error, "orig", None) or error).lower()
+        reason = self.reason
+        if reason is None and "statement timeout" in message:
+            reason = "timeout"
+        elif reason is None and message.startswith(("interrupted", "canceling")):
+            # Nothing in this run asked for it: Ctrl-C while SQLite ran the
+            # progress handler, which swallows the KeyboardInterrupt
+            if self.scope is None or not self.scope.cancelled:
+                if threading.current_thread() is threading.main_thread():
+                    self.interrupted = True
+            reason = "cancelled"
+        if self.interrupted:
+            raise KeyboardInterrupt
+        if reason is None:
+            return None
+        return StatementAborted(reason, self.timeout if reason == "timeout" else None)
+
+
+class StatementGuard:
+    """Per-statement time and row budgets, and cancellation of running SQL
+
+    Statements run inside statement() get a deadline when they start: SQLite
+    checks it from a progress handler, PostgreSQL enforces it with a
+    transaction-local statement_timeout. Their connections are attached to the
+    run's CancelScope, which interrupts them (sqlite3 interrupt(), PostgreSQL
+    backend cancel) when the user cancels. Other statements are not limited.
+    """
+
+    def __init__(self, timeout=30.0, max_rows=10000):
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self._local = threading.local()
+
+    def install(self, engine):
+        """Hook the guard into an engine's connections"""
+        backend = engine.dialect.name
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_execute(conn, cursor, statement, parameters, context, many):
+            current = getattr(self._local, "statement", None)
+            if current is None:
+                return
+            dbapi_connection = conn.connection.dbapi_connection
+            # Pooled connections may predate the guard, so hook them on first use
+            if backend == "sqlite" and not conn.connection.info.get("guarded"):
+                dbapi_connection.set_progress_handler(
+                    self._progress, PROGRESS_INSTRUCTIONS
+                )
+                conn.connection.info["guarded"] = True
+            if current.timeout:
+                current.deadline = time.perf_counter() + current.timeout
+                if backend == "postgresql":
+                    with dbapi_connection.cursor() as setter:
+                        setter.execute(
+                            "SET LOCAL statement_timeout = %s",
+                            (int(current.timeout * 1000),),
+                        )
+            if current.scope is not None:
+                current.connections.add(dbapi_connection)
+                current.scope.attach(dbapi_connection)
+
+    @contextmanager
+    def statement(self, scope=None, timeout=None):
+        """Run statements under the time budget (default: the guard's) and scope
+
+        Statements stopped by the guard raise StatementAborted; a Ctrl-C that
+        arrived while SQLite was running is raised again as KeyboardInterrupt.
+        """
+        current = _Statement(scope, self.timeout if timeout is None else timeout)
+        self._local.statement = current
+        try:
+            yield current
+        except StatementAborted:
+            raise
+        except Exception as e:
+            aborted = current.aborted(e)
+            if aborted is None:
+                raise
+            raise aborted from e
+        finally:
+            self._local.statement = None
+            if scope is not None:
+                for connection in current.connections:
+                    scope.detach(connection)
+
+    def execute(self, db, query, scope=None):
+        """Run a query like SQLDatabase._execute, within the time and row budgets"""
+        with self.statement(scope):
+            with db._engine.begin() as connection:
+                if db._schema is not None and db.dialect == "postgresql":
+                    connection.exec_driver_sql("SET search_path TO %s", (db._schema,))
+                # A server-side cursor on PostgreSQL, so the row budget stops
+                # the query instead of buffering its whole result
+                stream = bool(CURSOR_STATEMENT.match(query)) and not (
+                    is_modification_query(query)
+                )
+                result = connection.execution_options(stream_results=stream).execute(
+                    text(query)
+                )
+                if not result.returns_rows:
+                    return []
+                if not self.max_rows:
+                    return [row._asdict() for row in result.fetchall()]
+                rows = result.fetchmany(self.max_rows + 1)
+                if len(rows) > self.max_rows:
+                    raise StatementAborted("row_budget", self.max_rows)
+                return [row._asdict() for row in rows]
+
+    def _progress(self):
+        current = getattr(self._local, "statement", None)
+        if current is None:
+            return 0
+        if current.scope is not None and current.scope.cancelled:
+            current.reason = "cancelled"
+            return 1
+        if current.deadline is not None and time.perf_counter() > current.deadline:
+            current.reason = "timeout"
+            return 1
+        return 0
@@ -0,0 +1,436 @@
+from sqlalchemy import inspect, sql
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from query_utils import (
+    is_ddl_query,
+    is_modification_query,
+    normalize_sql,
+    split_statements,
+)
+from query_validator import strip_literals
+from value_index import written_tables
+from workload import table_aliases
+
+SUMMARY_PREFIX = "agent_summary_"
+AGGREGATE_PATTERN = re.compile(
+    r"\b(?:count|sum|avg|min|max|total|group_concat|string_agg)\s*\(|\bgroup\s+by\b",
+    re.IGNORECASE,
+)
+# Results that change without any write cannot be materialized
+VOLATILE_PATTERN = re.compile(
+    r"\b(?:random|now|current_date|current_time|current_timestamp|localtime"
+    r"|localtimestamp|clock_timestamp)\b|'now'",
+    re.IGNORECASE,
+)
+
+
+def summarizable(query):
+    """Whether a read query is an aggregate whose result can be materialized"""
+    if len(split_statements(query)) != 1 or is_modification_query(query):
+        return False
+    if SUMMARY_PREFIX in query.lower() or VOLATILE_PATTERN.search(query):
+        return False
+    return bool(AGGREGATE_PATTERN.search(strip_literals(query)))
+
+
+def summary_columns(keys):
+    """Column names of a summary table for the columns of a query result"""
+    columns = []
+    for key in keys:
+        base = re.sub(r"\W+", "_", str(key)).strip("_").lower() or "value"
+        name, suffix = base, 2
+        while name in columns or name == "summary_row":
+            name, suffix = f"{base}_{suffix}", suffix + 1
+        columns.append(name)
+    return columns
+
+
+class SummaryTables:
+    """Materialized summary tables for the heavy aggregates the agent repeats
+
+    Read queries logged in the workload log at least min_repeats times, which
+    aggregate and took min_duration seconds or more on average, have their
+    result stored in an agent_summary_* table of the database. A read identical
+    to a summarized query (up to whitespace and case) is answered from its
+    summary while it is fresh. Agent writes mark the summaries of the tables
+    they touch as stale; stale summaries, and any summary older than
+    refresh_interval, are recomputed in the background, so writes made outside
+    the agent reach the summaries within refresh_interval seconds. Summaries
+    unused for ttl_days are dropped.
+    """
+
+    def __init__(
+        self,
+        db,
+        workload_log,
+        path,
+        min_repeats=3,
+        min_duration=0.5,
+        max_rows=1000,
+        max_tables=10,
+        refresh_interval=300,
+        ttl_days=7,
+        schema_snapshot=None,
+    ):
+        if db.dialect not in ("sqlite", "postgresql"):
+            raise ValueError(f"Summary tables are not supported on {db.dialect}")
+        self.db = db
+        self.workload_log = workload_log
+        self.path = path
+        self.database = workload_log.database
+        self.min_repeats = min_repeats
+        self.min_duration = min_duration
+        self.max_rows = max_rows
+        self.max_tables = max_tables
+        self.refresh_interval = refresh_interval
+        self.ttl_days = ttl_days
+        self.schema_snapshot = schema_snapshot
+        self._summaries = {}
+        self._rejected = set()
+        self._quote = db._engine.dialect.identifier_preparer.quote
+        self._lock = threading.Lock()
+        self._maintain_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS summaries (
+                name TEXT NOT NULL,
+                database TEXT NOT NULL,
+                query TEXT NOT NULL,
+                keys TEXT NOT NULL,
+                columns TEXT NOT NULL,
+                tables TEXT NOT NULL,
+                duration REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (database, name)
+            );
+            """
+        )
+
+    def load(self):
+        """Load the summaries created by earlier runs; they are refreshed on start"""
+        inspector = inspect(self.db._engine)
+        existing = set(inspector.get_table_names(schema=self.db._schema))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, query, keys, columns, tables, duration, hits, used_at"
+                " FROM summaries WHERE database = ?",
+                (self.database,),
+            ).fetchall()
+            for name, query, keys, columns, tables, duration, hits, used_at in rows:
+                if name not in existing:
+                    self._conn.execute(
+                        "DELETE FROM summaries WHERE database = ? AND name = ?",
+                        (self.database, name),
+                    )
+                    continue
+                self._summaries[normalize_sql(query)] = {
+                    "name": name,
+                    "query": query,
+                    "keys": json.loads(keys),
+                    "columns": json.loads(columns),
+                    "tables": set(json.loads(tables)),
+                    "duration": duration,
+                    "hits": hits,
+                    "used_at": used_at,
+                    "refreshed_at": 0.0,
+                    "fresh": False,
+                    "version": 0,
+                }
+            self._conn.commit()
+        return len(self._summaries)
+
+    def start(self):
+        """Maintain the summaries from a background thread, every refresh_interval"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="summary-tables", daemon=True
+        )
+        self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            try:
+                self.maintain()
+            except Exception:
+                # A failed pass leaves stale summaries unused; the next one retries
+                pass
+
+    def lookup(self, query):
+        """The query reading a fresh summary of this query, or None"""
+        key = normalize_sql(query)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None or not summary["fresh"]:
+                return None
+            summary["hits"] += 1
+            summary["used_at"] = time.time()
+        columns = ", ".join(
+            f"{self._quote(column)} AS {self._quote(original)}"
+            for column, original in zip(summary["columns"], summary["keys"])
+        )
+        return (
+            f"SELECT {columns} FROM {self._quote(summary['name'])} "
+            "ORDER BY summary_row"
+        )
+
+    def invalidate(self, statements):
+        """Mark the summaries of the tables written by the statements as stale"""
+        schema_changed = any(is_ddl_query(statement) for statement in statements)
+        tables = written_tables(statements)
+        with self._lock:
+            stale = [
+                summary
+                for summary in self._summaries.values()
+                if schema_changed or summary["tables"] & tables
+            ]
+            for summary in stale:
+                summary["fresh"] = False
+                summary["version"] += 1
+        if stale:
+            self._wake.set()
+
+    def maintain(self):
+        """Drop unused summaries, create new ones and refresh stale ones
+
+        Returns the number of summaries created, refreshed and dropped.
+        """
+        with self._maintain_lock:
+            now = time.time()
+            with self._lock:
+                expired = [
+                    key
+                    for key, summary in self._summaries.items()
+                    if summary["used_at"] < now - self.ttl_days * 86400
+                ]
+            for key in expired:
+                self._drop(key)
+
+            created = 0
+            for candidate in self._candidates(now):
+                with self._lock:
+                    if len(self._summaries) >= self.max_tables:
+                        break
+                if self._create(candidate):
+                    created += 1
+
+            with self._lock:
+                outdated = [
+                    key
+                    for key, summary in self._summaries.items()
+                    if not summary["fresh"]
+                    or summary["refreshed_at"] < now - self.refresh_interval
+                ]
+            refreshed = sum(self._refresh(key) for key in outdated)
+
+            with self._lock:
+                for summary in self._summaries.values():
+                    self._conn.execute(
+                        "UPDATE summaries SET hits = ?, used_at = ?"
+                        " WHERE database = ? AND name = ?",
+                        (
+                            summary["hits"],
+                            summary["used_at"],
+                            self.database,
+                            summary["name"],
+                        ),
+                    )
+                self._conn.commit()
+
+            if (created or expired) and self.schema_snapshot is not None:
+                self.schema_snapshot.invalidate()
+            return {"created": created, "refreshed": refreshed, "dropped": len(expired)}
+
+    def _candidates(self, now):
+        since = now - self.ttl_days * 86400
+        candidates = []
+        for entry in self.workload_log.repeated(self.min_repeats, since):
+            key = normalize_sql(entry["query"])
+            with self._lock:
+                known = key in self._summaries or key in self._rejected
+            if known or entry["duration"] < self.min_duration:
+                continue
+            if entry["rows"] > self.max_rows or not summarizable(entry["query"]):
+                continue
+            candidates.append(entry)
+        return candidates
+
+    def _create(self, entry):
+        query = entry["query"].strip().rstrip(";").strip()
+        key = normalize_sql(query)
+        name = SUMMARY_PREFIX + hashlib.sha1(key.encode()).hexdigest()[:12]
+        table = self._quote(name)
+        try:
+            with self.db._engine.begin() as connection:
+                # A constant false filter returns the columns without running it
+                keys = list(
+                    connection.exec_driver_sql(
+                        f"SELECT * FROM ({query}) AS summary_source WHERE 1 = 0",
+                        execution_options={"no_parameters": True},
+                    ).keys()
+                )
+                columns = summary_columns(keys)
+                quoted = ", ".join(self._quote(column) for column in columns)
+                if self.db.dialect == "sqlite":
+                    connection.exec_driver_sql(
+                        f"CREATE TABLE {table} (summary_row INTEGER, {quoted})"
+                    )
+                else:
+                    # Takes the column types from the query without running it
+                    connection.exec_driver_sql(
+                        f"CREATE TABLE {table} (summary_row, {quoted}) AS "
+                        "SELECT 0::bigint, summary_source.* "
+                        f"FROM ({query}) AS summary_source WITH NO DATA",
+                        execution_options={"no_parameters": True},
+                    )
+                self._fill(connection, name, columns, query)
+        except Exception:
+            with self._lock:
+                self._rejected.add(key)
+            return False
+
+        now = time.time()
+        tables = sorted({table.lower() for table in table_aliases(query).values()})
+        with self._lock:
+            self._summaries[key] = {
+                "name": name,
+                "query": query,
+                "keys": keys,
+                "columns": columns,
+                "tables": set(tables),
+                "duration": entry["duration"],
+                "hits": 0,
+                "used_at": now,
+                "refreshed_at": now,
+                "fresh": True,
+                "version": 0,
+            }
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (name, database, query, keys,"
+                " columns, tables, duration, hits, created_at, used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (
+                    name,
+                    self.database,
+                    query,
+                    json.dumps(keys),
+                    json.dumps(columns),
+                    json.dumps(tables),
+                    entry["duration"],
+                    now,
+                    now,
+                ),
+            )
+            self._conn.commit()
+        return True
+
+    def _refresh(self, key):
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                return False
+            version = summary["version"]
+        table = self._quote(summary["name"])
+        try:
+            # One transaction: readers keep seeing the previous rows meanwhile
+            with self.db._engine.begin() as connection:
+                connection.exec_driver_sql(f"DELETE FROM {table}")
+                self._fill(
+                    connection, summary["name"], summary["columns"], summary["query"]
+                )
+        except Exception:
+            # The source tables changed shape: the summary can no longer be built
+            self._drop(key)
+            return False
+        with self._lock:
+            summary["refreshed_at"] = time.time()
+            # Writes made during the refresh leave it stale for the next pass
+            summary["fresh"] = summary["version"] == version
+        return True
+
+    def _drop(self, key):
+        with self._lock:
+            summary = self._summaries.pop(key, None)
+            if summary is None:
+                return
+            self._conn.execute(
+                "DELETE FROM summaries WHERE database = ? AND name = ?",
+                (self.database, summary["name"]),
+            )
+            self._conn.commit()
+        try:
+            with self.db._engine.begin() as connection:
+                connection.exec_driver_sql(
+                    f"DROP TABLE IF EXISTS {self._quote(summary['name'])}"
+                )
+        except Exception:
+            pass
+
+    def _fill(self, connection, name, columns, query):
+        # Rows are numbered in the order the query returns them, so summary_row
+        # keeps its ORDER BY; a window over a subquery has no defined order
+        rows = connection.exec_driver_sql(
+            query, execution_options={"no_parameters": True}
+        ).fetchall()
+        if not rows:
+            return
+        target = sql.table(
+            name, sql.column("summary_row"), *(sql.column(c) for c in columns)
+        )
+        connection.execute(
+            target.insert(),
+            [
+                {"summary_row": number, **dict(zip(columns, row))}
+                for number, row in enumerate(rows, 1)
+            ],
+        )
+
+    def describe(self):
+        """Prompt section listing the fresh summary tables, or "" when there are none"""
+        with self._lock:
+            summaries = [s for s in self._summaries.values() if s["fresh"]]
+        if not summaries:
+            return ""
+        lines = [
+            "\n## Summary Tables:",
+            "These tables hold the precomputed result of frequent heavy aggregates, "
+            "in their row order (summary_row). Read them instead of aggregating the "
+            "source tables again, e.g. to filter, sort or limit the same figures:",
+        ]
+        for summary in summaries:
+            lines.append(
+                f"- {summary['name']}({', '.join(summary['columns'])}) = "
+                f"{summary['query']}"
+            )
+        return "\n".join(lines)
+
+    def stats(self):
+        """Number of summaries, how many are fresh and how many reads they served"""
+        with self._lock:
+            summaries = list(self._summaries.values())
+        return {
+            "tables": len(summaries),
+            "fresh": sum(summary["fresh"] for summary in summaries),
+            "hits": sum(summary["hits"] for summary in summaries),
+        }
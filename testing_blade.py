@@ -1,11 +1,13 @@
-from langchain_community.utilities import SQLDatabase
-from langchain.chat_models import init_chat_model
-from langgraph.prebuilt import create_react_agent
-from langchain_community.agent_toolkits import SQLDatabaseToolkit
-
 from dotenv import load_dotenv
 
+from bulk_runner import load_questions, run_bulk
+from query_utils import requires_modifications, is_modification_query
+
+import argparse
 import os
+import threading
+import time
+import uuid
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,52 +20,181 @@ DATABASE_TYPE = os.environ.get("DATABASE_TYPE", "SQLite")
 if not DATABASE_TYPE or DATABASE_TYPE.strip() == "":
     DATABASE_TYPE = "SQLite"
 
+# Optional read replicas (comma-separated); reads go here, writes to DATABASE_URI
+DATABASE_READ_URIS = [
+    uri.strip()
+    for uri in os.environ.get("DATABASE_READ_URI", "").split(",")
+    if uri.strip()
+]
+# Seconds after an agent write during which reads stay on the primary
+READ_AFTER_WRITE_SECONDS = float(os.environ.get("READ_AFTER_WRITE_SECONDS", "5"))
+
+# Connection pool configuration
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_CONNECT_TIMEOUT = int(os.environ.get("DB_CONNECT_TIMEOUT", "10"))
+
 # LLM configuration from environment variables
 LLM_MODEL = os.environ.get("LLM_MODEL", "gpt-4o-mini")
 LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "openai")
 LLM_API_KEY = os.environ.get("OPENAI_API_KEY")
-
-# Validation
-if not LLM_API_KEY:
-    raise ValueError(
-        "OPENAI_API_KEY not found in environment variables. Please check your .env file."
-    )
-
-# Initialize database connection
-try:
-    db = SQLDatabase.from_uri(DATABASE_URI)
-    print(f"✅ Connected to {DATABASE_TYPE} database: {DATABASE_URI}")
-except Exception as e:
-    raise ValueError(f"Failed to connect to database: {e}")
-
-# Initialize LLM
-try:
-    llm = init_chat_model(LLM_MODEL, model_provider=LLM_PROVIDER)
-    print(f"✅ Initialized {LLM_PROVIDER} LLM: {LLM_MODEL}")
-except Exception as e:
-    raise ValueError(f"Failed to initialize LLM: {e}")
+# Sampling temperature; unset keeps the provider's default
+LLM_TEMPERATURE = os.environ.get("LLM_TEMPERATURE", "")
+# Recorded trajectories replayed when LLM_PROVIDER=scripted (offline runs)
+SCRIPTED_LLM_FILE = os.environ.get(
+    "SCRIPTED_LLM_FILE", os.path.join("benchmarks", "trajectories.json")
+)
 
 # Configuration from environment variables
 DEBUG_MODE = os.environ.get("DEBUG_MODE", "false").lower() == "true"
 BATCH_MODE = os.environ.get("BATCH_MODE", "true").lower() == "true"
 RECURSION_LIMIT = int(os.environ.get("RECURSION_LIMIT", "50"))
 TOP_K_RESULTS = int(os.environ.get("TOP_K_RESULTS", "5"))
+# "fast" answers read-only questions with one generated query and two LLM calls,
+# escalating to the full agent on errors, empty results or modifications
+AGENT_MODE = os.environ.get("AGENT_MODE", "agent").lower()
+# Print the answer token by token as the LLM generates it
+STREAM_TOKENS = os.environ.get("STREAM_TOKENS", "true").lower() == "true"
+# Read-only tool calls of one agent step run concurrently on this many threads
+TOOL_CONCURRENCY = int(os.environ.get("TOOL_CONCURRENCY", "4"))
+
+# Query checker: "local" validates against the database without an LLM call,
+# "llm" uses the toolkit's LLM-based checker
+QUERY_CHECKER = os.environ.get("QUERY_CHECKER", "local").lower()
+
+# sql_db_query results: "compact" sends a header plus delimited rows, capped in
+# rows and tokens; "python" sends the repr of a list of tuples
+RESULT_FORMAT = os.environ.get("RESULT_FORMAT", "compact").lower()
+RESULT_MAX_ROWS = int(os.environ.get("RESULT_MAX_ROWS", "100"))
+RESULT_MAX_TOKENS = int(os.environ.get("RESULT_MAX_TOKENS", "2000"))
+RESULT_MAX_CELL_CHARS = int(os.environ.get("RESULT_MAX_CELL_CHARS", "100"))
+
+# Full result exports are streamed to files in this directory
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "exports")
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+
+# Conversation history is kept within this many tokens; older turns are summarized
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "3000"))
+HISTORY_KEEP_TURNS = int(os.environ.get("HISTORY_KEEP_TURNS", "4"))
+
+# Bulk mode (--questions): concurrent questions and retries on LLM rate limits
+BULK_WORKERS = int(os.environ.get("BULK_WORKERS", "4"))
+BULK_MAX_RETRIES = int(os.environ.get("BULK_MAX_RETRIES", "5"))
+
+# Local state (caches, snapshots) lives in this directory
+CACHE_DIR = os.environ.get("CACHE_DIR", ".sql_agent")
+SCHEMA_CACHE = os.environ.get("SCHEMA_CACHE", "true").lower() == "true"
+SCHEMA_CACHE_PATH = os.environ.get(
+    "SCHEMA_CACHE_PATH", os.path.join(CACHE_DIR, "schema_snapshot.json")
+)
+# Schema index: find the tables a question needs. Beyond SCHEMA_PRUNE_TABLES
+# tables the prompt only lists the relevant ones instead of the whole schema
+SCHEMA_INDEX = os.environ.get("SCHEMA_INDEX", "true").lower() == "true"
+SCHEMA_INDEX_TOP_K = int(os.environ.get("SCHEMA_INDEX_TOP_K", "5"))
+SCHEMA_PRUNE_TABLES = int(os.environ.get("SCHEMA_PRUNE_TABLES", "30"))
+# Value index: an FTS5 sidecar over name-like text columns (or the listed
+# Table.Column pairs) for the entity lookup tool, resynced after agent writes
+VALUE_INDEX = os.environ.get("VALUE_INDEX", "true").lower() == "true"
+VALUE_INDEX_PATH = os.environ.get(
+    "VALUE_INDEX_PATH", os.path.join(CACHE_DIR, "value_index.db")
+)
+VALUE_INDEX_COLUMNS = [
+    column.strip()
+    for column in os.environ.get("VALUE_INDEX_COLUMNS", "").split(",")
+    if column.strip()
+]
+VALUE_INDEX_MAX_ROWS = int(os.environ.get("VALUE_INDEX_MAX_ROWS", "100000"))
+
+# Approximate aggregates: exploratory COUNT/SUM/AVG over huge tables are
+# estimated from a random sample sized to fit the latency budget (seconds)
+APPROXIMATE_MODE = os.environ.get("APPROXIMATE_MODE", "false").lower() == "true"
+APPROXIMATE_LATENCY_BUDGET = float(os.environ.get("APPROXIMATE_LATENCY_BUDGET", "1.0"))
+APPROXIMATE_ROWS_PER_SECOND = int(
+    os.environ.get("APPROXIMATE_ROWS_PER_SECOND", "200000")
+)
+APPROXIMATE_MIN_ROWS = int(os.environ.get("APPROXIMATE_MIN_ROWS", "1000000"))
+
+# Budgets of each statement the agent runs: seconds before it is cancelled and
+# rows a read may return (0 disables either)
+STATEMENT_TIMEOUT = float(os.environ.get("STATEMENT_TIMEOUT", "30"))
+STATEMENT_MAX_ROWS = int(os.environ.get("STATEMENT_MAX_ROWS", "10000"))
+RESULT_CACHE = os.environ.get("RESULT_CACHE", "true").lower() == "true"
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", "4194304"))
+RESULT_CACHE_TTL = int(os.environ.get("RESULT_CACHE_TTL", "300"))
+QUESTION_CACHE = os.environ.get("QUESTION_CACHE", "true").lower() == "true"
+QUESTION_CACHE_PATH = os.environ.get(
+    "QUESTION_CACHE_PATH", os.path.join(CACHE_DIR, "question_cache.db")
+)
+QUESTION_CACHE_MAX_ENTRIES = int(os.environ.get("QUESTION_CACHE_MAX_ENTRIES", "1000"))
+QUESTION_CACHE_FUZZY = os.environ.get("QUESTION_CACHE_FUZZY", "false").lower() == "true"
+QUESTION_CACHE_SIMILARITY = float(os.environ.get("QUESTION_CACHE_SIMILARITY", "0.75"))
+
+# Persistent LLM response cache, keyed by model, parameters and messages. Only
+# used with LLM_TEMPERATURE=0, where the same prompt gets the same answer
+LLM_CACHE = os.environ.get("LLM_CACHE", "true").lower() == "true"
+LLM_CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.db")
+)
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", "52428800"))
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", "604800"))
+
+# Per-step tracing: JSONL traces and Prometheus-style metrics for each question
+TRACING = os.environ.get("TRACING", "true").lower() == "true"
+TRACE_PATH = os.environ.get("TRACE_PATH", os.path.join(CACHE_DIR, "traces.jsonl"))
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", "10485760"))
+METRICS_PATH = os.environ.get("METRICS_PATH", os.path.join(CACHE_DIR, "metrics.prom"))
+
+# Workload log: every query the agent runs, with its fingerprint, duration and rows
+WORKLOAD_LOG = os.environ.get("WORKLOAD_LOG", "true").lower() == "true"
+WORKLOAD_PATH = os.environ.get("WORKLOAD_PATH", os.path.join(CACHE_DIR, "workload.db"))
+
+# Query plan capture: EXPLAIN every agent read, log full scans and large sorts to
+# the workload log, and suggest indexes from it with the 'advise' command
+PLAN_CAPTURE = os.environ.get("PLAN_CAPTURE", "false").lower() == "true"
+PLAN_LARGE_SORT_ROWS = int(os.environ.get("PLAN_LARGE_SORT_ROWS", "10000"))
+INDEX_ADVICE_MIN_ROWS = int(os.environ.get("INDEX_ADVICE_MIN_ROWS", "1000"))
+
+# Summary tables: aggregates the workload log shows are repeated and slow are
+# materialized as agent_summary_* tables in the database, refreshed after agent
+# writes and every SUMMARY_REFRESH_SECONDS, and read instead of the source tables
+SUMMARY_TABLES = os.environ.get("SUMMARY_TABLES", "false").lower() == "true"
+SUMMARY_MIN_REPEATS = int(os.environ.get("SUMMARY_MIN_REPEATS", "3"))
+SUMMARY_MIN_DURATION = float(os.environ.get("SUMMARY_MIN_DURATION", "0.5"))
+SUMMARY_MAX_ROWS = int(os.environ.get("SUMMARY_MAX_ROWS", "1000"))
+SUMMARY_MAX_TABLES = int(os.environ.get("SUMMARY_MAX_TABLES", "10"))
+SUMMARY_REFRESH_SECONDS = float(os.environ.get("SUMMARY_REFRESH_SECONDS", "300"))
+SUMMARY_TTL_DAYS = int(os.environ.get("SUMMARY_TTL_DAYS", "7"))
 
-# Agent
-toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-tools = toolkit.get_tools()
+# Conversation threads are checkpointed to SQLite after every turn, so they can
+# be listed and resumed after a restart. Idle threads expire after the TTL
+THREADS = os.environ.get("THREADS", "true").lower() == "true"
+THREAD_STORE_PATH = os.environ.get(
+    "THREAD_STORE_PATH", os.path.join(CACHE_DIR, "threads.db")
+)
+THREAD_TTL_DAYS = int(os.environ.get("THREAD_TTL_DAYS", "30"))
+THREAD_KEEP_CHECKPOINTS = int(os.environ.get("THREAD_KEEP_CHECKPOINTS", "5"))
+THREAD_MAX = int(os.environ.get("THREAD_MAX", "1000"))
+
+# Resident daemon (python daemon.py) listens on this Unix domain socket
+DAEMON_SOCKET = os.environ.get("DAEMON_SOCKET", os.path.join(CACHE_DIR, "agent.sock"))
 
-system_message = """
+
+SYSTEM_MESSAGE_TEMPLATE = """
 You are an expert SQL database agent designed to interact with a {dialect} database.
 
 ## Core Instructions:
-1. **Always start by examining the database schema** - Use the list tables and describe schema tools to understand the available tables and their structure.
+1. {schema_instructions}
 
 2. **Query Construction**:
    - Create syntactically correct {dialect} queries
    - Only select relevant columns, never use SELECT *
    - Limit results to {top_k} unless user specifies otherwise
    - Order results by relevant columns when appropriate
+   - When the user asks for a full extract or a very large result, use the export tool - it writes all rows to a file and returns only a preview{lookup_instructions}{approximate_instructions}
 
 3. **Query Validation**:
    - **ALWAYS double-check your queries before execution**
@@ -82,9 +213,12 @@ You are an expert SQL database agent designed to interact with a {dialect} datab
    - **Explain in simple terms** - Describe what each step will accomplish
    - **No partial executions** - Either plan everything or ask for clarification
    - **Use transactions automatically** - All planned modifications will be executed in a single transaction
+   - **Execute with one call** - Once the user confirms, pass every statement of the plan, in order, to the batch execution tool in a single call. It runs them in one transaction and rolls everything back if any statement fails
+   - **Reference related rows with subqueries** - e.g. (SELECT ArtistId FROM Artist WHERE Name = '...') instead of guessing generated IDs
    - For INSERT operations: Check for required fields and proper data types
    - For UPDATE operations: Always use WHERE clauses to avoid unintended changes
    - For DELETE operations: Use WHERE clauses and verify the scope of deletion
+   - Suggested indexes (CREATE INDEX) are modifications too: plan them and wait for confirmation
 
 ## Planning Format:
 When user requests modifications, respond with:
@@ -100,129 +234,956 @@ When user requests modifications, respond with:
 
 ## Database-Specific Notes:
 - This is a {dialect} database
-- **You can only execute one statement at a time** - Each SQL command must be executed separately
-- Each SQL statement executes independently
+- **The query tool executes one statement at a time** - Use it for SELECT queries
+- **Modifications go through the batch execution tool** - It accepts the full list of statements of a confirmed plan
 - Use proper {dialect} syntax and functions
 - Be mindful of {dialect}-specific data types and constraints
 
 Remember: Accuracy and data integrity are paramount. When in doubt, examine the schema and test with simple queries first.
-""".format(
-    dialect=DATABASE_TYPE,
-    top_k=TOP_K_RESULTS,
-)
+"""
 
-agent_executor = create_react_agent(
-    llm,
-    tools,
-    prompt=system_message,
-)
+# Runtime objects, created on first use by initialize() so that importing this
+# module stays cheap
+db = None
+db_router = None
+llm = None
+llm_cache = None
+schema_snapshot = None
+schema_index = None
+value_index = None
+estimator = None
+statement_guard = None
+thread_store = None
+data_version = None
+result_cache = None
+tools = None
+query_tool = None
+question_cache = None
+trace_recorder = None
+workload_log = None
+index_advisor = None
+summaries = None
+system_message = None
+fast_path = None
+agent_executor = None
+_init_lock = threading.Lock()
+
+
+def engine_args_for(uri):
+    """Engine arguments for a database URI, using the pool configuration"""
+    from db_routing import build_engine_args
+
+    return build_engine_args(
+        uri,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+    )
+
+
+def initialize(log=print):
+    """Connect to the database, initialize the LLM and build the agent, once
+
+    Heavy imports happen here rather than at module level, so helpers can be
+    imported cheaply and startup cost is only paid when the agent is used.
+    """
+    global db, db_router, llm, schema_snapshot, schema_index, data_version, result_cache
+    global tools, query_tool, question_cache, trace_recorder, system_message
+    global workload_log, index_advisor, value_index, thread_store, fast_path
+    global estimator, statement_guard, summaries, llm_cache, agent_executor
+
+    with _init_lock:
+        if agent_executor is not None:
+            return
+
+        from langchain.chat_models import init_chat_model
+        from langchain_community.utilities import SQLDatabase
+        from langgraph.prebuilt import create_react_agent
+
+        from db_routing import ReadRouter
+        from fast_path import FastPath
+        from index_advisor import IndexAdvisor
+        from llm_cache import LLMCache
+        from question_cache import QuestionCache
+        from result_cache import DataVersion, ResultCache
+        from result_format import ResultFormatter
+        from sampling import SampleEstimator
+        from statement_guard import StatementGuard
+        from schema_index import SchemaIndex
+        from summaries import SummaryTables
+        from schema_snapshot import SchemaSnapshot
+        from scripted_llm import ScriptedChatModel
+        from sql_tools import build_tools
+        from thread_store import ThreadStore
+        from tool_node import ConcurrentToolNode
+        from tracing import TraceRecorder
+        from value_index import ValueIndex
+        from workload import WorkloadLog
+
+        # Validation
+        if not LLM_API_KEY and LLM_PROVIDER != "scripted":
+            raise ValueError(
+                "OPENAI_API_KEY not found in environment variables. "
+                "Please check your .env file."
+            )
+
+        # Initialize database connection
+        try:
+            db = SQLDatabase.from_uri(
+                DATABASE_URI, engine_args=engine_args_for(DATABASE_URI)
+            )
+            log(f"✅ Connected to {DATABASE_TYPE} database: {DATABASE_URI}")
+        except Exception as e:
+            raise ValueError(f"Failed to connect to database: {e}")
+
+        # Route reads to replicas when configured
+        try:
+            db_router = ReadRouter.from_uris(
+                db,
+                DATABASE_READ_URIS,
+                engine_args_for=engine_args_for,
+                read_after_write=READ_AFTER_WRITE_SECONDS,
+            )
+            if DATABASE_READ_URIS:
+                log(f"✅ Connected to {len(DATABASE_READ_URIS)} read replica(s)")
+        except Exception as e:
+            raise ValueError(f"Failed to connect to read replica: {e}")
+
+        # Time and row budgets of the agent's statements, on every engine
+        statement_guard = StatementGuard(
+            timeout=STATEMENT_TIMEOUT, max_rows=STATEMENT_MAX_ROWS
+        )
+        for database in [db] + db_router.replicas:
+            statement_guard.install(database._engine)
+
+        # Initialize LLM
+        try:
+            if LLM_PROVIDER == "scripted":
+                llm = ScriptedChatModel.from_file(SCRIPTED_LLM_FILE)
+                log(f"✅ Initialized scripted LLM: {SCRIPTED_LLM_FILE}")
+            else:
+                model_args = {}
+                if LLM_TEMPERATURE:
+                    model_args["temperature"] = float(LLM_TEMPERATURE)
+                llm = init_chat_model(
+                    LLM_MODEL, model_provider=LLM_PROVIDER, **model_args
+                )
+                log(f"✅ Initialized {LLM_PROVIDER} LLM: {LLM_MODEL}")
+        except Exception as e:
+            raise ValueError(f"Failed to initialize LLM: {e}")
+
+        # Cache of LLM responses, for the agent, checker and fast path calls alike.
+        # Sampled answers vary, so only temperature 0 calls are cached
+        llm_cache = None
+        if LLM_CACHE and LLM_TEMPERATURE and float(LLM_TEMPERATURE) == 0:
+            llm_cache = LLMCache(
+                LLM_CACHE_PATH, max_bytes=LLM_CACHE_MAX_BYTES, ttl=LLM_CACHE_TTL
+            )
+            llm.cache = llm_cache
+
+        # Schema snapshot
+        schema_snapshot = None
+        if SCHEMA_CACHE:
+            schema_snapshot = SchemaSnapshot(db, SCHEMA_CACHE_PATH)
+            rebuilt = schema_snapshot.load()
+            log(
+                f"🗂️  Schema snapshot {'built' if rebuilt else 'loaded'}: "
+                f"{len(schema_snapshot.tables)} tables"
+            )
+
+        # Schema index over the snapshot, for large databases
+        schema_index = None
+        if schema_snapshot is not None and SCHEMA_INDEX:
+            schema_index = SchemaIndex(schema_snapshot, top_k=SCHEMA_INDEX_TOP_K)
+
+        # Value index for entity lookups, built once and reused across runs
+        value_index = None
+        if VALUE_INDEX:
+            value_index = ValueIndex(
+                db,
+                VALUE_INDEX_PATH,
+                columns=VALUE_INDEX_COLUMNS,
+                max_rows=VALUE_INDEX_MAX_ROWS,
+            )
+            built = value_index.load()
+            stats = value_index.stats()
+            log(
+                f"🔎 Value index {'built' if built else 'loaded'}: "
+                f"{stats['values']} values in {stats['columns']} columns"
+            )
+
+        # Query result cache, keyed by normalized SQL plus the data version
+        data_version = DataVersion(db)
+        result_cache = None
+        if RESULT_CACHE:
+            result_cache = ResultCache(
+                max_entries=RESULT_CACHE_MAX_ENTRIES,
+                max_bytes=RESULT_CACHE_MAX_BYTES,
+                ttl=RESULT_CACHE_TTL,
+            )
+
+        # Workload log of the agent's queries, with their plans when captured:
+        # the input of the index advisor and of the summary tables
+        workload_log = None
+        index_advisor = None
+        if WORKLOAD_LOG or PLAN_CAPTURE:
+            workload_log = WorkloadLog(
+                WORKLOAD_PATH,
+                database=db._engine.url.render_as_string(hide_password=True),
+                capture_plans=PLAN_CAPTURE,
+                large_sort_rows=PLAN_LARGE_SORT_ROWS,
+            )
+        if PLAN_CAPTURE:
+            index_advisor = IndexAdvisor(
+                db, workload_log, min_rows=INDEX_ADVICE_MIN_ROWS
+            )
+
+        # Summary tables of repeated heavy aggregates, maintained in the background
+        summaries = None
+        if SUMMARY_TABLES and workload_log is not None:
+            summaries = SummaryTables(
+                db,
+                workload_log,
+                WORKLOAD_PATH,
+                min_repeats=SUMMARY_MIN_REPEATS,
+                min_duration=SUMMARY_MIN_DURATION,
+                max_rows=SUMMARY_MAX_ROWS,
+                max_tables=SUMMARY_MAX_TABLES,
+                refresh_interval=SUMMARY_REFRESH_SECONDS,
+                ttl_days=SUMMARY_TTL_DAYS,
+                schema_snapshot=schema_snapshot,
+            )
+            loaded = summaries.load()
+            summaries.start()
+            if loaded:
+                log(f"🧮 Loaded {loaded} summary table(s), refreshing in the background")
+
+        # Sampling estimator for approximate aggregates (APPROXIMATE_MODE)
+        estimator = None
+        if APPROXIMATE_MODE:
+            estimator = SampleEstimator(
+                latency_budget=APPROXIMATE_LATENCY_BUDGET,
+                rows_per_second=APPROXIMATE_ROWS_PER_SECOND,
+                min_rows=APPROXIMATE_MIN_ROWS,
+            )
+
+        # Agent
+        tools = build_tools(
+            db,
+            llm,
+            schema_snapshot=schema_snapshot,
+            result_cache=result_cache,
+            data_version=data_version,
+            db_router=db_router,
+            export_dir=EXPORT_DIR,
+            export_batch_size=EXPORT_BATCH_SIZE,
+            batch_mode=BATCH_MODE,
+            query_checker=QUERY_CHECKER,
+            workload_log=workload_log,
+            index_advisor=index_advisor,
+            schema_index=schema_index,
+            value_index=value_index,
+            estimator=estimator,
+            statement_guard=statement_guard,
+            summaries=summaries,
+            result_formatter=ResultFormatter(
+                max_rows=RESULT_MAX_ROWS,
+                max_tokens=RESULT_MAX_TOKENS,
+                max_cell_chars=RESULT_MAX_CELL_CHARS,
+                model=LLM_MODEL,
+            )
+            if RESULT_FORMAT == "compact"
+            else None,
+        )
+        query_tool = next(tool for tool in tools if tool.name == "sql_db_query")
+
+        # Question cache: repeated read-only questions skip the LLM entirely
+        question_cache = None
+        if QUESTION_CACHE:
+            question_cache = QuestionCache(
+                QUESTION_CACHE_PATH,
+                database=db._engine.url.render_as_string(hide_password=True),
+                max_entries=QUESTION_CACHE_MAX_ENTRIES,
+                fuzzy=QUESTION_CACHE_FUZZY,
+                similarity=QUESTION_CACHE_SIMILARITY,
+            )
+
+        # Durable conversation threads, compacted on every start
+        thread_store = None
+        if THREADS:
+            thread_store = ThreadStore(
+                THREAD_STORE_PATH,
+                database=db._engine.url.render_as_string(hide_password=True),
+                ttl_days=THREAD_TTL_DAYS,
+                keep_checkpoints=THREAD_KEEP_CHECKPOINTS,
+                max_threads=THREAD_MAX,
+            )
+            expired = thread_store.compact()
+            if expired:
+                log(f"🧵 Removed {expired} expired conversation thread(s)")
+
+        trace_recorder = None
+        if TRACING:
+            trace_recorder = TraceRecorder(
+                TRACE_PATH, METRICS_PATH, max_bytes=TRACE_MAX_BYTES
+            )
+
+        if schema_snapshot is not None:
+            schema_instructions = (
+                "**Use the database schema listed below** - It describes every table "
+                "with its columns, primary keys (PK) and foreign keys (->). Only use "
+                "the describe schema tool when you need sample rows."
+            )
+        else:
+            schema_instructions = (
+                "**Always start by examining the database schema** - Use the list "
+                "tables and describe schema tools to understand the available tables "
+                "and their structure."
+            )
+
+        lookup_instructions = ""
+        if value_index is not None:
+            lookup_instructions = (
+                "\n   - To find a named entity (an artist, album, customer...), use "
+                "the entity lookup tool rather than LIKE scans - it returns the exact "
+                "stored value and its primary key, despite typos, case or accents"
+            )
+
+        approximate_instructions = ""
+        if estimator is not None:
+            approximate_instructions = (
+                "\n   - For exploratory COUNT, SUM or AVG questions over very large "
+                "tables, use the approximate query tool - it answers from a random "
+                "sample in about a second. Always label such answers as approximate "
+                "and give their error margins. Use the query tool when the user asks "
+                "for exact figures"
+            )
+
+        system_message = SYSTEM_MESSAGE_TEMPLATE.format(
+            dialect=DATABASE_TYPE,
+            top_k=TOP_K_RESULTS,
+            schema_instructions=schema_instructions,
+            lookup_instructions=lookup_instructions,
+            approximate_instructions=approximate_instructions,
+        )
+
+        # Two-call pipeline for simple read-only questions (AGENT_MODE=fast)
+        fast_path = FastPath(
+            llm,
+            query_tool,
+            fast_path_schema,
+            dialect=DATABASE_TYPE,
+            top_k=TOP_K_RESULTS,
+        )
+
+        # Configure the agent with our recursion limit. agent_executor is assigned
+        # last, it marks initialization as complete
+        agent_executor = create_react_agent(
+            llm,
+            ConcurrentToolNode(tools, max_workers=TOOL_CONCURRENCY),
+            prompt=build_prompt,
+        ).with_config({"recursion_limit": RECURSION_LIMIT})
+        log(f"🔄 Agent recursion limit set to: {RECURSION_LIMIT}")
+
+
+def build_prompt(state):
+    """Build the system prompt, including the current schema snapshot
+
+    Large schemas are pruned to the tables relevant to the latest question, so
+    the prompt stays about the same size however many tables there are.
+    """
+    from langchain_core.messages import SystemMessage
 
-# Configure the agent with our recursion limit
-agent_executor = agent_executor.with_config({"recursion_limit": RECURSION_LIMIT})
-print(f"🔄 Agent recursion limit set to: {RECURSION_LIMIT}")
+    content = system_message
+    if schema_snapshot is not None:
+        table_count = len(schema_snapshot.tables)
+        if schema_index is not None and table_count > SCHEMA_PRUNE_TABLES:
+            question = next(
+                (m.content for m in reversed(state["messages"]) if m.type == "human"),
+                "",
+            )
+            relevant = schema_index.describe(str(question))
+            content += (
+                "\n## Database Schema (relevant tables only):\n"
+                + (relevant or "No table matched the question.")
+                + f"\nThe database has {table_count} tables. Find others with the "
+                "relevant tables tool."
+            )
+        else:
+            content += "\n## Database Schema:\n" + schema_snapshot.prompt_context()
+    if summaries is not None:
+        content += summaries.describe()
+    return [SystemMessage(content=content)] + state["messages"]
+
+
+def fast_path_schema(question):
+    """Schema for the fast path prompt: the snapshot, pruned on large databases"""
+    if schema_snapshot is None:
+        schema = db.get_table_info()
+    elif schema_index is not None and len(schema_snapshot.tables) > SCHEMA_PRUNE_TABLES:
+        schema = schema_index.describe(question) or schema_snapshot.prompt_context()
+    else:
+        schema = schema_snapshot.prompt_context()
+    if summaries is not None:
+        schema += summaries.describe()
+    return schema
+
+
+def answer_from_question_cache(question):
+    """Answer a repeated question by re-running its cached SQL, skipping the LLM"""
+    entry = question_cache.lookup(question)
+    if entry is None:
+        return None
+
+    results = [query_tool.invoke({"query": query}) for query in entry["queries"]]
+    if results != entry["results"]:
+        # The data changed, so the cached answer may no longer hold
+        question_cache.discard(entry["id"])
+        return None
+
+    return entry["answer"]
+
+
+def store_in_question_cache(question, messages, answer):
+    """Cache the read queries behind an answer, skipping any run that wrote data"""
+    tool_results = {
+        message.tool_call_id: message.content
+        for message in messages
+        if message.type == "tool"
+    }
+
+    queries = []
+    results = []
+    for message in messages:
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            if tool_call["name"] != "sql_db_query":
+                continue
+            query = tool_call.get("args", {}).get("query", "")
+            if is_modification_query(query):
+                return
+            result = tool_results.get(tool_call["id"])
+            if not isinstance(result, str) or result.startswith("Error:"):
+                continue
+            queries.append(query)
+            results.append(result)
 
+    if queries:
+        question_cache.store(question, queries, results, answer)
 
-def requires_modifications(user_input):
-    """Detect if the request requires database modifications"""
-    modification_keywords = [
-        "create",
-        "add",
-        "insert",
-        "new",
-        "make",
-        "update",
-        "change",
-        "modify",
-        "edit",
-        "alter",
-        "delete",
-        "remove",
-        "drop",
-        "clear",
-    ]
 
-    return any(keyword in user_input.lower() for keyword in modification_keywords)
+def log_tool_call(tool_call, executed_queries, log=print):
+    """Show a tool call's SQL in debug mode and collect the statements it runs"""
+    tool_name = tool_call["name"]
+    args = tool_call.get("args", {})
+    if tool_name == "sql_db_query":
+        query = args.get("query", "")
+        if query:
+            executed_queries.append(query)
+        if query and DEBUG_MODE:
+            log(f"   📝 SQL Query: {query}")
+    elif tool_name == "sql_db_execute_batch":
+        statements = args.get("statements", [])
+        executed_queries.extend(statements)
+        if DEBUG_MODE:
+            for statement in statements:
+                log(f"   📝 SQL Query: {statement}")
+    elif DEBUG_MODE and tool_name == "sql_db_query_checker":
+        query = args.get("query", "")
+        if query:
+            log(f"   🔍 Checking Query: {query}")
 
 
-def is_modification_query(query):
-    """Detect if a SQL query is a modification"""
-    query_upper = query.upper().strip()
-    modification_keywords = ["INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "CREATE"]
-    return any(query_upper.startswith(keyword) for keyword in modification_keywords)
+class AnswerStream:
+    """Answer tokens of a graph node, streamed live and taken back if they were not
 
+    With stream_mode="messages", tool messages and the LLM calls made inside
+    tools are streamed too; only the given node's own tokens are kept. Text a
+    model writes before calling tools is not part of the answer, but a message
+    only shows that it calls tools once its tool call chunks arrive, after its
+    text. Tokens are streamed as they come; when their message turns out to call
+    tools, the text it streamed is taken back as a "thought".
+    """
 
-def execute_with_batch_safety(conversation_history):
-    """Execute agent with batch safety checks"""
+    def __init__(self, node="agent"):
+        self.node = node
+        self._streamed = []
+        self._calls_tools = False
+
+    def add(self, message, metadata):
+        """("token" or "thought", text) events for a streamed LLM message chunk"""
+        from langchain_core.messages import AIMessage
+
+        if metadata.get("langgraph_node") != self.node or not isinstance(
+            message, AIMessage
+        ):
+            return []
+        events = []
+        text = message.text()
+        if text:
+            self._streamed.append(text)
+            events.append(("token", text))
+        if getattr(message, "tool_call_chunks", None) or message.tool_calls:
+            self._calls_tools = True
+        if self._calls_tools:
+            events.extend(self._take_back())
+        return events
+
+    def finish(self, message):
+        """Events once a message is complete: its streamed text, if it called tools"""
+        events = self._take_back() if getattr(message, "tool_calls", None) else []
+        self._streamed = []
+        self._calls_tools = False
+        return events
+
+    def _take_back(self):
+        text = "".join(self._streamed)
+        self._streamed = []
+        return [("thought", text)] if text else []
+
+
+def agent_turn(
+    messages,
+    batch_mode=None,
+    mode=None,
+    debug=None,
+    stream=False,
+    callbacks=None,
+    cancel_scope=None,
+    use_llm_cache=True,
+):
+    """Answer the last question of a conversation, yielding (event, data) pairs
+
+    The one implementation of a turn, behind the CLI, the daemon and the server.
+    Events are "notice" (a progress message), "step" (an agent step and its
+    tool calls), "tool_result", "token" (answer text as it is generated, when
+    stream is set), "thought" (text already sent as tokens that was written
+    before a tool call, so not part of the answer), then "answer" or
+    "cancelled".
+    Progress comes from per-node update events. batch_mode, mode and debug
+    default to the global settings. Cancelling cancel_scope stops the run and
+    its SQL statements; a run that fails or is abandoned cancels its own
+    statements. use_llm_cache=False sends every LLM call to the provider.
+    """
+    from llm_cache import bypass_llm_cache
+    from statement_guard import CancelScope
+
+    initialize()
+    batch_mode = BATCH_MODE if batch_mode is None else batch_mode
+    mode = AGENT_MODE if mode is None else mode
+    debug = DEBUG_MODE if debug is None else debug
+    bypass_llm_cache(not use_llm_cache)
+    cancel_scope = cancel_scope or CancelScope()
+    started = time.perf_counter()
 
     # Check if this might be a modification request
-    last_message = conversation_history[-1]["content"]
-    might_modify = requires_modifications(last_message)
+    question = messages[-1]["content"]
+    might_modify = requires_modifications(question)
+
+    # Only single-turn, read-only questions may use the question cache
+    cacheable = question_cache is not None and len(messages) == 1 and not might_modify
+    tracer = trace_recorder.start(question) if trace_recorder is not None else None
+    if tracer is not None:
+        callbacks = [*(callbacks or []), tracer]
+    config = {
+        "configurable": {"batch_mode": batch_mode, "cancel_scope": cancel_scope},
+        "callbacks": callbacks,
+    }
+
+    def finish_trace(**kwargs):
+        if tracer is None:
+            return []
+        trace_recorder.finish(tracer, **kwargs)
+        if not debug:
+            return []
+        from tracing import describe_trace
+
+        return [("notice", {"message": describe_trace(tracer)})]
 
-    if BATCH_MODE and might_modify:
-        print("🔍 Detected potential modification request")
-        print("📋 Agent will plan operations before executing")
+    if cacheable:
+        cached_answer = answer_from_question_cache(question)
+        if cached_answer is not None:
+            yield "notice", {"message": "⚡ Answered from question cache"}
+            yield from finish_trace(cached=True)
+            yield "answer", {
+                "content": cached_answer,
+                "cached": True,
+                "mode": "cache",
+                "steps": 0,
+                "elapsed": time.perf_counter() - started,
+            }
+            return
+
+    if batch_mode and might_modify:
+        yield "notice", {"message": "🔍 Detected potential modification request"}
+        yield "notice", {"message": "📋 Agent will plan operations before executing"}
+
+    # Pick up schema changes made outside the agent
+    if schema_snapshot is not None and schema_snapshot.refresh_if_changed():
+        yield "notice", {"message": "🗂️  Schema changed, snapshot rebuilt"}
+
+    run_mode = "agent"
+    if mode == "fast" and not might_modify:
+        yield "notice", {"message": "🏎️  Fast path: writing one query"}
+        fast = {}
+        try:
+            for kind, data in fast_path.stream(messages, config, tokens=stream):
+                if kind == "token":
+                    yield "token", {"content": data}
+                else:
+                    fast = data
+        except Exception as e:
+            fast = {"escalate": f"fast path failed ({e})"}
+        if cancel_scope.cancelled:
+            yield from finish_trace(error="cancelled", mode="fast")
+            yield "cancelled", {"steps": 0, "elapsed": time.perf_counter() - started}
+            return
+        if fast.get("answer"):
+            yield "step", {
+                "step": 1,
+                "tool_calls": [
+                    {"name": "sql_db_query", "args": {"query": fast["query"]}}
+                ],
+            }
+            if cacheable:
+                question_cache.store(
+                    question, [fast["query"]], [fast["result"]], fast["answer"]
+                )
+            yield from finish_trace(mode="fast")
+            yield "answer", {
+                "content": fast["answer"],
+                "cached": False,
+                "mode": "fast",
+                "steps": 1,
+                "elapsed": time.perf_counter() - started,
+            }
+            return
+        yield "notice", {
+            "message": f"↪️  Fast path escalated to the agent: {fast['escalate']}"
+        }
+        run_mode = "escalated"
 
     # Execute agent normally - the updated prompt will handle planning
     agent_response = ""
     step_count = 0
+    new_messages = []
+    answer_stream = AnswerStream()
+
+    error = None
+    try:
+        # "updates" carries only the messages each node adds; "messages" carries
+        # LLM tokens as they arrive, and is only requested when they are shown
+        for stream_mode, chunk in agent_executor.stream(
+            {"messages": list(messages)},
+            config,
+            stream_mode=["updates", "messages"] if stream else ["updates"],
+            recursion_limit=RECURSION_LIMIT,
+        ):
+            if stream_mode == "messages":
+                for kind, text in answer_stream.add(*chunk):
+                    yield kind, _stream_event(kind, text, step_count)
+                continue
+
+            for update in chunk.values():
+                for message in (update or {}).get("messages", []):
+                    new_messages.append(message)
+                    if stream and message.type == "ai":
+                        for kind, text in answer_stream.finish(message):
+                            yield kind, _stream_event(kind, text, step_count)
+                    # Agent steps, with every tool call of the step
+                    if getattr(message, "tool_calls", None):
+                        step_count += 1
+                        yield "step", {
+                            "step": step_count,
+                            "tool_calls": message.tool_calls,
+                        }
+                    elif message.type == "tool":
+                        yield "tool_result", {
+                            "step": step_count,
+                            "tool": message.name,
+                            "duration": message.response_metadata.get("duration"),
+                            "error": message.status == "error",
+                        }
+
+                    # Capture final response
+                    if message.type == "ai" and message.content:
+                        agent_response = message.content
+
+            if cancel_scope.cancelled:
+                error = "cancelled"
+                break
+    except (KeyboardInterrupt, GeneratorExit):
+        error = "cancelled"
+        cancel_scope.cancel()
+        raise
+    except Exception as e:
+        error = str(e)
+        cancel_scope.cancel()
+        raise
+    finally:
+        trace = finish_trace(error=error, mode=run_mode)
+    yield from trace
+
+    if cancel_scope.cancelled:
+        yield "cancelled", {
+            "steps": step_count,
+            "elapsed": time.perf_counter() - started,
+        }
+        return
+
+    if cacheable and agent_response:
+        store_in_question_cache(question, new_messages, agent_response)
+
+    yield "answer", {
+        "content": agent_response,
+        "cached": False,
+        "mode": run_mode,
+        "steps": step_count,
+        "elapsed": time.perf_counter() - started,
+    }
+
+
+def _stream_event(kind, text, step_count):
+    if kind == "thought":
+        return {"step": step_count + 1, "content": text}
+    return {"content": text}
+
+
+def history_turn(history, question, thread_id=None, **options):
+    """Answer a question in a conversation, yielding the events of agent_turn
+
+    The question joins the history for the turn. An answered turn adds the
+    answer, folds old turns into the summary and checkpoints the thread; a
+    turn that fails or is cancelled leaves the history as it was. The answer
+    event also carries the number of messages folded.
+    """
+    history.add("user", question)
+    answered = False
+    try:
+        for event, data in agent_turn(history.messages(), **options):
+            if event == "answer":
+                if data["content"]:
+                    history.add("assistant", data["content"])
+                answered = True
+                data = {**data, "folded": history.compact()}
+                save_history(thread_id, history)
+            yield event, data
+    finally:
+        if not answered:
+            history.discard_last("user", question)
+
+
+def follow_turn(events, log=print, on_token=None, on_thought=None):
+    """Show the events of a turn through log, on_token and on_thought
+
+    on_thought takes back streamed text that turned out to precede a tool call;
+    without it, the text is logged as a step note.
+
+    Returns the final answer event (None if the turn was cancelled) and the
+    SQL statements the agent ran.
+    """
     executed_queries = []
+    answer = None
+    for event, data in events:
+        if event == "notice":
+            log(data["message"])
+        elif event == "thought" and on_thought:
+            on_thought(data["content"])
+        elif event == "thought":
+            log(f"💭 {data['content'].strip()}")
+        elif event == "token" and on_token:
+            on_token(data["content"])
+        elif event == "step":
+            tool_names = ", ".join(c["name"] for c in data["tool_calls"])
+            log(f"🔧 Step {data['step']}: Executing {tool_names}")
+            for tool_call in data["tool_calls"]:
+                log_tool_call(tool_call, executed_queries, log)
+        elif event == "tool_result" and DEBUG_MODE:
+            if data["duration"] is not None:
+                log(f"   ⏱️  {data['tool']}: {data['duration'] * 1000:.1f} ms")
+        elif event == "cancelled":
+            log("⚠️  Cancelled")
+        elif event == "answer":
+            answer = data
+    return answer, executed_queries
+
+
+def execute_with_batch_safety(
+    conversation_history,
+    callbacks=None,
+    log=print,
+    on_token=None,
+    cancel_scope=None,
+    use_llm_cache=True,
+    on_thought=None,
+):
+    """Execute agent with batch safety checks
+
+    Runs agent_turn on a list of messages, showing its progress through log.
+    With on_token, the agent's answer is also passed to it token by token as
+    the LLM produces it (see follow_turn for on_thought). Returns the answer
+    and the SQL statements the agent ran.
+    """
+    initialize(log=log)
+    answer, executed_queries = follow_turn(
+        agent_turn(
+            conversation_history,
+            stream=on_token is not None,
+            callbacks=callbacks,
+            cancel_scope=cancel_scope,
+            use_llm_cache=use_llm_cache,
+        ),
+        log,
+        on_token,
+        on_thought,
+    )
+    return (answer["content"] if answer else ""), executed_queries
+
+
+def parse_export_command(user_input):
+    """Split an 'export <format> <SQL>' command into its format and query"""
+    from exporter import EXPORT_FORMATS
+
+    parts = user_input.split(maxsplit=2)
+    if len(parts) == 3 and parts[0].lower() == "export":
+        if parts[1].lower() in EXPORT_FORMATS:
+            return parts[1].lower(), parts[2]
+    return None
+
+
+def new_history():
+    """Create a token-budgeted conversation history"""
+    from history_manager import HistoryManager
+
+    initialize()
+    return HistoryManager(
+        llm,
+        token_budget=HISTORY_TOKEN_BUDGET,
+        keep_turns=HISTORY_KEEP_TURNS,
+        model=LLM_MODEL,
+    )
+
+
+def new_thread_id():
+    """Short random id for a new conversation thread"""
+    return uuid.uuid4().hex[:12]
+
+
+def load_history(thread_id):
+    """Restore a thread's checkpointed history, or None if it is unknown"""
+    initialize()
+    if thread_store is None:
+        return None
+    state = thread_store.load(thread_id)
+    if state is None:
+        return None
+    history = new_history()
+    history.restore(state)
+    return history
+
+
+def save_history(thread_id, history):
+    """Checkpoint a thread's history after a turn"""
+    if thread_store is not None and thread_id:
+        thread_store.save(thread_id, history)
+
+
+def _warm_up():
+    try:
+        initialize(log=lambda *args: None)
+    except Exception:
+        # The error is raised again, and shown, when the agent is first used
+        pass
 
-    for step in agent_executor.stream(
-        {"messages": conversation_history.copy()},
-        stream_mode="values",
-        recursion_limit=RECURSION_LIMIT,
-    ):
-        if step.get("messages"):
-            last_message = step["messages"][-1]
-
-            # Show agent steps
-            if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-                step_count += 1
-                tool_call = last_message.tool_calls[0]
-                tool_name = tool_call["name"]
-                print(f"🔧 Step {step_count}: Executing {tool_name}")
-
-                # Show SQL query in debug mode
-                if DEBUG_MODE and tool_name == "sql_db_query":
-                    query = tool_call.get("args", {}).get("query", "")
-                    if query:
-                        print(f"   📝 SQL Query: {query}")
-                        executed_queries.append(query)
-                elif DEBUG_MODE and tool_name == "sql_db_query_checker":
-                    query = tool_call.get("args", {}).get("query", "")
-                    if query:
-                        print(f"   🔍 Checking Query: {query}")
-
-            # Capture final response
-            if last_message.content and last_message.content != agent_response:
-                agent_response = last_message.content
-
-    return agent_response, executed_queries
-
-
-def interactive_cli():
+
+class TokenPrinter:
+    """Print answer tokens as they arrive, under the response header
+
+    Used as both the on_token and the log callback of a run, so step logs
+    that follow streamed text start on a new line.
+    """
+
+    def __init__(self):
+        self.streamed = False
+        self._open_line = False
+
+    def __call__(self, token):
+        if not self.streamed:
+            print("-" * 40)
+            print("✅ Response:")
+            self.streamed = True
+        print(token, end="", flush=True)
+        self._open_line = True
+
+    def thought(self, text):
+        """Mark the text just printed as a note written before a tool call"""
+        self.end_line()
+        print("💭 ↑ Written before calling a tool, not part of the answer")
+        # The answer itself starts under a new header
+        self.streamed = False
+
+    def log(self, *args, **kwargs):
+        self.end_line()
+        print(*args, **kwargs)
+
+    def end_line(self):
+        if self._open_line:
+            print()
+            self._open_line = False
+
+
+def interactive_cli(resume=None):
     """Interactive CLI interface to chat with the SQL agent"""
-    global DEBUG_MODE, BATCH_MODE
+    global DEBUG_MODE, BATCH_MODE, AGENT_MODE, STREAM_TOKENS
+    from statement_guard import CancelScope
 
     print("🤖 Interactive SQL Agent")
     print("=" * 50)
     print("Ask questions about the database.")
     print("Special commands:")
     print("  - 'exit' or 'quit': Exit the program")
-    print("  - 'clear': Clear conversation history")
+    print("  - 'clear': Clear conversation history and start a new thread")
+    print("  - 'threads': List saved conversation threads")
+    print("  - 'resume <id>': Continue a saved thread")
     print("  - 'debug': Toggle debug mode (show SQL queries)")
     print("  - 'batch': Toggle batch execution mode")
+    print("  - 'fast': Toggle fast mode (two LLM calls for simple questions)")
+    print("  - 'stream': Toggle token streaming of answers")
+    print("  - 'llmcache': Toggle the LLM response cache for this session")
     print("  - 'config': Show current configuration")
+    print("  - 'stats': Show step latency percentiles")
+    print("  - 'advise': Suggest indexes from captured query plans")
+    print("  - 'reindex': Resync the entity value index with the database")
+    print("  - 'export <format> <SQL>': Export a query's full result to a file")
     print("  - 'help': Show this help")
     print("=" * 50)
     print(f"🔍 Debug mode: {'ON' if DEBUG_MODE else 'OFF'}")
     print(f"📦 Batch mode: {'ON' if BATCH_MODE else 'OFF'}")
+    print(f"🏎️  Fast mode: {'ON' if AGENT_MODE == 'fast' else 'OFF'}")
     print(f"🎯 Database: {DATABASE_TYPE}")
     print(f"🧠 LLM: {LLM_PROVIDER}/{LLM_MODEL}")
     print(f"🔄 Recursion limit: {RECURSION_LIMIT}")
 
-    # Conversation history
-    conversation_history = []
+    # Conversation history and its thread, created with the first question
+    conversation_history = None
+    thread_id = None
+    # Cancellation handle of the question being answered
+    cancel_scope = None
+    # The LLM cache can be bypassed for this session only
+    use_llm_cache = True
+
+    if resume:
+        conversation_history = load_history(resume)
+        if conversation_history is None:
+            print(f"⚠️  Unknown thread: {resume}. Starting a new one.")
+        else:
+            thread_id = resume
+            print(f"🧵 Resumed thread {thread_id}")
+    else:
+        # Connect and build the agent in the background while the user types
+        threading.Thread(target=_warm_up, daemon=True).start()
 
     while True:
         try:
@@ -234,9 +1195,36 @@ def interactive_cli():
                 print("\n👋 Goodbye!")
                 break
             elif user_input.lower() == "clear":
-                conversation_history = []
+                # The cleared thread stays saved; the next question starts a new one
+                conversation_history = None
+                thread_id = None
                 print("\n🧹 History cleared.")
                 continue
+            elif user_input.lower() == "threads":
+                from thread_store import describe_threads
+
+                initialize()
+                if thread_store is None:
+                    print("\n🧵 Threads are OFF. Set THREADS=true to save them.")
+                    continue
+                print(f"\n🧵 {describe_threads(thread_store.threads())}")
+                if thread_id:
+                    print(f"   Current thread: {thread_id}")
+                continue
+            elif user_input.lower().startswith("resume "):
+                requested = user_input.split(maxsplit=1)[1].strip()
+                history = load_history(requested)
+                if history is None:
+                    print(f"\n⚠️  Unknown thread: {requested}. See 'threads'.")
+                    continue
+                conversation_history = history
+                thread_id = requested
+                print(
+                    f"\n🧵 Resumed thread {thread_id}: "
+                    f"{len(history.turns)} recent message(s)"
+                    f"{', earlier turns summarized' if history.summary else ''}"
+                )
+                continue
             elif user_input.lower() == "debug":
                 DEBUG_MODE = not DEBUG_MODE
                 print(f"\n🔍 Debug mode: {'ON' if DEBUG_MODE else 'OFF'}")
@@ -245,15 +1233,205 @@ def interactive_cli():
                 BATCH_MODE = not BATCH_MODE
                 print(f"\n📦 Batch mode: {'ON' if BATCH_MODE else 'OFF'}")
                 continue
+            elif user_input.lower() == "fast":
+                AGENT_MODE = "agent" if AGENT_MODE == "fast" else "fast"
+                print(f"\n🏎️  Fast mode: {'ON' if AGENT_MODE == 'fast' else 'OFF'}")
+                continue
+            elif user_input.lower() == "stream":
+                STREAM_TOKENS = not STREAM_TOKENS
+                print(f"\n📡 Streaming: {'ON' if STREAM_TOKENS else 'OFF'}")
+                continue
+            elif user_input.lower() == "llmcache":
+                use_llm_cache = not use_llm_cache
+                print(f"\n🧠 LLM cache: {'ON' if use_llm_cache else 'BYPASSED'}")
+                continue
             elif user_input.lower() == "config":
+                initialize()
                 print("\n⚙️  Current Configuration:")
                 print(f"   🎯 Database: {DATABASE_TYPE}")
                 print(f"   🔗 Database URI: {DATABASE_URI}")
+                print(f"   🔀 Read routing: {db_router.describe()}")
+                print(
+                    f"   🏊 Pool: size {DB_POOL_SIZE}, overflow {DB_MAX_OVERFLOW}, "
+                    f"recycle {DB_POOL_RECYCLE}s"
+                )
                 print(f"   🧠 LLM: {LLM_PROVIDER}/{LLM_MODEL}")
+                if llm_cache is not None:
+                    stats = llm_cache.stats()
+                    print(
+                        f"   🧠 LLM cache: {stats['hits']} hits, {stats['misses']} "
+                        f"misses ({stats['hit_rate']:.0%}), {stats['entries']} "
+                        f"entries, {stats['bytes'] / 1048576:.1f} MB, "
+                        f"{stats['evictions']} evictions"
+                        + ("" if use_llm_cache else " (bypassed in this session)")
+                    )
+                else:
+                    print("   🧠 LLM cache: OFF (needs LLM_TEMPERATURE=0)")
                 print(f"   🔍 Debug mode: {'ON' if DEBUG_MODE else 'OFF'}")
                 print(f"   📦 Batch mode: {'ON' if BATCH_MODE else 'OFF'}")
+                print(f"   🏎️  Fast mode: {'ON' if AGENT_MODE == 'fast' else 'OFF'}")
+                print(f"   📡 Streaming: {'ON' if STREAM_TOKENS else 'OFF'}")
                 print(f"   🔄 Recursion limit: {RECURSION_LIMIT}")
                 print(f"   📊 Top K results: {TOP_K_RESULTS}")
+                print(f"   🧵 Concurrent tool calls: {TOOL_CONCURRENCY}")
+                print(
+                    f"   ⏳ Statement budgets: {STATEMENT_TIMEOUT:g}s, "
+                    f"{STATEMENT_MAX_ROWS} rows (0 = unlimited)"
+                )
+                if estimator is not None:
+                    print(
+                        f"   🎲 Approximate mode: ON, "
+                        f"{APPROXIMATE_LATENCY_BUDGET:g}s budget, "
+                        f"~{estimator.rows_per_second:,.0f} sampled rows/s"
+                    )
+                if thread_store is not None:
+                    stats = thread_store.stats()
+                    print(
+                        f"   💬 Threads: {stats['threads']} saved "
+                        f"(TTL {THREAD_TTL_DAYS} days), current: {thread_id or 'none'}"
+                    )
+                else:
+                    print("   💬 Threads: OFF")
+                print(
+                    f"   🗜️  History: "
+                    f"{conversation_history.token_count() if conversation_history else 0}"
+                    f"/{HISTORY_TOKEN_BUDGET} tokens, "
+                    f"last {HISTORY_KEEP_TURNS} turns verbatim"
+                )
+                print(f"   🗂️  Schema cache: {'ON' if SCHEMA_CACHE else 'OFF'}")
+                if schema_index is not None:
+                    print(
+                        f"   🧭 Schema index: top {SCHEMA_INDEX_TOP_K} tables, prompt "
+                        f"pruned beyond {SCHEMA_PRUNE_TABLES} tables"
+                    )
+                else:
+                    print("   🧭 Schema index: OFF")
+                if value_index is not None:
+                    stats = value_index.stats()
+                    print(
+                        f"   🔎 Value index: {stats['values']} values in "
+                        f"{stats['columns']} columns"
+                    )
+                else:
+                    print("   🔎 Value index: OFF")
+                print(f"   ✔️  Query checker: {QUERY_CHECKER}")
+                print(
+                    f"   🧾 Result format: {RESULT_FORMAT} (max {RESULT_MAX_ROWS} rows, "
+                    f"{RESULT_MAX_TOKENS} tokens)"
+                )
+                print(f"   📈 Tracing: {'ON (' + TRACE_PATH + ')' if TRACING else 'OFF'}")
+                if workload_log is not None:
+                    stats = workload_log.stats()
+                    print(
+                        f"   📇 Workload log: {stats['queries']} queries logged"
+                        + (
+                            f", {stats['flagged']} with full scans or large sorts"
+                            if PLAN_CAPTURE
+                            else " (plan capture OFF)"
+                        )
+                    )
+                else:
+                    print("   📇 Workload log: OFF")
+                if summaries is not None:
+                    stats = summaries.stats()
+                    print(
+                        f"   🧮 Summary tables: {stats['tables']} ({stats['fresh']} "
+                        f"fresh), {stats['hits']} reads served"
+                    )
+                else:
+                    print("   🧮 Summary tables: OFF")
+                if result_cache is not None:
+                    stats = result_cache.stats()
+                    print(
+                        f"   💾 Result cache: {stats['hits']} hits, "
+                        f"{stats['misses']} misses ({stats['hit_rate']:.0%}), "
+                        f"{stats['entries']} entries, {stats['evictions']} evictions"
+                    )
+                else:
+                    print("   💾 Result cache: OFF")
+                if question_cache is not None:
+                    stats = question_cache.stats()
+                    print(
+                        f"   ⚡ Question cache: {stats['hits']} hits, "
+                        f"{stats['misses']} misses ({stats['hit_rate']:.0%}), "
+                        f"{stats['entries']} entries"
+                    )
+                else:
+                    print("   ⚡ Question cache: OFF")
+                continue
+            elif user_input.lower() == "stats":
+                initialize()
+                if trace_recorder is None:
+                    print("\n📈 Tracing is OFF. Set TRACING=true to collect stats.")
+                    continue
+                rows = trace_recorder.summary()
+                if not rows:
+                    print("\n📈 No questions traced yet.")
+                    continue
+                print("\n📈 Step latency (recent questions):")
+                print(f"   {'step':<40} {'count':>6} {'p50 ms':>9} {'p95 ms':>9}")
+                for row in rows:
+                    print(
+                        f"   {row['type'] + ' ' + row['name']:<40} {row['count']:>6} "
+                        f"{row['p50'] * 1000:>9.1f} {row['p95'] * 1000:>9.1f}"
+                    )
+                counters = trace_recorder.counters()
+                print(
+                    f"   🧮 Tokens: {counters['prompt_tokens']} prompt, "
+                    f"{counters['completion_tokens']} completion · "
+                    f"LLM calls: {counters['llm_calls']} "
+                    f"({counters['cached_llm_calls']} cached) · "
+                    f"SQL rows: {counters['sql_rows']}"
+                )
+                print(f"   📄 Traces: {TRACE_PATH} · Metrics: {METRICS_PATH}")
+                continue
+            elif user_input.lower() == "advise":
+                from index_advisor import describe_advice
+
+                initialize()
+                if index_advisor is None:
+                    print(
+                        "\n📇 Plan capture is OFF. Set PLAN_CAPTURE=true to log query "
+                        "plans for index advice."
+                    )
+                    continue
+                suggestions = index_advisor.advise()
+                print(f"\n📇 {describe_advice(suggestions, workload_log.stats())}")
+                if suggestions:
+                    print(
+                        "💡 To create them, ask the agent (e.g. 'create the suggested "
+                        "indexes'): it plans the change and asks for confirmation first"
+                    )
+                continue
+            elif user_input.lower() == "reindex":
+                initialize()
+                if value_index is None:
+                    print("\n🔎 Value index is OFF. Set VALUE_INDEX=true to use it.")
+                    continue
+                value_index.rebuild()
+                stats = value_index.stats()
+                print(
+                    f"\n🔎 Value index resynced: {stats['values']} values in "
+                    f"{stats['columns']} columns"
+                )
+                continue
+            elif parse_export_command(user_input):
+                # Natural-language requests ("export all tracks") go to the agent
+                from exporter import describe_export, export_path, export_query
+
+                initialize()
+                fmt, query = parse_export_command(user_input)
+                if is_modification_query(query):
+                    print("\n⚠️  Only SELECT queries can be exported.")
+                    continue
+                export = export_query(
+                    db_router.for_read()._engine,
+                    query,
+                    export_path(EXPORT_DIR, fmt),
+                    fmt=fmt,
+                    batch_size=EXPORT_BATCH_SIZE,
+                )
+                print(f"\n📤 {describe_export(export)}")
                 continue
             elif user_input.lower() == "help":
                 print("\n📖 Help:")
@@ -264,6 +1442,12 @@ def interactive_cli():
                 print("  - The agent can create, modify and query data")
                 print("  - Use 'debug' to toggle SQL query visibility")
                 print("  - Use 'batch' to toggle batch execution mode")
+                print("  - Use 'fast' to answer simple questions in two LLM calls")
+                print("  - Use 'export csv SELECT ...' to save a full result to a file")
+                print("  - Use 'stats' to see where time goes (LLM, tools, SQL)")
+                print("  - Use 'advise' for index suggestions (needs PLAN_CAPTURE=true)")
+                print("  - Use 'threads' and 'resume <id>' to continue a conversation")
+                print("  - Use 'reindex' after changing data outside the agent")
                 print(
                     "  - In batch mode, modifications are planned first, then executed"
                 )
@@ -272,8 +1456,10 @@ def interactive_cli():
                 print("⚠️  Please write a question.")
                 continue
 
-            # Add user message to history
-            conversation_history.append({"role": "user", "content": user_input})
+            if conversation_history is None:
+                conversation_history = new_history()
+            if thread_id is None:
+                thread_id = new_thread_id()
 
             print("\n🤖 SQL Agent: Processing your query...")
             if BATCH_MODE:
@@ -282,15 +1468,33 @@ def interactive_cli():
                 )
             print("-" * 40)
 
-            # Execute agent with batch safety
-            agent_response, executed_queries = execute_with_batch_safety(
-                conversation_history
+            # Answer within the conversation, streaming the answer as it comes
+            printer = TokenPrinter() if STREAM_TOKENS else None
+            cancel_scope = CancelScope()
+            answer, executed_queries = follow_turn(
+                history_turn(
+                    conversation_history,
+                    user_input,
+                    thread_id,
+                    stream=printer is not None,
+                    cancel_scope=cancel_scope,
+                    use_llm_cache=use_llm_cache,
+                ),
+                log=printer.log if printer else print,
+                on_token=printer,
+                on_thought=printer.thought if printer else None,
             )
+            if answer is None:
+                continue
+            agent_response = answer["content"]
 
-            # Show final response
-            print("-" * 40)
-            print("✅ Response:")
-            print(agent_response)
+            # Show final response, unless it was already streamed
+            if printer and printer.streamed:
+                printer.end_line()
+            else:
+                print("-" * 40)
+                print("✅ Response:")
+                print(agent_response)
 
             # Show summary of executed queries if any modifications were made
             if executed_queries and any(
@@ -306,13 +1510,16 @@ def interactive_cli():
                     for i, query in enumerate(modification_queries, 1):
                         print(f"   {i}. {query}")
 
-            # Add agent response to history
-            if agent_response:
-                conversation_history.append(
-                    {"role": "assistant", "content": agent_response}
+            # The history was kept within its token budget after the answer
+            if answer["folded"] and DEBUG_MODE:
+                print(
+                    f"\n🗜️  Folded {answer['folded']} older message(s) into the summary"
                 )
 
         except KeyboardInterrupt:
+            # Stop the SQL still running for this question, in any thread
+            if cancel_scope is not None:
+                cancel_scope.cancel()
             print("\n\n⚠️  Operation cancelled by user.")
             continue
         except Exception as e:
@@ -321,5 +1528,59 @@ def interactive_cli():
             continue
 
 
+def bulk_cli(questions_path, workers, out_path):
+    """Answer a file of questions concurrently, streaming results to JSONL"""
+    initialize()
+    questions = load_questions(questions_path)
+    if workers > DB_POOL_SIZE + DB_MAX_OVERFLOW:
+        print(
+            f"⚠️  {workers} workers but only {DB_POOL_SIZE + DB_MAX_OVERFLOW} pooled "
+            "connections; raise DB_POOL_SIZE or DB_MAX_OVERFLOW to avoid waiting"
+        )
+    print(f"📚 Answering {len(questions)} questions with {workers} workers -> {out_path}")
+
+    def answer(question):
+        agent_response, _ = execute_with_batch_safety(
+            [{"role": "user", "content": question}], log=lambda *args: None
+        )
+        return agent_response
+
+    summary = run_bulk(
+        questions, answer, out_path, workers=workers, max_retries=BULK_MAX_RETRIES
+    )
+    print(
+        f"🏁 {summary['ok']} answered, {summary['error']} failed, "
+        f"{summary['skipped']} skipped in {summary['wall_time']:.1f}s "
+        f"({summary['throughput']:.1f} questions/min)"
+    )
+    if summary["rate_limits"]:
+        print(
+            f"🐢 Backed off {summary['rate_limits']} time(s) on LLM rate limits; "
+            f"finished at {summary['final_concurrency']} concurrent question(s)"
+        )
+    return 1 if summary["error"] else 0
+
+
 if __name__ == "__main__":
-    interactive_cli()
+    parser = argparse.ArgumentParser(description="Interactive SQL Agent")
+    parser.add_argument(
+        "--questions",
+        help="Answer the questions in this file (one per line, or JSONL) and exit",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=BULK_WORKERS, help="Concurrent questions"
+    )
+    parser.add_argument("--out", default="results.jsonl", help="JSONL results file")
+    parser.add_argument("--resume", help="Continue a saved conversation thread")
+    parser.add_argument(
+        "--mode",
+        choices=["agent", "fast"],
+        help="fast: try a two-call pipeline first for read-only questions",
+    )
+    args = parser.parse_args()
+    if args.mode:
+        AGENT_MODE = args.mode
+
+    if args.questions:
+        raise SystemExit(bulk_cli(args.questions, max(args.workers, 1), args.out))
+    interactive_cli(resume=args.resume)
@@ -0,0 +1,180 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+TITLE_CHARS = 60
+
+
+class ThreadStore:
+    """Durable conversation threads, checkpointed to SQLite after every turn
+
+    A checkpoint is the token-budgeted history of a thread (rolling summary
+    plus recent turns), so resuming a thread after a restart costs no more
+    tokens than continuing it would have. Each thread keeps its last few
+    checkpoints; threads idle for longer than the TTL are removed by compact().
+    """
+
+    def __init__(
+        self,
+        path,
+        database,
+        ttl_days=30,
+        keep_checkpoints=5,
+        max_threads=1000,
+    ):
+        self.path = path
+        self.database = database
+        self.ttl_days = ttl_days
+        self.keep_checkpoints = max(1, keep_checkpoints)
+        self.max_threads = max_threads
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Only takes effect on a new file; lets compact() return freed pages
+        self._conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS threads (
+                thread_id TEXT PRIMARY KEY,
+                database TEXT NOT NULL,
+                title TEXT NOT NULL,
+                turns INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_threads_updated
+                ON threads (database, updated_at);
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                id INTEGER PRIMARY KEY,
+                thread_id TEXT NOT NULL,
+                state TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_checkpoints_thread
+                ON checkpoints (thread_id, id);
+            """
+        )
+
+    def save(self, thread_id, history):
+        """Checkpoint a thread's history, keeping its last keep_checkpoints"""
+        state = history.state()
+        questions = [turn for turn in state["turns"] if turn["role"] == "user"]
+        title = " ".join(questions[0]["content"].split()) if questions else ""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO checkpoints (thread_id, state, created_at)"
+                " VALUES (?, ?, ?)",
+                (thread_id, json.dumps(state), now),
+            )
+            self._conn.execute(
+                "INSERT INTO threads (thread_id, database, title, turns, created_at,"
+                " updated_at) VALUES (?, ?, ?, 1, ?, ?)"
+                " ON CONFLICT (thread_id) DO UPDATE SET turns = turns + 1,"
+                " updated_at = excluded.updated_at",
+                (thread_id, self.database, title[:TITLE_CHARS], now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND id NOT IN"
+                " (SELECT id FROM checkpoints WHERE thread_id = ?"
+                " ORDER BY id DESC LIMIT ?)",
+                (thread_id, thread_id, self.keep_checkpoints),
+            )
+            self._conn.commit()
+
+    def load(self, thread_id):
+        """Latest checkpointed state of a thread, or None if it is unknown"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT c.state FROM checkpoints c"
+                " JOIN threads t ON t.thread_id = c.thread_id"
+                " WHERE c.thread_id = ? AND t.database = ?"
+                " ORDER BY c.id DESC LIMIT 1",
+                (thread_id, self.database),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def threads(self, limit=20):
+        """Most recently updated threads of this database"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, title, turns, created_at, updated_at FROM threads"
+                " WHERE database = ? ORDER BY updated_at DESC LIMIT ?",
+                (self.database, limit),
+            ).fetchall()
+        return [
+            {
+                "thread_id": thread_id,
+                "title": title,
+                "turns": turns,
+                "created_at": created_at,
+                "updated_at": updated_at,
+            }
+            for thread_id, title, turns, created_at, updated_at in rows
+        ]
+
+    def delete(self, thread_id):
+        """Forget a thread and its checkpoints"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,)
+            )
+            self._conn.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    def compact(self):
+        """Remove expired threads and those beyond max_threads; returns how many"""
+        with self._lock:
+            expired = []
+            if self.ttl_days:
+                cutoff = time.time() - self.ttl_days * 86400
+                expired = self._conn.execute(
+                    "SELECT thread_id FROM threads WHERE updated_at < ?", (cutoff,)
+                ).fetchall()
+            if self.max_threads:
+                # The cap is per database: other databases' threads are ranked
+                # by their own stores
+                expired += self._conn.execute(
+                    "SELECT thread_id FROM threads WHERE database = ?"
+                    " ORDER BY updated_at DESC LIMIT -1 OFFSET ?",
+                    (self.database, self.max_threads),
+                ).fetchall()
+            expired = set(expired)
+            self._conn.executemany(
+                "DELETE FROM checkpoints WHERE thread_id = ?", expired
+            )
+            self._conn.executemany("DELETE FROM threads WHERE thread_id = ?", expired)
+            self._conn.commit()
+            if expired:
+                self._conn.execute("PRAGMA incremental_vacuum")
+        return len(expired)
+
+    def stats(self):
+        """Number of stored threads and checkpoints"""
+        with self._lock:
+            threads = self._conn.execute("SELECT COUNT(*) FROM threads").fetchone()
+            checkpoints = self._conn.execute(
+                "SELECT COUNT(*) FROM checkpoints"
+            ).fetchone()
+        return {"threads": threads[0], "checkpoints": checkpoints[0]}
+
+
+def describe_threads(threads):
+    """Format a thread listing for the CLI"""
+    if not threads:
+        return "No saved threads yet."
+    lines = ["Saved threads (most recent first):"]
+    for thread in threads:
+        updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(thread["updated_at"]))
+        lines.append(
+            f"   {thread['thread_id']}  {updated}  {thread['turns']:>3} turn(s)  "
+            f"{thread['title'] or '(empty)'}"
+        )
+    return "\n".join(lines)
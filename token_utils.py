@@ -0,0 +1,29 @@
+import functools
+
+import tiktoken
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+    """Return the tiktoken encoding for a model, or None if it cannot be loaded"""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Encodings are downloaded on first use; fall back when offline
+        return None
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """Count the tokens in a piece of text"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model="gpt-4o-mini"):
+    """Count the tokens in a list of chat messages, including per-message overhead"""
+    return sum(count_tokens(message["content"], model) + 4 for message in messages)
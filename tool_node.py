@@ -0,0 +1,73 @@
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables.config import (
+    get_config_list,
+    get_executor_for_config,
+    run_in_executor,
+)
+from langgraph.prebuilt import ToolNode
+
+import threading
+import time
+
+from query_utils import is_modification_query
+
+# Writes from every run in the process go through one at a time
+WRITE_LOCK = threading.Lock()
+
+
+def is_write_call(tool_call):
+    """Whether a tool call may modify the database"""
+    if tool_call["name"] == "sql_db_execute_batch":
+        return True
+    query = tool_call.get("args", {}).get("query", "")
+    return tool_call["name"] == "sql_db_query" and is_modification_query(str(query))
+
+
+class ConcurrentToolNode(ToolNode):
+    """Run the read-only tool calls of a step concurrently, writes one at a time
+
+    Calls keep their order: consecutive reads share a bounded thread pool (each
+    read takes its own pooled connection), and every write waits for the reads
+    before it and runs alone. Each tool message records its duration in
+    response_metadata.
+    """
+
+    def __init__(self, tools, max_workers=4, **kwargs):
+        super().__init__(tools, **kwargs)
+        self.max_workers = max(1, max_workers)
+
+    def _func(self, input, config, *, store):
+        tool_calls, input_type = self._parse_input(input, store)
+        config_list = get_config_list(config, len(tool_calls))
+        outputs = [None] * len(tool_calls)
+
+        def run(i):
+            outputs[i] = self._run_timed(tool_calls[i], input_type, config_list[i])
+
+        with get_executor_for_config(
+            {**config, "max_concurrency": self.max_workers}
+        ) as executor:
+            reads = []
+            for i, tool_call in enumerate(tool_calls):
+                if not is_write_call(tool_call):
+                    reads.append(i)
+                    continue
+                list(executor.map(run, reads))
+                reads = []
+                with WRITE_LOCK:
+                    run(i)
+            list(executor.map(run, reads))
+
+        return self._combine_tool_outputs(outputs, input_type)
+
+    async def _afunc(self, input, config, *, store):
+        # The SQL tools are synchronous, so the async path runs the same
+        # bounded pool from a worker thread
+        return await run_in_executor(config, self._func, input, config, store=store)
+
+    def _run_timed(self, tool_call, input_type, config):
+        started = time.perf_counter()
+        output = self._run_one(tool_call, input_type, config)
+        if isinstance(output, ToolMessage):
+            output.response_metadata["duration"] = time.perf_counter() - started
+        return output
@@ -0,0 +1,301 @@
+from collections import deque
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+import json
+import os
+import threading
+import time
+import uuid
+
+SQL_TOOLS = ("sql_db_query", "sql_db_query_checker", "sql_db_export")
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Tracer(BaseCallbackHandler):
+    """Record spans for one question: LLM calls, tool calls and SQL statements"""
+
+    def __init__(self, question):
+        self.trace_id = uuid.uuid4().hex
+        self.question = question
+        self.started = time.time()
+        self.duration = None
+        self.cached = False
+        self.error = None
+        self.mode = None
+        self.spans = []
+        self._open = {}
+        self._started_at = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, parent_run_id, span):
+        span.update(
+            span_id=str(run_id),
+            parent_id=str(parent_run_id) if parent_run_id else None,
+            start=time.time(),
+        )
+        with self._lock:
+            self._open[run_id] = (time.perf_counter(), span)
+
+    def _end(self, run_id, **attributes):
+        with self._lock:
+            started, span = self._open.pop(run_id, (None, None))
+            if span is None:
+                return
+            span["duration"] = time.perf_counter() - started
+            span.update(attributes)
+            self.spans.append(span)
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, parent_run_id=None, **kwargs
+    ):
+        metadata = kwargs.get("metadata") or {}
+        name = metadata.get("ls_model_name") or (serialized or {}).get("name", "llm")
+        self._start(run_id, parent_run_id, {"type": "llm", "name": name})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_tokens = completion_tokens = 0
+        cached = False
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+                metadata = getattr(message, "response_metadata", None) or {}
+                cached = cached or bool(metadata.get("llm_cache"))
+        self._end(
+            run_id,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached=cached,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=str(error))
+
+    def on_tool_start(
+        self, serialized, input_str, *, run_id, parent_run_id=None, inputs=None, **kwargs
+    ):
+        name = (serialized or {}).get("name") or kwargs.get("name", "tool")
+        span = {"type": "tool", "name": name}
+        if name in SQL_TOOLS and isinstance(inputs, dict) and "query" in inputs:
+            span["sql"] = inputs["query"]
+        self._start(run_id, parent_run_id, span)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = str(getattr(output, "content", output))
+        if content.startswith("Error"):
+            self._end(run_id, error=content.splitlines()[0])
+        else:
+            self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=str(error))
+
+    def on_custom_event(self, name, data, *, run_id, **kwargs):
+        # SQL tools report each statement they send to the database
+        if name != "sql":
+            return
+        span = {
+            "type": "sql",
+            "name": data.get("operation", "query"),
+            "span_id": uuid.uuid4().hex,
+            "parent_id": str(run_id),
+            "start": time.time() - data.get("duration", 0.0),
+            **data,
+        }
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self, cached=False, error=None, mode="agent"):
+        """Close the trace once the answer is ready"""
+        self.duration = time.perf_counter() - self._started_at
+        self.cached = cached
+        self.error = error
+        self.mode = "cached" if cached else mode
+
+    def breakdown(self):
+        """Total seconds spent per span type"""
+        totals = {}
+        for span in self.spans:
+            totals[span["type"]] = totals.get(span["type"], 0.0) + span["duration"]
+        return totals
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "question": self.question,
+            "start": self.started,
+            "duration": self.duration,
+            "cached": self.cached,
+            "mode": self.mode,
+            "error": self.error,
+            "spans": sorted(self.spans, key=lambda span: span["start"]),
+        }
+
+
+class TraceRecorder:
+    """Collect finished traces into a JSONL file, latency windows and Prometheus text"""
+
+    def __init__(self, trace_path=None, metrics_path=None, window=1000, max_bytes=0):
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.window = window
+        self.max_bytes = max_bytes
+        self._samples = {}
+        self._totals = {}
+        self._counters = {
+            "questions": 0,
+            "cached_questions": 0,
+            "errors": 0,
+            "llm_calls": 0,
+            "cached_llm_calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "sql_rows": 0,
+        }
+        self._lock = threading.RLock()
+
+        for path in (trace_path, metrics_path):
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def start(self, question):
+        """Create a tracer to pass as a callback for one question"""
+        return Tracer(question)
+
+    def finish(self, tracer, cached=False, error=None, mode="agent"):
+        """Record a finished trace and refresh the exported files
+
+        Question latency is tracked per answering mode: "cached", "fast" (the
+        two-call pipeline), "escalated" (fast path, then the agent) or "agent".
+        """
+        tracer.finish(cached=cached, error=error, mode=mode)
+        trace = tracer.to_dict()
+
+        with self._lock:
+            self._observe(("question", trace["mode"]), trace["duration"])
+            self._counters["questions"] += 1
+            self._counters["cached_questions"] += int(cached)
+            self._counters["errors"] += int(error is not None)
+            for span in trace["spans"]:
+                self._observe((span["type"], span["name"]), span["duration"])
+                if span["type"] == "llm":
+                    self._counters["llm_calls"] += 1
+                    self._counters["cached_llm_calls"] += int(span.get("cached", False))
+                self._counters["prompt_tokens"] += span.get("prompt_tokens", 0)
+                self._counters["completion_tokens"] += span.get("completion_tokens", 0)
+                self._counters["sql_rows"] += span.get("rows") or 0
+
+            if self.trace_path:
+                self._append_trace(trace)
+            if self.metrics_path:
+                temporary = f"{self.metrics_path}.tmp"
+                with open(temporary, "w", encoding="utf-8") as f:
+                    f.write(self._render_prometheus())
+                os.replace(temporary, self.metrics_path)
+        return trace
+
+    def _observe(self, key, duration):
+        if key not in self._samples:
+            self._samples[key] = deque(maxlen=self.window)
+            self._totals[key] = [0, 0.0]
+        self._samples[key].append(duration)
+        self._totals[key][0] += 1
+        self._totals[key][1] += duration
+
+    def _append_trace(self, trace):
+        if (
+            self.max_bytes
+            and os.path.exists(self.trace_path)
+            and os.path.getsize(self.trace_path) > self.max_bytes
+        ):
+            os.replace(self.trace_path, f"{self.trace_path}.1")
+        with open(self.trace_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(trace, default=str) + "\n")
+
+    def summary(self):
+        """Latency percentiles per step type over the recent window"""
+        with self._lock:
+            rows = []
+            for (span_type, name), samples in self._samples.items():
+                count, total = self._totals[(span_type, name)]
+                rows.append(
+                    {
+                        "type": span_type,
+                        "name": name,
+                        "count": count,
+                        "p50": percentile(samples, 0.5),
+                        "p95": percentile(samples, 0.95),
+                        "total": total,
+                    }
+                )
+            return sorted(rows, key=lambda row: -row["total"])
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def prometheus(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        with self._lock:
+            return self._render_prometheus()
+
+    def _render_prometheus(self):
+        lines = [
+            "# HELP sql_agent_step_duration_seconds Duration of agent steps.",
+            "# TYPE sql_agent_step_duration_seconds summary",
+        ]
+        for (span_type, name), samples in sorted(self._samples.items()):
+            labels = f'type="{span_type}",name="{_escape(name)}"'
+            for quantile in (0.5, 0.95):
+                lines.append(
+                    f'sql_agent_step_duration_seconds{{{labels},quantile="{quantile}"}} '
+                    f"{percentile(samples, quantile):.6f}"
+                )
+            count, total = self._totals[(span_type, name)]
+            lines.append(f"sql_agent_step_duration_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"sql_agent_step_duration_seconds_count{{{labels}}} {count}")
+
+        for counter, help_text in (
+            ("questions", "Questions answered."),
+            ("cached_questions", "Questions answered from the question cache."),
+            ("errors", "Questions that failed."),
+            ("llm_calls", "LLM calls made."),
+            ("cached_llm_calls", "LLM calls answered from the LLM cache."),
+            ("prompt_tokens", "Prompt tokens sent to the LLM."),
+            ("completion_tokens", "Completion tokens received from the LLM."),
+            ("sql_rows", "Rows returned by SQL queries."),
+        ):
+            lines.append(f"# HELP sql_agent_{counter}_total {help_text}")
+            lines.append(f"# TYPE sql_agent_{counter}_total counter")
+            lines.append(f"sql_agent_{counter}_total {self._counters[counter]}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def describe_trace(tracer):
+    """One-line latency breakdown of a finished trace"""
+    totals = tracer.breakdown()
+    llm_calls = [span for span in tracer.spans if span["type"] == "llm"]
+    tokens = sum(
+        span.get("prompt_tokens", 0) + span.get("completion_tokens", 0)
+        for span in llm_calls
+    )
+    return (
+        f"⏱️  Total {tracer.duration:.2f}s · LLM {totals.get('llm', 0.0):.2f}s "
+        f"({len(llm_calls)} calls, {tokens} tokens) · "
+        f"tools {totals.get('tool', 0.0):.2f}s · SQL {totals.get('sql', 0.0):.3f}s"
+    )
@@ -0,0 +1,362 @@
+from sqlalchemy import inspect, sql
+from sqlalchemy.types import String
+
+import difflib
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+# Text columns indexed when VALUE_INDEX_COLUMNS is not set
+NAME_COLUMN_PATTERN = re.compile(r"name|title|label", re.IGNORECASE)
+WRITE_PATTERN = re.compile(
+    r"^\s*(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|"
+    r"DELETE\s+FROM)\s+([\w.\"`\[\]]+)",
+    re.IGNORECASE,
+)
+
+# Longer values are descriptions, not names anyone looks up
+MAX_VALUE_CHARS = 200
+# Candidates read from each probe before fuzzy re-ranking
+CANDIDATES = 50
+MIN_SCORE = 0.3
+INDEX_FORMAT = 2
+
+
+def normalize_value(value):
+    """Casefold a value and strip its accents, so 'Antonio' finds 'Antônio'"""
+    decomposed = unicodedata.normalize("NFKD", str(value))
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def written_tables(statements):
+    """Tables written by INSERT, UPDATE and DELETE statements, lowercased"""
+    tables = set()
+    for statement in statements:
+        match = WRITE_PATTERN.match(statement)
+        if match:
+            name = match.group(1).split(".")[-1].strip("\"`[]")
+            tables.add(name.lower())
+    return tables
+
+
+class ValueIndex:
+    """Full-text index of the values of text columns, in an SQLite FTS5 sidecar
+
+    Each row of an indexed column is stored with its table, column and primary
+    key. A lookup is a word-prefix probe, with a trigram probe for misspellings
+    when words alone find too little; candidates are re-ranked by similarity to
+    the text looked up. Writes by the agent resync only the tables they touch.
+    """
+
+    def __init__(self, db, path, columns=None, max_rows=100000):
+        self.db = db
+        self.path = path
+        self.columns = columns or None
+        self.max_rows = max_rows
+        self.fuzzy = True
+        self.stale = False
+        self._indexed = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS entity_values (
+                id INTEGER PRIMARY KEY,
+                tbl TEXT NOT NULL,
+                col TEXT NOT NULL,
+                pk TEXT NOT NULL,
+                value TEXT NOT NULL,
+                search TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entity_values_column
+                ON entity_values (tbl, col);
+            CREATE VIRTUAL TABLE IF NOT EXISTS entity_words USING fts5(
+                search, content='entity_values', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS entity_values_insert
+            AFTER INSERT ON entity_values BEGIN
+                INSERT INTO entity_words (rowid, search) VALUES (new.id, new.search);
+            END;
+            CREATE TRIGGER IF NOT EXISTS entity_values_delete
+            AFTER DELETE ON entity_values BEGIN
+                INSERT INTO entity_words (entity_words, rowid, search)
+                VALUES ('delete', old.id, old.search);
+            END;
+            """
+        )
+        try:
+            # The trigram tokenizer needs SQLite 3.34 or later
+            self._conn.executescript(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS entity_trigrams USING fts5(
+                    search, content='entity_values', content_rowid='id',
+                    tokenize='trigram'
+                );
+                CREATE TRIGGER IF NOT EXISTS entity_trigrams_insert
+                AFTER INSERT ON entity_values BEGIN
+                    INSERT INTO entity_trigrams (rowid, search)
+                    VALUES (new.id, new.search);
+                END;
+                CREATE TRIGGER IF NOT EXISTS entity_trigrams_delete
+                AFTER DELETE ON entity_values BEGIN
+                    INSERT INTO entity_trigrams (entity_trigrams, rowid, search)
+                    VALUES ('delete', old.id, old.search);
+                END;
+                """
+            )
+        except sqlite3.OperationalError:
+            self.fuzzy = False
+
+    def load(self):
+        """Reuse the index on disk, building it when missing or for another database
+
+        Returns True when the index was built.
+        """
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        if meta.get("database") == self._database_key() and meta.get("format") == str(
+            INDEX_FORMAT
+        ):
+            with self._lock:
+                self._indexed = json.loads(meta["columns"])
+            return False
+        self.rebuild()
+        return True
+
+    def rebuild(self):
+        """Resync every indexed column with the database"""
+        columns = self._select_columns()
+        with self._lock:
+            for table, column in self._conn.execute(
+                "SELECT DISTINCT tbl, col FROM entity_values"
+            ).fetchall():
+                if column not in columns.get(table, {}).get("columns", []):
+                    self._conn.execute(
+                        "DELETE FROM entity_values WHERE tbl = ? AND col = ?",
+                        (table, column),
+                    )
+            for table, entry in columns.items():
+                self._sync_table(table, entry)
+            self._indexed = columns
+            self._save_meta()
+            self.stale = False
+
+    def refresh(self, statements):
+        """Resync the indexed tables written by the given statements"""
+        tables = written_tables(statements)
+        with self._lock:
+            for table, entry in self._indexed.items():
+                if table.lower() in tables:
+                    self._sync_table(table, entry)
+            self._conn.commit()
+
+    def invalidate(self):
+        """Mark the index as outdated (the schema changed) so it is rebuilt on use"""
+        self.stale = True
+
+    def lookup(self, value, table=None, limit=5):
+        """Rows whose indexed value best matches the text, best first
+
+        Each match is a dict with table, column, value, primary_key (of the
+        first row holding the value), rows and score (0 to 1).
+        """
+        if self.stale:
+            self.rebuild()
+        search = normalize_value(value)
+        words = re.findall(r"\w+", search)
+        if not words:
+            return []
+
+        candidates = self._probe(
+            "entity_words", " ".join(f'"{word}"*' for word in words), table
+        )
+        if len(candidates) < limit and self.fuzzy:
+            trigrams = {
+                word[i : i + 3] for word in words for i in range(len(word) - 2)
+            }
+            if trigrams:
+                candidates.update(
+                    self._probe(
+                        "entity_trigrams",
+                        " OR ".join(f'"{trigram}"' for trigram in sorted(trigrams)),
+                        table,
+                    )
+                )
+
+        matches = {}
+        for (tbl, col, pk, original), candidate in candidates.items():
+            key = (tbl, col, original)
+            if key in matches:
+                matches[key]["rows"] += 1
+                continue
+            score = difflib.SequenceMatcher(None, search, candidate).ratio()
+            if score >= MIN_SCORE:
+                matches[key] = {
+                    "table": tbl,
+                    "column": col,
+                    "value": original,
+                    "primary_key": json.loads(pk),
+                    "rows": 1,
+                    "score": round(score, 3),
+                }
+        ranked = sorted(
+            matches.values(),
+            key=lambda match: (-match["score"], match["table"], match["value"]),
+        )
+        return ranked[:limit]
+
+    def stats(self):
+        """Number of indexed values and columns"""
+        with self._lock:
+            values = self._conn.execute("SELECT COUNT(*) FROM entity_values").fetchone()
+            columns = sum(len(entry["columns"]) for entry in self._indexed.values())
+        return {"values": values[0], "columns": columns}
+
+    def _probe(self, fts_table, match, table):
+        query = (
+            f"SELECT v.tbl, v.col, v.pk, v.value, v.search FROM {fts_table} f"
+            " JOIN entity_values v ON v.id = f.rowid"
+            f" WHERE {fts_table} MATCH ?"
+        )
+        parameters = [match]
+        if table:
+            query += " AND v.tbl = ? COLLATE NOCASE"
+            parameters.append(table)
+        query += " ORDER BY f.rank LIMIT ?"
+        parameters.append(CANDIDATES)
+        with self._lock:
+            try:
+                rows = self._conn.execute(query, parameters).fetchall()
+            except sqlite3.OperationalError:
+                return {}
+        return {tuple(row[:4]): row[4] for row in rows}
+
+    def _select_columns(self):
+        inspector = inspect(self.db._engine)
+        wanted = None
+        if self.columns:
+            wanted = {column.strip().lower() for column in self.columns}
+
+        selected = {}
+        for table in self.db.get_usable_table_names():
+            primary_keys = (
+                inspector.get_pk_constraint(table, schema=self.db._schema).get(
+                    "constrained_columns"
+                )
+                or []
+            )
+            if not primary_keys:
+                continue
+            columns = []
+            for column in inspector.get_columns(table, schema=self.db._schema):
+                name = column["name"]
+                if name in primary_keys:
+                    continue
+                if wanted is not None:
+                    if f"{table}.{name}".lower() in wanted:
+                        columns.append(name)
+                elif isinstance(column["type"], String) and NAME_COLUMN_PATTERN.search(
+                    name
+                ):
+                    columns.append(name)
+            if columns:
+                selected[table] = {"primary_key": primary_keys, "columns": columns}
+        return selected
+
+    def _sync_table(self, table, entry):
+        # Read the first max_rows rows in primary key order, so the indexed range
+        # is the same on every sync, and diff them against the index, so only
+        # changed rows are rewritten
+        primary_key = entry["primary_key"]
+        columns = entry["columns"]
+        source = sql.table(table, *(sql.column(name) for name in primary_key + columns))
+        query = (
+            sql.select(*source.c)
+            .order_by(*(source.c[name] for name in primary_key))
+            .limit(self.max_rows)
+        )
+        current = {column: {} for column in columns}
+        try:
+            with self.db._engine.connect() as connection:
+                for row in connection.execute(query):
+                    key = dict(zip(primary_key, row[: len(primary_key)]))
+                    pk = json.dumps(key, default=str)
+                    for column, value in zip(columns, row[len(primary_key) :]):
+                        value = "" if value is None else str(value)
+                        if value.strip() and len(value) <= MAX_VALUE_CHARS:
+                            current[column][pk] = value
+        except Exception:
+            # A table that cannot be read keeps its previous entries
+            return
+
+        for column in columns:
+            indexed = {
+                pk: (row_id, value)
+                for row_id, pk, value in self._conn.execute(
+                    "SELECT id, pk, value FROM entity_values WHERE tbl = ? AND col = ?",
+                    (table, column),
+                )
+            }
+            self._conn.executemany(
+                "DELETE FROM entity_values WHERE id = ?",
+                [
+                    (row_id,)
+                    for pk, (row_id, value) in indexed.items()
+                    if current[column].get(pk) != value
+                ],
+            )
+            self._conn.executemany(
+                "INSERT INTO entity_values (tbl, col, pk, value, search)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (table, column, pk, value, normalize_value(value))
+                    for pk, value in current[column].items()
+                    if indexed.get(pk, (None, None))[1] != value
+                ],
+            )
+
+    def _save_meta(self):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("database", self._database_key()),
+                ("format", str(INDEX_FORMAT)),
+                ("columns", json.dumps(self._indexed)),
+            ],
+        )
+        self._conn.commit()
+
+    def _database_key(self):
+        url = self.db._engine.url.render_as_string(hide_password=True)
+        return f"{url}|{self.db._schema}|{','.join(sorted(self.columns or []))}"
+
+
+def describe_lookup(value, matches):
+    """Describe entity lookup matches for the agent"""
+    if not matches:
+        return (
+            f"No indexed value matches '{value}'. It may be in a column that is "
+            "not indexed: search it with sql_db_query."
+        )
+    lines = [f"Values matching '{value}', best first:"]
+    for match in matches:
+        key = ", ".join(
+            f"{column} = {key_value!r}"
+            for column, key_value in match["primary_key"].items()
+        )
+        more = f", +{match['rows'] - 1} more rows" if match["rows"] > 1 else ""
+        lines.append(
+            f"- {match['table']}.{match['column']} = {match['value']!r} "
+            f"({key}{more}) score {match['score']:.2f}"
+        )
+    return "\n".join(lines)
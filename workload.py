@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from query_utils import is_modification_query, normalize_sql
+from query_validator import SQL_KEYWORDS, TABLE_PATTERN, strip_literals
+
+SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(.*)$")
+SQLITE_AUTOMATIC_INDEX = re.compile(
+    r"^SEARCH (?:TABLE )?(\w+)(?: AS \w+)? USING AUTOMATIC (?:\w+ )*INDEX \((.*)\)$"
+)
+SQLITE_TEMP_SORT = re.compile(r"^USE TEMP B-TREE FOR (.+)$")
+
+
+def fingerprint(query):
+    """Identify a query shape: literals, numbers and IN lists are replaced by ?"""
+    shape = re.sub(r"'(?:[^']|'')*'", "?", query)
+    shape = re.sub(r"\b\d+(?:\.\d+)?\b", "?", shape)
+    shape = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?)", shape)
+    return hashlib.sha1(normalize_sql(shape).encode()).hexdigest()[:16]
+
+
+def table_aliases(query):
+    """Map each table name and alias in a query (lowercased) to its table"""
+    aliases = {}
+    for keyword, table, call, alias in TABLE_PATTERN.findall(strip_literals(query)):
+        if call:
+            continue
+        name = table.split(".")[-1]
+        aliases[name.lower()] = name
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            aliases[alias.lower()] = name
+    return aliases
+
+
+def explain_query(db, query, large_sort_rows=10000):
+    """Capture a read query's plan and flag full table scans and large sorts
+
+    Returns (plan, findings), or (None, []) when the dialect is not supported
+    or the query cannot be explained. SQLite plans carry no row estimates, so
+    every temporary sort is flagged; PostgreSQL sorts are flagged from
+    large_sort_rows estimated rows.
+    """
+    try:
+        with db._engine.connect() as connection:
+            if db.dialect == "sqlite":
+                rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {query}").fetchall()
+                return _sqlite_findings(query, [row[3] for row in rows])
+            if db.dialect == "postgresql":
+                plan = connection.exec_driver_sql(
+                    f"EXPLAIN (FORMAT JSON) {query}"
+                ).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return _postgres_findings(plan, large_sort_rows)
+    except Exception:
+        # The query already ran; a plan we cannot capture is not an error
+        pass
+    return None, []
+
+
+def _sqlite_findings(query, details):
+    aliases = table_aliases(query)
+    findings = []
+    for detail in details:
+        scan = SQLITE_SCAN.match(detail)
+        if scan and "USING" not in scan.group(3):
+            # Subqueries and constant rows are scanned too, but are not tables
+            table = aliases.get(scan.group(1).lower())
+            if table is not None:
+                findings.append({"type": "full_scan", "table": table, "rows": None})
+        automatic = SQLITE_AUTOMATIC_INDEX.match(detail)
+        if automatic and aliases.get(automatic.group(1).lower()):
+            # SQLite builds a throwaway index for this join on every run
+            findings.append(
+                {
+                    "type": "full_scan",
+                    "table": aliases[automatic.group(1).lower()],
+                    "rows": None,
+                    "columns": re.findall(r"(\w+)=\?", automatic.group(2)),
+                }
+            )
+        sort = SQLITE_TEMP_SORT.match(detail)
+        if sort:
+            findings.append({"type": "sort", "detail": sort.group(1), "rows": None})
+    return "\n".join(details), findings
+
+
+def _postgres_findings(plan, large_sort_rows):
+    findings = []
+    nodes = [entry["Plan"] for entry in plan]
+    while nodes:
+        node = nodes.pop()
+        if node.get("Node Type") == "Seq Scan":
+            findings.append(
+                {
+                    "type": "full_scan",
+                    "table": node["Relation Name"],
+                    "rows": node.get("Plan Rows"),
+                }
+            )
+        elif node.get("Node Type") in ("Sort", "Incremental Sort"):
+            if node.get("Plan Rows", 0) >= large_sort_rows:
+                findings.append(
+                    {
+                        "type": "sort",
+                        "detail": ", ".join(node.get("Sort Key", [])),
+                        "rows": node.get("Plan Rows"),
+                    }
+                )
+        nodes.extend(node.get("Plans", []))
+    return json.dumps(plan), findings
+
+
+class WorkloadLog:
+    """Persistent log of the queries the agent runs, with their plan findings
+
+    Every read and write is logged with its fingerprint, duration and rows
+    returned; read plans are captured when capture_plans is on.
+    """
+
+    def __init__(
+        self,
+        path,
+        database,
+        capture_plans=True,
+        large_sort_rows=10000,
+        max_entries=10000,
+    ):
+        self.path = path
+        self.database = database
+        self.capture_plans = capture_plans
+        self.large_sort_rows = large_sort_rows
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # One insert per agent read: skip the fsync of every commit
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS queries (
+                id INTEGER PRIMARY KEY,
+                database TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                query TEXT NOT NULL,
+                duration REAL NOT NULL,
+                rows INTEGER NOT NULL,
+                plan TEXT,
+                findings TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_queries_fingerprint
+                ON queries (database, fingerprint);
+            """
+        )
+
+    def record(self, db, query, duration, rows):
+        """Log a query, capturing a read's plan when enabled; returns the findings"""
+        plan, findings = None, []
+        if self.capture_plans and not is_modification_query(query):
+            plan, findings = explain_query(db, query, self.large_sort_rows)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO queries (database, fingerprint, query, duration, rows,"
+                " plan, findings, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.database,
+                    fingerprint(query),
+                    query,
+                    duration,
+                    rows,
+                    plan,
+                    json.dumps(findings),
+                    time.time(),
+                ),
+            )
+            if cursor.lastrowid % 100 == 0:
+                self._conn.execute(
+                    "DELETE FROM queries WHERE id <= ?",
+                    (cursor.lastrowid - self.max_entries,),
+                )
+            self._conn.commit()
+        return findings
+
+    def repeated(self, min_count=2, since=0.0):
+        """Read queries logged at least min_count times since a time, most run first
+
+        Queries are grouped by their normalized text; each entry has the query,
+        its count, average duration and the most rows it returned.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, COUNT(*), SUM(duration), MAX(rows) FROM queries"
+                " WHERE database = ? AND created_at >= ? GROUP BY query",
+                (self.database, since),
+            ).fetchall()
+        grouped = {}
+        for query, count, duration, row_count in rows:
+            if is_modification_query(query):
+                continue
+            entry = grouped.setdefault(
+                normalize_sql(query),
+                {"query": query, "count": 0, "duration": 0.0, "rows": 0},
+            )
+            entry["count"] += count
+            entry["duration"] += duration
+            entry["rows"] = max(entry["rows"], row_count)
+        entries = [
+            {**entry, "duration": entry["duration"] / entry["count"]}
+            for entry in grouped.values()
+            if entry["count"] >= min_count
+        ]
+        return sorted(entries, key=lambda entry: -entry["count"] * entry["duration"])
+
+    def flagged(self):
+        """Logged queries whose plan had a full scan or a large sort"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query, duration, rows, findings FROM queries"
+                " WHERE database = ? AND findings != '[]' ORDER BY id",
+                (self.database,),
+            ).fetchall()
+        return [
+            {
+                "query": query,
+                "duration": duration,
+                "rows": row_count,
+                "findings": json.loads(findings),
+            }
+            for query, duration, row_count, findings in rows
+        ]
+
+    def stats(self):
+        """Number of logged and flagged queries"""
+        with self._lock:
+            queries, flagged = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(findings != '[]'), 0) FROM queries"
+                " WHERE database = ?",
+                (self.database,),
+            ).fetchone()
+        return {"queries": queries, "flagged": flagged}